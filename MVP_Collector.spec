@@ -2,17 +2,25 @@
 
 
 a = Analysis(
-    ['src\\main.py'],
+    ['src\\run.py'],
     pathex=[],
     binaries=[],
-    datas=[('templates', 'templates'), ('static', 'static'), ('src', 'src')],
-    hiddenimports=['PIL', 'geopy', 'mysql.connector', 'requests'],
+    # Só os dados de src/ (o código já vai compilado no arquivo PYZ)
+    datas=[('templates', 'templates'), ('static', 'static'), ('src/data', 'src/data')],
+    # main é importado por run.py dentro de run() (entrada sem arranque ao nível do módulo)
+    hiddenimports=['main', 'PIL', 'geopy', 'mysql.connector', 'requests'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
-    noarchive=True,
-    optimize=0,
+    # Stdlib e submódulos não usados pela aplicação (menos a extrair em cada arranque)
+    excludes=[
+        'tkinter', 'turtle', 'turtledemo', 'idlelib', 'test', 'lib2to3',
+        'pydoc_data', 'xmlrpc', 'ensurepip', 'venv', 'curses',
+        'PIL.ImageQt', 'PIL.ImageTk', 'numpy.f2py', 'numpy.distutils',
+    ],
+    # Módulos num único arquivo PYZ em vez de ficheiros .pyc soltos
+    noarchive=False,
+    optimize=1,
 )
 pyz = PYZ(a.pure)
 
@@ -21,12 +29,12 @@ exe = EXE(
     a.scripts,
     a.binaries,
     a.datas,
-    [('v', None, 'OPTION')],
+    [],
     name='MVP_Collector',
-    debug=True,
+    debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    upx=False,  # descomprimir UPX a cada arranque custa mais do que poupa
     upx_exclude=[],
     runtime_tmpdir=None,
     console=True,
@@ -0,0 +1,10 @@
+# benchmarks/
+# Scripts de desempenho do MVP Collector (executar a partir da raiz: python -m benchmarks.<script>)
+
+import os
+import sys
+
+# Os módulos da aplicação vivem em src/ e importam-se entre si sem pacote
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
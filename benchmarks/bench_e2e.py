@@ -0,0 +1,120 @@
+# benchmarks/bench_e2e.py
+# Throughput ponta-a-ponta /upload -> /analyze contra o servidor de produção e o stub das APIs.
+#
+#   python -m benchmarks.bench_e2e [--concurrency 1,4,8] [--duration 10] [--workers 2] [--threads 4]
+#                                  [--size hd] [--photos 8] [--out e2e.json]
+#
+# Cada cliente é um processo com a sua sessão: deteta a localização uma vez e depois
+# repete upload + análise, percorrendo `--photos` fotos diferentes.
+
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from benchmarks.common import summarize, write_results
+from benchmarks.corpus import parse_size, photo_bytes
+from benchmarks.load_test import SERVE_PY, free_port, wait_ready
+from benchmarks.stub_server import StubServer
+
+
+def client(args):
+    base_url, duration, photos = args
+    upload_ms, analyze_ms, cycle_ms = [], [], []
+    errors = 0
+    with requests.Session() as http:
+        http.get(base_url + "/", timeout=30)
+        http.get(base_url + "/detect_location", timeout=30)
+        deadline = time.monotonic() + duration
+        i = 0
+        while time.monotonic() < deadline:
+            photo = photos[i % len(photos)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                r = http.post(base_url + "/upload", files={"photo": ("foto.jpg", photo, "image/jpeg")}, timeout=60)
+                mid = time.perf_counter()
+                ok = r.ok and r.json().get("status") == "success"
+                if ok:
+                    r = http.post(base_url + "/analyze", json={}, timeout=60)
+                    ok = r.ok and r.json().get("status") == "success"
+                end = time.perf_counter()
+            except requests.RequestException:
+                errors += 1
+                continue
+            if not ok:
+                errors += 1
+                continue
+            upload_ms.append((mid - start) * 1000)
+            analyze_ms.append((end - mid) * 1000)
+            cycle_ms.append((end - start) * 1000)
+    return upload_ms, analyze_ms, cycle_ms, errors
+
+
+def run(concurrency, duration, workers, threads, backend, photos, stub):
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, SECRET_KEY="bench-e2e", LOG_LEVEL="WARNING", **stub.app_env())
+    with tempfile.TemporaryDirectory() as cwd:
+        proc = subprocess.Popen(
+            [sys.executable, SERVE_PY, "--host", "127.0.0.1", "--port", str(port),
+             "--workers", str(workers), "--threads", str(threads), "--backend", backend],
+            cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_ready(base_url + "/count_analyses")
+            with multiprocessing.Pool(concurrency) as pool:
+                parts = pool.map(client, [(base_url, duration, photos)] * concurrency)
+        finally:
+            proc.terminate()
+            proc.wait(30)
+    upload = [t for p in parts for t in p[0]]
+    analyze = [t for p in parts for t in p[1]]
+    cycle = [t for p in parts for t in p[2]]
+    errors = sum(p[3] for p in parts)
+    return {
+        "name": f"upload_analyze[c={concurrency}]",
+        "concurrency": concurrency,
+        "cycles": len(cycle),
+        "errors": errors,
+        "cycles_per_s": round(len(cycle) / duration, 2),
+        "upload": summarize(upload),
+        "analyze": summarize(analyze),
+        "cycle": summarize(cycle),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ponta-a-ponta upload -> análise")
+    parser.add_argument("--concurrency", default="1,4,8", help="clientes simultâneos (lista)")
+    parser.add_argument("--duration", type=float, default=10.0, help="segundos por nível de concorrência")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--backend", default="auto", choices=["auto", "gunicorn", "waitress", "werkzeug"])
+    parser.add_argument("--size", default="hd", help="resolução das fotos (vga, hd, 12mp ou LxA)")
+    parser.add_argument("--photos", type=int, default=8, help="fotos diferentes por cliente")
+    parser.add_argument("--latency-ms", type=float, default=20, help="latência simulada das APIs")
+    parser.add_argument("--out", help="grava os resultados em JSON")
+    args = parser.parse_args(argv)
+
+    size = parse_size(args.size)
+    photos = [photo_bytes(size, seed) for seed in range(args.photos)]
+    results = []
+    with StubServer(latency_ms=args.latency_ms) as stub:
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            r = run(concurrency, args.duration, args.workers, args.threads, args.backend, photos, stub)
+            results.append(r)
+            print(f"c={concurrency:<3} {r['cycles_per_s']:>8.2f} ciclos/s  "
+                  f"upload p50={r['upload']['p50_ms']} ms  analyze p50={r['analyze']['p50_ms']} ms  "
+                  f"ciclo p99={r['cycle']['p99_ms']} ms  erros={r['errors']}")
+        upstream = stub.requests
+    print(f"Pedidos ao stub: {upstream}")
+    return write_results(args.out, "e2e", results, params=dict(vars(args), stub_requests=upstream))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# benchmarks/bench_fitzpatrick.py
+# Compara a análise Fitzpatrick original (decode completo) com a versão reduzida no decode.
+#
+#   python -m benchmarks.bench_fitzpatrick [--corpus DIR] [--count 8] [--size 4000x3000] [--repeat 3]
+
+import argparse
+import glob
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+
+import benchmarks  # noqa: F401  (coloca src/ no sys.path)
+from benchmarks.common import percentile, write_results
+from benchmarks.corpus import make_corpus, parse_size
+
+
+def baseline_analyze(image_path):
+    """Implementação anterior: decode em resolução nativa e três np.mean separados."""
+    from PIL import Image
+    import numpy as np
+    from fitzpatrick import classify_brightness
+
+    img = Image.open(image_path)
+    img = img.convert('RGB')
+    img = img.resize((100, 100))
+    img_array = np.array(img)
+    avg_r = np.mean(img_array[:, :, 0])
+    avg_g = np.mean(img_array[:, :, 1])
+    avg_b = np.mean(img_array[:, :, 2])
+    return classify_brightness((avg_r + avg_g + avg_b) / 3)
+
+
+def fast_analyze(image_path):
+    from fitzpatrick import analyze_fitzpatrick
+    return analyze_fitzpatrick(image_path)
+
+
+def fast_masked_analyze(image_path):
+    from fitzpatrick import analyze_fitzpatrick
+    return analyze_fitzpatrick(image_path, mask_skin=True)
+
+
+VARIANTS = {
+    "baseline": baseline_analyze,
+    "fast": fast_analyze,
+    "fast_masked": fast_masked_analyze,
+}
+
+
+def peak_rss_mb():
+    # VmHWM é do próprio processo; ru_maxrss no Linux herda o pico do processo pai
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux devolve KB, macOS devolve bytes
+    return rss / 1024 / 1024 if os.uname().sysname == "Darwin" else rss / 1024
+
+
+def _run_variant(name, paths, repeat, out):
+    fn = VARIANTS[name]
+    fn(paths[0])  # aquecimento (imports)
+    timings = []
+    results = []
+    for _ in range(repeat):
+        for path in paths:
+            start = time.perf_counter()
+            results.append(fn(path))
+            timings.append((time.perf_counter() - start) * 1000)
+    out.put({"timings": timings, "results": results, "peak_rss_mb": peak_rss_mb()})
+
+
+def run_variant(name, paths, repeat):
+    """Executa cada variante num processo novo para medir o pico de RSS isolado."""
+    ctx = multiprocessing.get_context("spawn")
+    out = ctx.Queue()
+    proc = ctx.Process(target=_run_variant, args=(name, paths, repeat, out))
+    proc.start()
+    data = out.get()
+    proc.join()
+    timings = data["timings"]
+    return {
+        "variant": name,
+        "samples": len(timings),
+        "p50_ms": round(statistics.median(timings), 2),
+        "p99_ms": round(percentile(timings, 99), 2),
+        "mean_ms": round(statistics.fmean(timings), 2),
+        "peak_rss_mb": round(data["peak_rss_mb"], 1) if data["peak_rss_mb"] else None,
+        "results": data["results"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark da análise Fitzpatrick")
+    parser.add_argument("--corpus", help="pasta com imagens (.jpg/.png); por omissão gera um corpus sintético")
+    parser.add_argument("--count", type=int, default=8)
+    parser.add_argument("--size", default="4000x3000")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", help="grava os resultados em JSON")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.corpus:
+            paths = sorted(glob.glob(os.path.join(args.corpus, "*.jp*g")) + glob.glob(os.path.join(args.corpus, "*.png")))
+        else:
+            paths = make_corpus(tmp, args.count, parse_size(args.size))
+        if not paths:
+            raise SystemExit("Corpus vazio")
+
+        reports = [run_variant(name, paths, args.repeat) for name in VARIANTS]
+
+    baseline = reports[0]
+    print(f"{len(paths)} imagens x {args.repeat} repetições")
+    print(f"{'variante':<12} {'p50 ms':>9} {'p99 ms':>9} {'RSS MB':>8} {'speedup':>8} {'iguais':>7}")
+    for r in reports:
+        same = sum(a == b for a, b in zip(r["results"], baseline["results"]))
+        speedup = baseline["p50_ms"] / r["p50_ms"] if r["p50_ms"] else float("inf")
+        rss = f"{r['peak_rss_mb']:.1f}" if r["peak_rss_mb"] else "n/d"
+        print(f"{r['variant']:<12} {r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f} {rss:>8} {speedup:>7.1f}x {same:>3}/{len(r['results'])}")
+    write_results(args.out, "fitzpatrick",
+                  [dict({k: v for k, v in r.items() if k != "results"}, name=r["variant"]) for r in reports],
+                  params={"count": len(paths), "size": args.size, "repeat": args.repeat})
+    return reports
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# benchmarks/bench_micro.py
+# Micro-benchmarks por função: analyze_fitzpatrick (várias resoluções), get_uv_index, geocode,
+# recomendações, log_analysis (fila + commit em lote) e iter_csv.
+#
+#   python -m benchmarks.bench_micro [--sizes vga,hd,12mp] [--count 4] [--repeat 50] [--out micro.json]
+#
+# Corre num diretório temporário (bases SQLite próprias) e com as APIs externas no stub local.
+
+import argparse
+import os
+import tempfile
+import time
+
+import benchmarks  # noqa: F401  (coloca src/ no sys.path)
+from benchmarks.common import summarize, time_calls, write_results
+from benchmarks.corpus import make_corpus, parse_size
+from benchmarks.stub_server import StubServer
+
+
+def bench_fitzpatrick(tmp, sizes, count, repeat):
+    from fitzpatrick import analyze_fitzpatrick
+    results = []
+    for label in sizes:
+        size = parse_size(label)
+        folder = os.path.join(tmp, f"corpus_{label}")
+        os.makedirs(folder, exist_ok=True)
+        paths = make_corpus(folder, count, size)
+        timings = []
+        for path in paths:
+            timings += time_calls(lambda: analyze_fitzpatrick(path), max(repeat // count, 1))
+        results.append(summarize(timings, name=f"analyze_fitzpatrick[{label}]", size=f"{size[0]}x{size[1]}"))
+    return results
+
+
+def bench_uv(repeat):
+    import uv_index
+    lat, lng = 38.72, -9.14
+    uv_index.get_uv_index(lat=lat, lng=lng)  # aquece a cache
+    hit = time_calls(lambda: uv_index.get_uv_index(lat=lat, lng=lng), repeat)
+    fetch = time_calls(lambda: uv_index.fetch_uv_index(lat, lng), repeat)
+    return [
+        summarize(hit, name="get_uv_index[cache_hit]"),
+        summarize(fetch, name="fetch_uv_index[stub]"),
+    ]
+
+
+def bench_geocode(repeat):
+    import geocode
+    results = []
+    if geocode.gazetteer is not None:
+        results.append(summarize(time_calls(lambda: geocode.gazetteer.resolve("Porto, Portugal"), repeat),
+                                 name="gazetteer.resolve"))
+    geocode.resolve_location("Porto, Portugal")
+    results.append(summarize(time_calls(lambda: geocode.resolve_location("Porto, Portugal"), repeat),
+                             name="resolve_location[cache]"))
+    return results
+
+
+def bench_recommendations(repeat):
+    from recommendations import lookup_recommendation, format_analysis_html
+
+    def run():
+        rec = lookup_recommendation(7.3, "Tipo III")
+        format_analysis_html(7.3, "Tipo III", rec.recommendations)
+    return [summarize(time_calls(run, repeat), name="recommendations+html")]
+
+
+def bench_log_analysis(rows):
+    import main
+    row = main.build_log_row("analysis_completed", "photo+location", "uploads/x.jpg",
+                             "Lisbon, Portugal", uv_index=5.0, fitzpatrick_type="Tipo III",
+                             recommendations=["Use protetor solar FPS 25+"])
+    submit = []
+    start = time.perf_counter()
+    for _ in range(rows):
+        t = time.perf_counter()
+        main.log_writer.submit(row)
+        submit.append((time.perf_counter() - t) * 1000)
+    main.log_writer.flush()
+    total_s = time.perf_counter() - start
+    return [summarize(submit, name="log_analysis.submit", rows=rows,
+                      rows_per_s=round(rows / total_s, 1), commit_ms_avg=main.log_writer.stats()["commit_ms_avg"])]
+
+
+def bench_iter_csv(rows):
+    import main
+    from exports import iter_csv
+    start = time.perf_counter()
+    size = 0
+    with main.sqlite_pool.connection() as conn:
+        cur = conn.execute("SELECT * FROM analysis_log ORDER BY id")
+        for chunk in iter_csv(cur):
+            size += len(chunk)
+    elapsed = time.perf_counter() - start
+    return [{"name": "iter_csv", "rows": rows, "bytes": size, "total_ms": round(elapsed * 1000, 2),
+             "rows_per_s": round(rows / elapsed, 1)}]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks das funções do pipeline")
+    parser.add_argument("--sizes", default="vga,hd,12mp", help="resoluções do corpus (nomes ou LxA)")
+    parser.add_argument("--count", type=int, default=4, help="imagens por resolução")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--rows", type=int, default=10000, help="registos para log_analysis/iter_csv")
+    parser.add_argument("--latency-ms", type=float, default=0, help="latência simulada do stub")
+    parser.add_argument("--out", help="grava os resultados em JSON")
+    args = parser.parse_args(argv)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp, StubServer(latency_ms=args.latency_ms) as stub:
+        # Os módulos leem a configuração e criam as bases no diretório atual ao importar
+        os.environ.update(stub.app_env())
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+        os.chdir(tmp)
+        try:
+            results = []
+            results += bench_fitzpatrick(tmp, args.sizes.split(","), args.count, args.repeat)
+            results += bench_uv(args.repeat)
+            results += bench_geocode(args.repeat)
+            results += bench_recommendations(args.repeat)
+            results += bench_log_analysis(args.rows)
+            results += bench_iter_csv(args.rows)
+        finally:
+            os.chdir(cwd)
+
+    for r in results:
+        timing = f"p50={r['p50_ms']:.4f} ms p99={r['p99_ms']:.4f} ms" if "p50_ms" in r else f"{r['total_ms']} ms"
+        extra = f" ({r['rows_per_s']} linhas/s)" if "rows_per_s" in r else ""
+        print(f"{r['name']:<32} {timing}{extra}")
+    return write_results(args.out, "micro", results, params=vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# benchmarks/bench_recommendations.py
+# Custo por pedido de recomendações + HTML + JSON do log: implementação anterior vs tabela pré-calculada.
+#
+#   python -m benchmarks.bench_recommendations [--number 20000]
+
+import argparse
+import json
+import timeit
+
+import benchmarks  # noqa: F401  (coloca src/ no sys.path)
+from recommendations import SKIN_MAP, SKIN_TYPES, format_analysis_html, lookup_recommendation
+from utils import clean_text
+
+
+def baseline_recommendations(uv_index, skin_type):
+    """Implementação anterior: dict literal e procura linear por substring a cada chamada."""
+    recommendations = []
+    risco = (
+        "Alto risco" if uv_index >= 8 else
+        "Risco moderado" if uv_index >= 6 else
+        "Baixo risco"
+    )
+    recommendations.append(f"Risco: {risco}")
+    if uv_index >= 6:
+        recommendations += [
+            "Use óculos de sol com proteção UV",
+            "Use chapéu ou boné",
+            "Evite exposição entre 10h-16h"
+        ]
+    skin_map = {k: list(v) for k, v in SKIN_MAP.items()}
+    recommendations += next((v for k, v in skin_map.items() if skin_type in k), [])
+    recommendations.append("Beba bastante água")
+    recommendations.append("Coma alimentos ricos em antioxidantes")
+    return recommendations
+
+
+def baseline_html(uv_index, skin_type, recommendations):
+    html = f"<p><strong>Índice UV:</strong> {uv_index:}</p>"
+    html += f"<p><strong>Tipo de Pele:</strong> {skin_type}</p>"
+    html += "<p><strong>Recomendações:</strong></p><ul>"
+    for rec in recommendations:
+        html += f"<li>{rec}</li>"
+    html += "</ul>"
+    return html
+
+
+def baseline(uv_index, skin_type):
+    recs = baseline_recommendations(uv_index, skin_type)
+    html = baseline_html(uv_index, skin_type, recs)
+    log_json = json.dumps([clean_text(r) for r in recs], ensure_ascii=False)
+    return html, log_json
+
+
+def compiled(uv_index, skin_type):
+    rec = lookup_recommendation(uv_index, skin_type)
+    html = format_analysis_html(uv_index, skin_type, rec.recommendations)
+    return html, rec.log_json
+
+
+CASES = [(uv, st) for uv in (2.5, 6.7, 9.1) for st in SKIN_TYPES]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark das recomendações")
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    # Os dois caminhos têm de produzir exatamente o mesmo resultado
+    for uv, st in CASES:
+        assert baseline(uv, st) == compiled(uv, st), (uv, st)
+
+    results = {}
+    for name, fn in (("baseline", baseline), ("compiled", compiled)):
+        total = timeit.timeit(lambda: [fn(uv, st) for uv, st in CASES], number=args.number // len(CASES))
+        results[name] = total / (args.number // len(CASES) * len(CASES)) * 1e6
+    for name, us in results.items():
+        print(f"{name:<10} {us:8.2f} us/pedido")
+    print(f"speedup    {results['baseline'] / results['compiled']:8.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    main()
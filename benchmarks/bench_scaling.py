@@ -0,0 +1,134 @@
+# benchmarks/bench_scaling.py
+# Escalabilidade da exportação CSV e da sincronização com o MySQL para 10k..1M registos.
+#
+#   python -m benchmarks.bench_scaling [--rows 10000,100000,1000000] [--batch-size 50]
+#                                      [--mysql-latency-ms 0] [--out scaling.json]
+#
+# O MySQL é substituído por um SQLite com a mesma tabela (scp.analises -> analises),
+# para medir o custo do lado do coletor sem depender de um servidor.
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import benchmarks  # noqa: F401  (coloca src/ no sys.path)
+from benchmarks.common import write_results
+from benchmarks.corpus import photo_bytes
+
+
+class SQLiteAsMySQL:
+    """Conexão DB-API mínima com a interface usada pelo SyncEngine (placeholders %s).
+
+    A tabela já tem id_origem e a chave única: usar com `prepare_mysql=None`.
+    """
+
+    def __init__(self, path, latency_s=0.0):
+        self.conn = sqlite3.connect(path)
+        self.latency_s = latency_s
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS analises (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, id_colletor TEXT, data_hora TEXT,
+                nome_imagem TEXT, localizacao TEXT, indice_uv REAL, tipo_pele TEXT,
+                recomendacoes TEXT, estado TEXT, imagem_blob BLOB, id_origem INTEGER,
+                UNIQUE (id_colletor, id_origem))
+        """)
+
+    def cursor(self):
+        return self
+
+    def executemany(self, sql, values):
+        from sync import MYSQL_ON_DUPLICATE
+        if self.latency_s:
+            time.sleep(self.latency_s)  # ida e volta ao servidor
+        sql = sql.replace("%s", "?").replace("scp.analises", "analises")
+        self.conn.executemany(sql.replace(MYSQL_ON_DUPLICATE, "ON CONFLICT DO NOTHING"), values)
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        pass
+
+
+def populate(pool, rows, photo_path, chunk=10000):
+    from log_writer import INSERT_SQL
+    row = ("BENCH", "2026-01-01T12:00:00", "analysis_completed", "photo+location", photo_path,
+           "Lisbon, Portugal", 6.5, "Tipo III", '["Risco: Risco moderado", "Beba bastante agua"]',
+           "Analise concluida!")
+    start = time.perf_counter()
+    with pool.connection() as conn:
+        for offset in range(0, rows, chunk):
+            conn.executemany(INSERT_SQL, [row] * min(chunk, rows - offset))
+            conn.commit()
+    return time.perf_counter() - start
+
+
+def bench_export(pool, rows, use_gzip):
+    from exports import iter_csv, gzip_chunks
+    start = time.perf_counter()
+    size = 0
+    with pool.connection() as conn:
+        cur = conn.execute("SELECT * FROM analysis_log ORDER BY id")
+        chunks = iter_csv(cur)
+        if use_gzip:
+            chunks = gzip_chunks(chunks)
+        for chunk in chunks:
+            size += len(chunk)
+        cur.close()
+    elapsed = time.perf_counter() - start
+    return {"name": f"export_csv{'_gzip' if use_gzip else ''}[{rows}]", "rows": rows, "bytes": size,
+            "total_ms": round(elapsed * 1000, 1), "rows_per_s": round(rows / elapsed, 1)}
+
+
+def bench_sync(pool, rows, mysql_path, batch_size, latency_s):
+    from sync import SyncEngine, read_image_blob
+    engine = SyncEngine(pool, lambda: SQLiteAsMySQL(mysql_path, latency_s),
+                        batch_size=batch_size, read_blob=read_image_blob, prepare_mysql=None)
+    start = time.perf_counter()
+    result = engine.run()
+    elapsed = time.perf_counter() - start
+    return {"name": f"sync[{rows}]", "rows": rows, "transferred": result["transferred"],
+            "batches": result["batches"], "bytes_sent": result["bytes_sent"], "batch_size": batch_size,
+            "total_ms": round(elapsed * 1000, 1), "rows_per_s": round(rows / elapsed, 1)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Escalabilidade da exportação CSV e da sincronização")
+    parser.add_argument("--rows", default="10000,100000,1000000", help="nº de registos (lista)")
+    parser.add_argument("--batch-size", type=int, default=50, help="registos por lote na sincronização")
+    parser.add_argument("--mysql-latency-ms", type=float, default=0, help="latência simulada por lote")
+    parser.add_argument("--photo-size", default="320x240", help="foto usada como imagem_blob")
+    parser.add_argument("--out", help="grava os resultados em JSON")
+    args = parser.parse_args(argv)
+
+    from sqlite_pool import SQLitePool
+    from migrations import MIGRATIONS
+    from benchmarks.corpus import parse_size
+
+    results = []
+    for rows in [int(r) for r in args.rows.split(",")]:
+        with tempfile.TemporaryDirectory() as tmp:
+            photo_path = os.path.join(tmp, "foto.jpg")
+            with open(photo_path, "wb") as f:
+                f.write(photo_bytes(parse_size(args.photo_size)))
+            pool = SQLitePool(os.path.join(tmp, "analysis.db"), migrations=MIGRATIONS)
+            populate_s = populate(pool, rows, photo_path)
+            print(f"{rows} registos inseridos em {populate_s:.1f}s")
+            for use_gzip in (False, True):
+                r = bench_export(pool, rows, use_gzip)
+                results.append(r)
+                print(f"  {r['name']:<28} {r['total_ms']:>10.1f} ms {r['rows_per_s']:>12.1f} linhas/s {r['bytes']} bytes")
+            r = bench_sync(pool, rows, os.path.join(tmp, "mysql.db"), args.batch_size, args.mysql_latency_ms / 1000)
+            results.append(r)
+            print(f"  {r['name']:<28} {r['total_ms']:>10.1f} ms {r['rows_per_s']:>12.1f} linhas/s {r['batches']} lotes")
+            pool.close_all()
+    return write_results(args.out, "scaling", results, params=vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# benchmarks/bench_upload.py
+# Bytes enviados e tempo upload -> análise: foto original vs reduzida no cliente (/client_config).
+#
+#   python -m benchmarks.bench_upload [--sizes vga,hd,12mp] [--repeat 10] [--bandwidth-kbps 1000,8000]
+#                                     [--out upload.json]
+#
+# A redução no cliente é simulada com o Pillow (mesmo lado maior e qualidade JPEG que o
+# browser recebe em /client_config). O tempo na rede é estimado por `bytes * 8 / largura de banda`
+# e somado ao tempo medido contra o servidor local, para comparar ligações móveis fracas.
+
+import argparse
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from benchmarks.common import summarize, write_results
+from benchmarks.corpus import parse_size, photo_bytes
+from benchmarks.load_test import SERVE_PY, free_port, wait_ready
+from benchmarks.stub_server import StubServer
+
+
+def client_resize(photo, config):
+    """Equivalente ao resize-worker.js: lado maior <= upload_max_side, JPEG com upload_quality."""
+    from PIL import Image
+    start = time.perf_counter()
+    with Image.open(io.BytesIO(photo)) as img:
+        img.draft("RGB", (config["upload_max_side"], config["upload_max_side"]))
+        img = img.convert("RGB")
+        img.thumbnail((config["upload_max_side"], config["upload_max_side"]))
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=round(config["upload_quality"] * 100))
+    return buf.getvalue(), (time.perf_counter() - start) * 1000
+
+
+def cycle(http, base_url, photo):
+    start = time.perf_counter()
+    r = http.post(base_url + "/upload", files={"photo": ("foto.jpg", photo, "image/jpeg")}, timeout=60)
+    if not (r.ok and r.json().get("status") == "success"):
+        raise RuntimeError(f"upload falhou: {r.text[:200]}")
+    r = http.post(base_url + "/analyze", json={}, timeout=60)
+    if not (r.ok and r.json().get("status") == "success"):
+        raise RuntimeError(f"análise falhou: {r.text[:200]}")
+    return (time.perf_counter() - start) * 1000
+
+
+def run(base_url, sizes, repeat, bandwidths):
+    results = []
+    with requests.Session() as http:
+        http.get(base_url + "/", timeout=30)
+        http.get(base_url + "/detect_location", timeout=30)
+        config = http.get(base_url + "/client_config", timeout=30).json()
+        print(f"/client_config: lado maior {config['upload_max_side']} px, qualidade {config['upload_quality']}")
+        for size_name in sizes:
+            size = parse_size(size_name)
+            # Fotos diferentes em cada repetição (evita a deduplicação e a cache de resultados)
+            originals = [photo_bytes(size, seed) for seed in range(repeat)]
+            for mode in ("original", "client_resize"):
+                sent, resize_ms, server_ms = [], [], []
+                for photo in originals:
+                    if mode == "client_resize":
+                        photo, ms = client_resize(photo, config)
+                        resize_ms.append(ms)
+                    sent.append(len(photo))
+                    server_ms.append(cycle(http, base_url, photo))
+                row = {
+                    "name": f"{mode}[{size_name}]",
+                    "mode": mode,
+                    "size": list(size),
+                    "bytes_on_wire": round(sum(sent) / len(sent)),
+                    "resize": summarize(resize_ms) if resize_ms else None,
+                    "server": summarize(server_ms),
+                }
+                client_ms = resize_ms or [0.0] * len(sent)
+                for kbps in bandwidths:
+                    # Ponta-a-ponta estimado: redução no cliente + transferência + servidor
+                    total = [c + b * 8 / kbps + s for c, b, s in zip(client_ms, sent, server_ms)]
+                    row[f"e2e@{kbps:g}kbps"] = summarize(total)
+                results.append(row)
+                e2e = "  ".join(f"{k}: p50={v['p50_ms']:.0f} ms" for k, v in row.items() if k.startswith("e2e@"))
+                print(f"{row['name']:<24} {row['bytes_on_wire']:>10} bytes  servidor p50={row['server']['p50_ms']:.1f} ms  {e2e}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bytes enviados e tempo do upload com e sem redução no cliente")
+    parser.add_argument("--sizes", default="vga,hd,12mp", help="resoluções das fotos (lista)")
+    parser.add_argument("--repeat", type=int, default=10, help="fotos por resolução e modo")
+    parser.add_argument("--bandwidth-kbps", default="1000,8000", help="ligações simuladas (kbit/s, lista)")
+    parser.add_argument("--backend", default="werkzeug", choices=["auto", "gunicorn", "waitress", "werkzeug"])
+    parser.add_argument("--out", help="grava os resultados em JSON")
+    args = parser.parse_args(argv)
+
+    bandwidths = [float(b) for b in args.bandwidth_kbps.split(",")]
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    with StubServer() as stub, tempfile.TemporaryDirectory() as cwd:
+        env = dict(os.environ, SECRET_KEY="bench-upload", LOG_LEVEL="WARNING", **stub.app_env())
+        proc = subprocess.Popen(
+            [sys.executable, SERVE_PY, "--host", "127.0.0.1", "--port", str(port),
+             "--workers", "1", "--backend", args.backend],
+            cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_ready(base_url + "/count_analyses")
+            results = run(base_url, args.sizes.split(","), args.repeat, bandwidths)
+        finally:
+            proc.terminate()
+            proc.wait(30)
+    return write_results(args.out, "upload", results, params=vars(args))
+
+
+if __name__ == "__main__":
+    main()
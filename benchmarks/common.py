@@ -0,0 +1,79 @@
+# benchmarks/common.py
+# Utilitários partilhados: estatísticas, medição de tempo e gravação dos resultados em JSON
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import benchmarks
+
+REPO_DIR = os.path.dirname(benchmarks.SRC_DIR)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(timings_ms, **extra):
+    """p50/p99/média de uma lista de tempos (ms)."""
+    return dict(
+        samples=len(timings_ms),
+        p50_ms=round(statistics.median(timings_ms), 4) if timings_ms else None,
+        p99_ms=round(percentile(timings_ms, 99), 4) if timings_ms else None,
+        mean_ms=round(statistics.fmean(timings_ms), 4) if timings_ms else None,
+        **extra,
+    )
+
+
+def time_calls(fn, repeat, warmup=1):
+    """Executa `fn()` `repeat` vezes; devolve os tempos em ms."""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                             capture_output=True, text=True, timeout=10)
+        commit = out.stdout.strip() or None
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR,
+                               capture_output=True, text=True, timeout=10).stdout.strip()
+        return f"{commit}-dirty" if commit and dirty else commit
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment():
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_results(path, suite, results, params=None):
+    """Grava `{suite, environment, params, results}`; `results` é uma lista de dicts com `name`."""
+    doc = {"suite": suite, "environment": environment(), "params": params or {}, "results": results}
+    if path:
+        with open(path, "w") as f:
+            json.dump(doc, f, indent=2)
+        print(f"Resultados gravados em {path}")
+    return doc
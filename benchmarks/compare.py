@@ -0,0 +1,73 @@
+# benchmarks/compare.py
+# Compara dois ficheiros de resultados (p.ex. de dois commits) e assinala regressões.
+#
+#   python -m benchmarks.compare base.json novo.json [--threshold 10]
+#
+# Termina com código 1 se alguma métrica piorar mais do que `--threshold` %.
+
+import argparse
+import json
+import sys
+
+# Métricas comparadas: True = maior é melhor
+METRICS = {
+    "p50_ms": False,
+    "p99_ms": False,
+    "total_ms": False,
+    "rows_per_s": True,
+    "cycles_per_s": True,
+    "rps": True,
+}
+
+
+def _flatten(result, prefix=""):
+    # Resultados do e2e têm sub-dicts (upload/analyze/cycle)
+    for key, value in result.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{key}.")
+        elif key in METRICS and isinstance(value, (int, float)):
+            yield f"{prefix}{key}", key, value
+
+
+def compare(base, new, threshold):
+    base_by_name = {r["name"]: r for r in base["results"]}
+    rows = []
+    for result in new["results"]:
+        old = base_by_name.get(result["name"])
+        if old is None:
+            continue
+        old_values = {path: value for path, _, value in _flatten(old)}
+        for path, key, value in _flatten(result):
+            before = old_values.get(path)
+            if not before:
+                continue
+            change = (value - before) / before * 100
+            worse = -change if METRICS[key] else change
+            rows.append((result["name"], path, before, value, change, worse > threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara resultados de benchmarks entre commits")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="piora máxima aceite (%%)")
+    args = parser.parse_args(argv)
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    print(f"{base['suite']}: {base['environment'].get('commit')} -> {new['environment'].get('commit')}")
+
+    rows = compare(base, new, args.threshold)
+    for name, path, before, after, change, regressed in rows:
+        flag = "REGRESSÃO" if regressed else ""
+        print(f"{name:<32} {path:<18} {before:>12.4g} -> {after:<12.4g} {change:+7.1f}% {flag}")
+    regressions = sum(r[5] for r in rows)
+    print(f"{regressions} regressão(ões) acima de {args.threshold}%")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
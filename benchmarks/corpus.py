@@ -0,0 +1,50 @@
+# benchmarks/corpus.py
+# Corpora de fotos sintéticas (gradiente + ruído, semelhantes a fotos de telemóvel) em várias resoluções
+
+import io
+import os
+
+RESOLUTIONS = {
+    "vga": (640, 480),
+    "hd": (1920, 1080),
+    "12mp": (4000, 3000),
+}
+
+
+def synthetic_image(size, seed=0):
+    from PIL import Image
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    w, h = size
+    base = rng.integers(90, 230, size=3)
+    grad = np.linspace(0.8, 1.2, w, dtype=np.float32)[None, :, None]
+    noise = rng.normal(0, 12, size=(h, w, 3)).astype(np.float32)
+    arr = np.clip(base[None, None, :] * grad + noise, 0, 255).astype(np.uint8)
+    return Image.fromarray(arr)
+
+
+def photo_bytes(size, seed=0, quality=92):
+    buf = io.BytesIO()
+    synthetic_image(size, seed).save(buf, "JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def make_corpus(folder, count, size, quality=92, seed=42):
+    """Grava `count` fotos JPEG de `size` em `folder`; devolve os caminhos (determinístico por `seed`)."""
+    w, h = size
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"synthetic_{i:03d}_{w}x{h}.jpg")
+        with open(path, "wb") as f:
+            f.write(photo_bytes(size, seed + i, quality))
+        paths.append(path)
+    return paths
+
+
+def parse_size(text):
+    """'hd' ou '1920x1080' -> (1920, 1080)."""
+    if text in RESOLUTIONS:
+        return RESOLUTIONS[text]
+    w, h = (int(v) for v in text.lower().split("x"))
+    return w, h
@@ -0,0 +1,135 @@
+# benchmarks/load_test.py
+# Mede o throughput do servidor de produção (src/serve.py) com diferentes números de workers.
+#
+#   python -m benchmarks.load_test [--workers 1,2,4] [--threads 4] [--clients 8] [--duration 10]
+#                                  [--backend auto] [--path /upload]
+#
+# Cada configuração arranca o servidor num diretório temporário e é carregada por
+# processos cliente separados (para o cliente não ficar limitado pelo GIL).
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+import benchmarks
+from benchmarks.common import write_results
+
+SERVE_PY = os.path.join(benchmarks.SRC_DIR, "serve.py")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url, timeout=60, interval=0.2):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(interval)
+    raise RuntimeError(f"Servidor não respondeu em {url}")
+
+
+def make_photo(size=(1600, 1200), seed=0):
+    from PIL import Image
+    import numpy as np
+    pixels = (np.random.default_rng(seed).random((size[1], size[0], 3)) * 255).astype("uint8")
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, "JPEG", quality=85)
+    return buf.getvalue()
+
+
+def client(args):
+    """Processo cliente: pedidos em ciclo até ao fim do tempo; devolve as latências (ms)."""
+    base_url, path, duration, photo = args
+    latencies = []
+    errors = 0
+    with requests.Session() as http:
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                if photo is not None:
+                    r = http.post(base_url + path, files={"photo": ("foto.jpg", photo, "image/jpeg")}, timeout=30)
+                else:
+                    r = http.get(base_url + path, timeout=30)
+                if r.status_code >= 400:
+                    errors += 1
+            except requests.RequestException:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, errors
+
+
+def run_config(workers, threads, clients, duration, backend, path, photo):
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, SECRET_KEY="load-test", GAZETTEER_ENABLED="1")
+    with tempfile.TemporaryDirectory() as cwd:
+        proc = subprocess.Popen(
+            [sys.executable, SERVE_PY, "--host", "127.0.0.1", "--port", str(port),
+             "--workers", str(workers), "--threads", str(threads), "--backend", backend],
+            cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_ready(base_url + "/count_analyses")
+            with multiprocessing.Pool(clients) as pool:
+                results = pool.map(client, [(base_url, path, duration, photo)] * clients)
+        finally:
+            proc.terminate()
+            proc.wait(30)
+    latencies = sorted(lat for lats, _ in results for lat in lats)
+    errors = sum(e for _, e in results)
+    return {
+        "workers": workers,
+        "threads": threads,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(statistics.median(latencies), 2) if latencies else None,
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 2) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga do servidor de produção por número de workers")
+    parser.add_argument("--workers", default="1,2,4", help="lista de nº de workers, separados por vírgula")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=8, help="processos cliente concorrentes")
+    parser.add_argument("--duration", type=float, default=10.0, help="segundos por configuração")
+    parser.add_argument("--backend", default="auto", choices=["auto", "gunicorn", "waitress", "werkzeug"])
+    parser.add_argument("--path", default="/upload", help="/upload envia uma foto; outros caminhos usam GET")
+    parser.add_argument("--json", action="store_true", help="imprime os resultados em JSON")
+    parser.add_argument("--out", help="grava os resultados em JSON")
+    args = parser.parse_args()
+
+    photo = make_photo() if args.path == "/upload" else None
+    rows = []
+    for workers in [int(w) for w in args.workers.split(",")]:
+        row = run_config(workers, args.threads, args.clients, args.duration, args.backend, args.path, photo)
+        rows.append(row)
+        if not args.json:
+            base = rows[0]["rps"] or 1
+            print(f"workers={row['workers']:<3} threads={row['threads']:<3} "
+                  f"{row['rps']:>8.1f} req/s  x{row['rps'] / base:4.2f}  "
+                  f"p50={row['p50_ms']} ms  p99={row['p99_ms']} ms  errors={row['errors']}")
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    write_results(args.out, "load", [dict(r, name=f"workers={r['workers']}") for r in rows], params=vars(args))
+
+
+if __name__ == "__main__":
+    main()
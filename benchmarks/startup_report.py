@@ -0,0 +1,115 @@
+# benchmarks/startup_report.py
+# Custo do arranque: tempo de import por módulo e tempo até à primeira resposta HTTP.
+#
+#   python -m benchmarks.startup_report [--top 25] [--runs 3] [--out startup.json]
+#
+# Usa `python -X importtime -c "import main"` num diretório temporário (o main cria a
+# base de dados e as pastas no cwd). O tempo até à primeira resposta arranca src/serve.py
+# com o backend werkzeug e mede até o /count_analyses responder.
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import benchmarks
+from benchmarks.common import summarize, write_results
+from benchmarks.load_test import SERVE_PY, free_port, wait_ready
+
+# Dependências que devem ser carregadas só quando usadas
+HEAVY_MODULES = ("PIL", "numpy", "requests", "mysql", "geopy", "asyncio")
+
+
+def parse_importtime(stderr):
+    """Linhas `import time: self | cumulative | nome` -> lista de (nome, self_us, cum_us, nível)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        level = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cum_us), level))
+    return rows
+
+
+def import_main(env=None):
+    """Importa o main num processo novo; devolve (linhas do importtime, módulos pesados carregados, ms)."""
+    code = ("import sys, time; sys.path.insert(0, %r); start = time.perf_counter(); import main; "
+            "print(round((time.perf_counter() - start) * 1000, 1), "
+            "','.join(m for m in %r if m in sys.modules), sep=';')" % (benchmarks.SRC_DIR, HEAVY_MODULES))
+    with tempfile.TemporaryDirectory() as cwd:
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=cwd,
+                              env=env, capture_output=True, text=True, check=True)
+    elapsed, loaded = proc.stdout.strip().splitlines()[-1].split(";")
+    return parse_importtime(proc.stderr), [m for m in loaded.split(",") if m], float(elapsed)
+
+
+def by_package(rows):
+    """Tempo próprio somado por pacote de topo (flask, werkzeug, src, ...)."""
+    local = {os.path.splitext(f)[0] for f in os.listdir(benchmarks.SRC_DIR) if f.endswith(".py")}
+    totals = {}
+    for name, self_us, _, _ in rows:
+        top = name.split(".")[0]
+        key = "src" if top in local else top
+        totals[key] = totals.get(key, 0) + self_us
+    return sorted(totals.items(), key=lambda kv: -kv[1])
+
+
+def first_response_ms(env):
+    """Do lançamento do processo até à primeira resposta do servidor."""
+    port = free_port()
+    with tempfile.TemporaryDirectory() as cwd:
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, SERVE_PY, "--host", "127.0.0.1", "--port", str(port), "--backend", "werkzeug"],
+            cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_ready(f"http://127.0.0.1:{port}/count_analyses", timeout=60, interval=0.01)
+            return (time.perf_counter() - start) * 1000
+        finally:
+            proc.terminate()
+            proc.wait(30)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Relatório do tempo de arranque por módulo")
+    parser.add_argument("--top", type=int, default=25, help="módulos mostrados (por tempo acumulado)")
+    parser.add_argument("--runs", type=int, default=3, help="arranques medidos até à primeira resposta")
+    parser.add_argument("--no-prewarm", action="store_true", help="desliga o pré-aquecimento (PREWARM_IMPORTS=0)")
+    parser.add_argument("--out", help="grava os resultados em JSON")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ, SECRET_KEY="startup-report", LOG_LEVEL="WARNING",
+               PREWARM_IMPORTS="0" if args.no_prewarm else "1")
+    # O import é medido sem pré-aquecimento (a thread baralharia a árvore do importtime)
+    rows, loaded, import_ms = import_main(dict(env, PREWARM_IMPORTS="0"))
+
+    print(f"import main: {import_ms:.1f} ms")
+    print(f"{'módulo':<40} {'próprio ms':>10} {'acumulado ms':>13}")
+    top = sorted(rows, key=lambda r: -r[2])[:args.top]
+    for name, self_us, cum_us, level in top:
+        print(f"{'  ' * min(level, 4) + name:<40} {self_us / 1000:>10.1f} {cum_us / 1000:>13.1f}")
+    packages = by_package(rows)
+    print("\nPor pacote (tempo próprio):")
+    for package, self_us in packages[:15]:
+        print(f"  {package:<24} {self_us / 1000:>8.1f} ms")
+    print(f"\nDependências pesadas carregadas no import: {', '.join(loaded) or 'nenhuma'}")
+
+    first = [first_response_ms(env) for _ in range(args.runs)]
+    first_summary = summarize(first)
+    print(f"Primeira resposta HTTP: p50={first_summary['p50_ms']} ms (n={args.runs})")
+
+    results = [
+        {"name": "import_main", "total_ms": import_ms, "eager_heavy_modules": loaded},
+        dict(first_summary, name="first_response"),
+    ]
+    results += [{"name": f"module:{name}", "self_ms": self_us / 1000, "cumulative_ms": cum_us / 1000}
+                for name, self_us, cum_us, _ in top]
+    results += [{"name": f"package:{package}", "self_ms": self_us / 1000} for package, self_us in packages]
+    return write_results(args.out, "startup", results, params=vars(args))
+
+
+if __name__ == "__main__":
+    main()
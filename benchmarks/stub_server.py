@@ -0,0 +1,132 @@
+# benchmarks/stub_server.py
+# Servidor HTTP local que imita as APIs externas (OpenWeather UV, ipgeolocation, Nominatim)
+#
+#   python -m benchmarks.stub_server [--port 8089] [--latency-ms 50]
+#
+# Para apontar a aplicação ao stub use `StubServer.app_env()` (OPENWEATHER_URL,
+# IPGEOLOCATION_URL, NOMINATIM_DOMAIN/SCHEME e chaves fictícias).
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+def _uv_for(lat, lng):
+    # Valor determinístico por coordenada (0..11)
+    return round((abs(lat) * 7 + abs(lng) * 3) % 11, 2)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, como as APIs reais
+    # Cabeçalhos e corpo num único envio (evita o atraso Nagle/delayed ACK de ~40 ms)
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self.server.count(url.path)
+        if self.server.latency_s:
+            time.sleep(self.server.latency_s)
+
+        if url.path == "/data/2.5/uvi":
+            lat, lng = float(query.get("lat", 0)), float(query.get("lon", 0))
+            self._send(200, {"lat": lat, "lon": lng, "value": _uv_for(lat, lng)})
+        elif url.path == "/ipgeo":
+            self._send(200, {"city": "Lisbon", "country_name": "Portugal",
+                             "latitude": "38.72509", "longitude": "-9.14980"})
+        elif url.path == "/search":
+            q = query.get("q", "")
+            seed = sum(map(ord, q))
+            self._send(200, [{
+                "place_id": seed, "lat": str(30 + seed % 30), "lon": str(-10 + seed % 40),
+                "display_name": f"{q} (stub)", "importance": 0.5,
+            }])
+        else:
+            self._send(404, {"error": "not found"})
+
+
+class StubServer:
+    """Stub em thread de fundo; usar como context manager."""
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency_s = latency_ms / 1000
+        self.httpd.requests = {}
+        lock = threading.Lock()
+
+        def count(path):
+            with lock:
+                self.httpd.requests[path] = self.httpd.requests.get(path, 0) + 1
+        self.httpd.count = count
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def requests(self):
+        return dict(self.httpd.requests)
+
+    def app_env(self):
+        """Variáveis de ambiente que fazem a aplicação usar o stub em vez das APIs reais."""
+        host, port = self.httpd.server_address[:2]
+        return {
+            "OPENWEATHER_URL": f"{self.base_url}/data/2.5/uvi",
+            "OPENWEATHER_API_KEY": "stub",
+            "IPGEOLOCATION_URL": f"{self.base_url}/ipgeo",
+            "IPGEOLOCATION_API_KEY": "stub",
+            "NOMINATIM_DOMAIN": f"{host}:{port}",
+            "NOMINATIM_SCHEME": "http",
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="stub-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub local das APIs OpenWeather, ipgeolocation e Nominatim")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+    stub = StubServer(args.host, args.port, args.latency_ms)
+    for name, value in stub.app_env().items():
+        print(f"{name}={value}")
+    try:
+        stub.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
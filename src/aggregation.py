@@ -0,0 +1,321 @@
+# src/aggregation.py
+# Agregação das análises de todos os coletores (scp.analises) em rollups colunares NumPy
+#
+#   python src/aggregation.py refresh [--store rollups.npz]
+#   python src/aggregation.py query uv --location "Lisbon, Portugal" --start 2026-01-01
+#
+# Lê só as colunas necessárias (nunca a imagem_blob), por lotes a partir do último id
+# agregado, e mantém uma tabela por (dia, coletor, localização, tipo de pele) com
+# contagens, somas do UV e um histograma do UV. As consultas do dashboard agrupam
+# essa tabela (poucos milhares de linhas) em memória.
+#
+# A ligação, o placeholder e o nome da tabela são configuráveis; com um SQLite
+# (`connect=lambda: sqlite3.connect(path), placeholder="?", table="analises"`) os
+# rollups podem ser testados sem servidor MySQL.
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Histograma do UV: classes de 0,5 de 0 a 16 (a última inclui valores acima)
+UV_BIN_WIDTH = 0.5
+UV_BINS = 32
+
+SELECT_BATCH_SQL = """
+    SELECT id, id_colletor, data_hora, localizacao, indice_uv, tipo_pele
+    FROM {table}
+    WHERE id > {ph}
+    ORDER BY id
+    LIMIT {ph}
+"""
+
+# Colunas da tabela de factos (uma linha por dia/coletor/localização/tipo de pele)
+KEY_COLUMNS = ("day", "collector", "location", "skin")
+VALUE_COLUMNS = ("count", "uv_count", "uv_sum", "uv_sq_sum")
+
+
+# Dia dos registos com data_hora NULL ou inválida (agregados à parte, como UV/tipo de pele NULL)
+UNKNOWN_DAY = np.iinfo(np.int32).min
+
+
+def _day_number(text):
+    # "2026-01-01T12:00:00" -> dias desde 1970-01-01
+    return int(np.datetime64(str(text)[:10], "D").astype(np.int64))
+
+
+def _row_day(value):
+    """Dia de um registo; UNKNOWN_DAY se a data faltar ou não for válida."""
+    if value is None:
+        return UNKNOWN_DAY
+    try:
+        day = np.datetime64(str(value)[:10], "D")
+    except ValueError:
+        return UNKNOWN_DAY
+    return UNKNOWN_DAY if np.isnat(day) else int(day.astype(np.int64))
+
+
+def _day_text(number):
+    return None if number == UNKNOWN_DAY else str(np.datetime64(int(number), "D"))
+
+
+class _Dictionary:
+    """Codificação de texto em inteiros (colunas coletor, localização e tipo de pele)."""
+
+    def __init__(self, values=()):
+        self.values = list(values)
+        self.codes = {v: i for i, v in enumerate(self.values)}
+
+    def code(self, value):
+        value = "" if value is None else str(value)
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, value):
+        return self.codes.get(value)
+
+    def array(self):
+        return np.array(self.values, dtype=str)
+
+
+class Aggregator:
+    """Rollups colunares das análises sincronizadas, atualizados de forma incremental."""
+
+    def __init__(self, connect, store_path="rollups.npz", placeholder="%s", table="scp.analises",
+                 batch_size=5000):
+        self.connect = connect
+        self.store_path = store_path
+        self.batch_size = batch_size
+        self.select_sql = SELECT_BATCH_SQL.format(table=table, ph=placeholder)
+        self._lock = threading.Lock()
+        self._reset()
+        if store_path and os.path.exists(store_path):
+            self.load()
+
+    def _reset(self):
+        self.last_id = 0
+        self.collectors = _Dictionary()
+        self.locations = _Dictionary()
+        self.skins = _Dictionary()
+        self.keys = np.zeros((0, len(KEY_COLUMNS)), dtype=np.int32)
+        self.values = np.zeros((0, len(VALUE_COLUMNS)), dtype=np.float64)
+        self.uv_hist = np.zeros((0, UV_BINS), dtype=np.int64)
+        self._rows = {}
+
+    # -----------------------------------------------------------------------------------------
+    # Persistência (.npz)
+
+    def load(self):
+        with np.load(self.store_path, allow_pickle=False) as data:
+            self.last_id = int(data["last_id"])
+            self.collectors = _Dictionary(data["collectors"].tolist())
+            self.locations = _Dictionary(data["locations"].tolist())
+            self.skins = _Dictionary(data["skins"].tolist())
+            self.keys = data["keys"]
+            self.values = data["values"]
+            self.uv_hist = data["uv_hist"]
+        self._rows = {tuple(k): i for i, k in enumerate(self.keys.tolist())}
+
+    def save(self):
+        """Grava os rollups de forma atómica (ficheiro temporário + substituição)."""
+        tmp = f"{self.store_path}.part.npz"
+        np.savez_compressed(
+            tmp, last_id=np.int64(self.last_id),
+            collectors=self.collectors.array(), locations=self.locations.array(), skins=self.skins.array(),
+            keys=self.keys, values=self.values, uv_hist=self.uv_hist)
+        os.replace(tmp, self.store_path)
+
+    # -----------------------------------------------------------------------------------------
+    # Atualização incremental
+
+    def _add_batch(self, rows):
+        n = len(rows)
+        keys = np.empty((n, len(KEY_COLUMNS)), dtype=np.int32)
+        uv = np.full(n, np.nan)
+        for i, (_, collector, data_hora, location, uv_index, skin) in enumerate(rows):
+            keys[i] = (_row_day(data_hora), self.collectors.code(collector),
+                       self.locations.code(location), self.skins.code(skin))
+            if uv_index is not None:
+                uv[i] = float(uv_index)
+
+        # Linhas da tabela de factos de cada registo (novas combinações vão para o fim)
+        index = np.empty(n, dtype=np.int64)
+        new_keys = []
+        for i, key in enumerate(map(tuple, keys.tolist())):
+            row = self._rows.get(key)
+            if row is None:
+                row = self._rows[key] = len(self.keys) + len(new_keys)
+                new_keys.append(key)
+            index[i] = row
+        if new_keys:
+            grow = len(new_keys)
+            self.keys = np.vstack([self.keys, np.array(new_keys, dtype=np.int32)])
+            self.values = np.vstack([self.values, np.zeros((grow, len(VALUE_COLUMNS)))])
+            self.uv_hist = np.vstack([self.uv_hist, np.zeros((grow, UV_BINS), dtype=np.int64)])
+
+        has_uv = ~np.isnan(uv)
+        uv_values = np.where(has_uv, uv, 0.0)
+        np.add.at(self.values, (index, 0), 1)
+        np.add.at(self.values, (index, 1), has_uv)
+        np.add.at(self.values, (index, 2), uv_values)
+        np.add.at(self.values, (index, 3), uv_values ** 2)
+        bins = np.clip((uv[has_uv] / UV_BIN_WIDTH).astype(np.int64), 0, UV_BINS - 1)
+        np.add.at(self.uv_hist, (index[has_uv], bins), 1)
+
+    def refresh(self, max_batches=None):
+        """Agrega os registos com id acima do último agregado; devolve um resumo."""
+        start = time.perf_counter()
+        added = 0
+        batches = 0
+        with self._lock:
+            conn = self.connect()
+            try:
+                cursor = conn.cursor()
+                while max_batches is None or batches < max_batches:
+                    cursor.execute(self.select_sql, (self.last_id, self.batch_size))
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+                    self._add_batch(rows)
+                    self.last_id = rows[-1][0]
+                    added += len(rows)
+                    batches += 1
+                cursor.close()
+            finally:
+                conn.close()
+            if added and self.store_path:
+                self.save()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        logger.info("Agregados %d registos em %d lotes (%.0f ms); último id %s", added, batches, elapsed_ms, self.last_id)
+        return {"added": added, "batches": batches, "last_id": self.last_id, "groups": len(self.keys),
+                "elapsed_ms": round(elapsed_ms, 1)}
+
+    # -----------------------------------------------------------------------------------------
+    # Consultas
+
+    def _mask(self, collector=None, location=None, start=None, end=None):
+        """Filtro das linhas da tabela de factos (datas 'AAAA-MM-DD', inclusive)."""
+        mask = np.ones(len(self.keys), dtype=bool)
+        for column, dictionary, value in ((1, self.collectors, collector), (2, self.locations, location)):
+            if value is not None:
+                code = dictionary.lookup(value)
+                if code is None:
+                    return np.zeros(len(self.keys), dtype=bool)
+                mask &= self.keys[:, column] == code
+        if start is not None or end is not None:
+            # Registos sem data não entram em consultas por período
+            mask &= self.keys[:, 0] != UNKNOWN_DAY
+        if start is not None:
+            mask &= self.keys[:, 0] >= _day_number(start)
+        if end is not None:
+            mask &= self.keys[:, 0] <= _day_number(end)
+        return mask
+
+    def analyses_per_collector(self, **filters):
+        """{coletor: nº de análises}"""
+        mask = self._mask(**filters)
+        counts = np.bincount(self.keys[mask, 1], weights=self.values[mask, 0],
+                             minlength=len(self.collectors.values))
+        return {name: int(c) for name, c in zip(self.collectors.values, counts) if c}
+
+    def skin_types(self, by_day=True, **filters):
+        """Contagens por tipo de pele, por localização (e por dia)."""
+        mask = self._mask(**filters)
+        group_cols = [0, 2, 3] if by_day else [2, 3]
+        groups, inverse = np.unique(self.keys[mask][:, group_cols], axis=0, return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=self.values[mask, 0], minlength=len(groups))
+        result = []
+        for group, count in zip(groups.tolist(), counts):
+            *day, location, skin = group
+            item = {"location": self.locations.values[location], "skin_type": self.skins.values[skin] or None,
+                    "count": int(count)}
+            if by_day:
+                item["day"] = _day_text(day[0])
+            result.append(item)
+        return result
+
+    def uv_distribution(self, **filters):
+        """Histograma, média e desvio padrão do UV das análises filtradas."""
+        mask = self._mask(**filters)
+        n, total, sq = self.values[mask, 1:].sum(axis=0) if mask.any() else (0.0, 0.0, 0.0)
+        mean = float(total / n) if n else None
+        stddev = float(np.sqrt(max(sq / n - mean ** 2, 0.0))) if n else None
+        hist = self.uv_hist[mask].sum(axis=0) if mask.any() else np.zeros(UV_BINS, dtype=np.int64)
+        return {
+            "count": int(n),
+            "mean": round(mean, 3) if mean is not None else None,
+            "stddev": round(stddev, 3) if stddev is not None else None,
+            "bin_width": UV_BIN_WIDTH,
+            "histogram": hist.tolist(),
+        }
+
+    def daily_counts(self, **filters):
+        """{dia: nº de análises}; registos sem data contam em None."""
+        mask = self._mask(**filters)
+        days, inverse = np.unique(self.keys[mask, 0], return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=self.values[mask, 0], minlength=len(days))
+        return {_day_text(d): int(c) for d, c in zip(days, counts)}
+
+    def stats(self):
+        return {"last_id": self.last_id, "groups": len(self.keys), "collectors": len(self.collectors.values),
+                "locations": len(self.locations.values),
+                "bytes": self.keys.nbytes + self.values.nbytes + self.uv_hist.nbytes}
+
+
+def mysql_connect_from_env():
+    """Ligação ao MySQL central (variáveis MYSQL_HOST, MYSQL_PORT, MYSQL_USER, MYSQL_PASSWORD, MYSQL_DATABASE)."""
+    import mysql.connector
+    return mysql.connector.connect(
+        host=os.getenv("MYSQL_HOST", "localhost"),
+        port=int(os.getenv("MYSQL_PORT", 3306)),
+        user=os.getenv("MYSQL_USER", "scp_user"),
+        password=os.getenv("MYSQL_PASSWORD", "scp_user"),
+        database=os.getenv("MYSQL_DATABASE", "scp"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rollups das análises de todos os coletores")
+    parser.add_argument("--store", default=os.getenv("ROLLUP_STORE", "rollups.npz"))
+    parser.add_argument("--sqlite", help="usar um SQLite com a tabela `analises` em vez do MySQL")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("refresh", help="agrega os registos novos")
+    query = sub.add_parser("query", help="consulta os rollups")
+    query.add_argument("kind", choices=["collectors", "skin", "uv", "daily", "stats"])
+    for name in ("collector", "location", "start", "end"):
+        query.add_argument(f"--{name}")
+    args = parser.parse_args(argv)
+
+    if args.sqlite:
+        import sqlite3
+        aggregator = Aggregator(lambda: sqlite3.connect(args.sqlite), args.store, placeholder="?", table="analises")
+    else:
+        aggregator = Aggregator(mysql_connect_from_env, args.store)
+
+    if args.command == "refresh":
+        result = aggregator.refresh()
+    else:
+        filters = {k: getattr(args, k) for k in ("collector", "location", "start", "end") if getattr(args, k)}
+        start = time.perf_counter()
+        result = {
+            "collectors": lambda: aggregator.analyses_per_collector(**filters),
+            "skin": lambda: aggregator.skin_types(**filters),
+            "uv": lambda: aggregator.uv_distribution(**filters),
+            "daily": lambda: aggregator.daily_counts(**filters),
+            "stats": aggregator.stats,
+        }[args.kind]()
+        logger.info("Consulta em %.2f ms", (time.perf_counter() - start) * 1000)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+    main()
@@ -0,0 +1,68 @@
+# src/batch.py
+# Análise de várias fotos em paralelo (ProcessPoolExecutor com um processo por core)
+
+import atexit
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from fitzpatrick import classify_brightness, skin_brightness
+from recommendations import get_recommendations
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Pool de processos partilhado, criado no primeiro uso."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+            atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+        return _executor
+
+
+def classify_image(path, mask_skin=False):
+    """Executado nos processos do pool; ao contrário de analyze_fitzpatrick, propaga erros."""
+    return classify_brightness(skin_brightness(path, mask_skin=mask_skin))
+
+
+def analyze_many(paths, uv_index, mask_skin=False, executor=None):
+    """Classifica `paths` em paralelo e devolve os resultados à medida que terminam.
+
+    Cada item é um dict com `index`, `path`, `status` e, conforme o caso,
+    `fitzpatrick_type` + `recommendations` ou `error`. Uma imagem inválida
+    não interrompe as restantes. `uv_index` é um valor para todas as fotos ou
+    uma lista com um valor por foto (fotos captadas em locais diferentes).
+    """
+    executor = executor or get_executor()
+    futures = {executor.submit(classify_image, p, mask_skin): (i, p) for i, p in enumerate(paths)}
+    for fut in as_completed(futures):
+        index, path = futures[fut]
+        try:
+            skin_type = fut.result()
+        except Exception as e:
+            yield {"index": index, "path": path, "status": "error", "error": str(e)}
+            continue
+        uv = uv_index[index] if isinstance(uv_index, (list, tuple)) else uv_index
+        yield {
+            "index": index,
+            "path": path,
+            "status": "success",
+            "uv_index": uv,
+            "fitzpatrick_type": skin_type,
+            "recommendations": get_recommendations(uv, skin_type),
+        }
+
+
+def analyze_batch(paths, location=None, lat=None, lng=None, mask_skin=False):
+    """API Python: obtém o índice UV uma única vez para o local e analisa todas as fotos."""
+    from uv_index import get_uv_index
+
+    if lat is not None and lng is not None:
+        uv_index = get_uv_index(lat=lat, lng=lng)
+    else:
+        uv_index = get_uv_index(location=location)
+    results = sorted(analyze_many(paths, uv_index, mask_skin=mask_skin), key=lambda r: r["index"])
+    return uv_index, results
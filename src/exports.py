@@ -0,0 +1,121 @@
+# src/exports.py
+# Exportação em streaming do analysis_log (CSV por blocos, gzip opcional)
+
+import base64
+import csv
+import json
+import os
+import zlib
+from io import StringIO
+
+CHUNK_ROWS = 500
+
+
+def filter_clauses(since=None, until=None, id_collector=None):
+    """Condições (lista) e parâmetros para os filtros de exportação.
+
+    `since`/`until` são datas/horas ISO (comparadas como texto, como o
+    timestamp gravado); `since` é inclusivo e `until` exclusivo.
+    """
+    clauses = []
+    params = []
+    if since:
+        clauses.append("timestamp >= ?")
+        params.append(since)
+    if until:
+        clauses.append("timestamp < ?")
+        params.append(until)
+    if id_collector:
+        clauses.append("id_collector = ?")
+        params.append(id_collector)
+    return clauses, params
+
+
+def export_filters(since=None, until=None, id_collector=None):
+    """Cláusula WHERE e parâmetros para os filtros de exportação (ver filter_clauses)."""
+    clauses, params = filter_clauses(since, until, id_collector)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+
+def iter_csv(cursor, chunk_rows=CHUNK_ROWS, header=True):
+    """Gera o CSV do cursor em blocos de bytes UTF-8, `chunk_rows` linhas de cada vez."""
+    buf = StringIO()
+    writer = csv.writer(buf)
+    if header:
+        writer.writerow([d[0] for d in cursor.description])
+    while True:
+        rows = cursor.fetchmany(chunk_rows)
+        if rows:
+            writer.writerows(rows)
+        data = buf.getvalue()
+        if data:
+            buf.seek(0)
+            buf.truncate()
+            yield data.encode("utf-8")
+        if not rows:
+            break
+
+
+def gzip_chunks(chunks, level=6):
+    """Comprime um iterável de bytes em formato gzip, sem o juntar em memória."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 -> cabeçalho gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def tee_to_file(chunks, path):
+    """Escreve cada bloco em `path` enquanto o devolve; remove o ficheiro se a exportação não terminar."""
+    completed = False
+    try:
+        with open(path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                yield chunk
+        completed = True
+    finally:
+        if not completed:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def encode_cursor(last_id, last_timestamp=None, filters=None):
+    """Cursor opaco da exportação incremental: id e timestamp do último registo entregue
+    e os filtros (since/until/id_collector) da primeira página, aplicados em todas as seguintes."""
+    data = {"v": 1, "id": last_id, "ts": last_timestamp}
+    if filters:
+        data["f"] = {name: value for name, value in filters.items() if value}
+    raw = json.dumps(data, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Devolve (last_id, last_timestamp, filters); ValueError se o cursor for inválido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        last_id = int(data["id"])
+        filters = dict(data.get("f") or {})
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError(f"Cursor inválido: {e}")
+    if data.get("v") != 1 or last_id < 0 or not set(filters) <= {"since", "until", "id_collector"}:
+        raise ValueError("Cursor inválido")
+    return last_id, data.get("ts"), filters
+
+
+def ndjson_page(columns, rows):
+    """Uma linha JSON por registo."""
+    return "".join(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in rows).encode("utf-8")
+
+
+def csv_page(columns, rows):
+    buf = StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    writer.writerows(rows)
+    return buf.getvalue().encode("utf-8")
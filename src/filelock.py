@@ -0,0 +1,114 @@
+# src/filelock.py
+# Lock de ficheiro entre processos (fcntl em POSIX, msvcrt em Windows) e escrita atómica
+
+import json
+import os
+import time
+import uuid
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+
+class LockTimeout(Exception):
+    pass
+
+
+class FileLock:
+    """Lock exclusivo sobre `path` partilhado por todos os processos (workers).
+
+    Uso: `with FileLock("x.lock"): ...` ou `acquire(blocking=False)` para
+    apenas tentar.
+    """
+
+    def __init__(self, path, timeout=10.0, poll=0.05):
+        self.path = path
+        self.timeout = timeout
+        self.poll = poll
+        self._fd = None
+
+    def _try_lock(self, fd):
+        try:
+            if os.name == "nt":
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self, blocking=True):
+        if self._fd is not None:
+            raise RuntimeError(f"Lock já adquirido: {self.path}")
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = time.monotonic() + self.timeout
+        while not self._try_lock(fd):
+            if not blocking or time.monotonic() >= deadline:
+                os.close(fd)
+                if not blocking:
+                    return False
+                raise LockTimeout(f"Tempo esgotado à espera do lock {self.path}")
+            time.sleep(self.poll)
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            if os.name == "nt":
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    @property
+    def locked(self):
+        return self._fd is not None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def write_atomic(path, data):
+    """Escreve `data` (str ou bytes) num temporário e substitui `path` de uma vez."""
+    folder = os.path.dirname(path) or "."
+    tmp = os.path.join(folder, f".{os.path.basename(path)}.{uuid.uuid4().hex}.tmp")
+    mode = "wb" if isinstance(data, bytes) else "w"
+    try:
+        with open(tmp, mode) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def write_json_atomic(path, obj, lock_path=None):
+    """Grava JSON com lock entre processos e substituição atómica."""
+    with FileLock(lock_path or f"{path}.lock"):
+        write_atomic(path, json.dumps(obj))
+
+
+def read_json(path, default=None):
+    """Lê JSON gravado com `write_json_atomic` (nunca vê um ficheiro a meio)."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return default
@@ -1,39 +1,79 @@
-from PIL import Image
-import numpy as np
+import logging
 
-def analyze_fitzpatrick(image_path):
+logger = logging.getLogger(__name__)
+
+# Versão do classificador (mudar sempre que o resultado puder mudar; faz parte da chave da cache)
+FITZPATRICK_VERSION = "2"
+
+# Resolução usada na análise (a imagem original nunca é necessária em tamanho real)
+ANALYSIS_SIZE = (100, 100)
+
+# Fração mínima de pixels de pele para usar a máscara; abaixo disso usa a imagem toda
+MIN_SKIN_FRACTION = 0.05
+
+
+def load_analysis_image(source, size=ANALYSIS_SIZE):
+    """Open an image already reduced to the analysis resolution.
+
+    For JPEG, `draft()` makes the decoder work at 1/2, 1/4 or 1/8 scale, so
+    large phone photos are never decoded at full size. Other formats are
+    shrunk with `reducing_gap`, which uses the fast integer `reduce()` first.
+    """
+    from PIL import Image  # imports pesados só na primeira análise
+    img = Image.open(source)
+    if img.format == "JPEG":
+        img.draft("RGB", size)
+    img = img.convert('RGB')
+    if img.size != size:
+        img = img.resize(size, reducing_gap=3.0)
+    return img
+
+
+def skin_mask(pixels):
+    """Boolean mask of likely skin pixels (RGB rule of Kovac et al.)."""
+    import numpy as np
+    rgb = pixels.astype(np.int16)
+    r, g, b = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+    spread = rgb.max(axis=1) - rgb.min(axis=1)
+    return (
+        (r > 95) & (g > 40) & (b > 20) & (spread > 15)
+        & (np.abs(r - g) > 15) & (r > g) & (r > b)
+    )
+
+
+def skin_brightness(source, mask_skin=False):
+    """Mean brightness of the image (or of its skin pixels). Raises on invalid images."""
+    import numpy as np
+    pixels = np.asarray(load_analysis_image(source)).reshape(-1, 3)
+    if mask_skin:
+        mask = skin_mask(pixels)
+        if mask.mean() >= MIN_SKIN_FRACTION:
+            pixels = pixels[mask]
+    # Uma única passagem para as médias dos três canais
+    channel_means = pixels.mean(axis=0, dtype=np.float64)
+    return float(channel_means.mean())
+
+
+def classify_brightness(brightness):
+    """Map brightness to Fitzpatrick types (simplified)."""
+    if brightness > 200:
+        return "Tipo I"
+    elif brightness > 180:
+        return "Tipo II"
+    elif brightness > 160:
+        return "Tipo III"
+    elif brightness > 140:
+        return "Tipo IV"
+    elif brightness > 120:
+        return "Tipo V"
+    else:
+        return "Tipo VI"
+
+
+def analyze_fitzpatrick(image_path, mask_skin=False):
     """Analyze skin type based on Fitzpatrick scale (simplified version)."""
     try:
-        # Open and convert image
-        img = Image.open(image_path)
-        img = img.convert('RGB')
-        img = img.resize((100, 100))  # Resize for processing
-        
-        # Convert to numpy array
-        img_array = np.array(img)
-        
-        # Calculate average RGB values
-        avg_r = np.mean(img_array[:,:,0])
-        avg_g = np.mean(img_array[:,:,1])  
-        avg_b = np.mean(img_array[:,:,2])
-        
-        # Simple brightness calculation
-        brightness = (avg_r + avg_g + avg_b) / 3
-        
-        # Map brightness to Fitzpatrick types (simplified)
-        if brightness > 200:
-            return "Tipo I"
-        elif brightness > 180:
-            return "Tipo II"
-        elif brightness > 160:
-            return "Tipo III"
-        elif brightness > 140:
-            return "Tipo IV"
-        elif brightness > 120:
-            return "Tipo V"
-        else:
-            return "Tipo VI"
-            
+        return classify_brightness(skin_brightness(image_path, mask_skin=mask_skin))
     except Exception as e:
-        print(f"Fitzpatrick analysis error: {e}")
+        logger.warning("Fitzpatrick analysis error: %s", e)
         return "Tipo III"  # Default fallback
@@ -0,0 +1,279 @@
+# src/geocode.py
+# Resolução local -> coordenadas: cache persistente, gazetteer offline e Nominatim como último recurso
+
+import bisect
+import csv
+import logging
+import os
+import sys
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+from metrics import stage_timer
+from sqlite_pool import SQLitePool
+
+logger = logging.getLogger(__name__)
+
+# Nomes de países em português/variantes -> nome usado no gazetteer (já normalizados)
+COUNTRY_ALIASES = {
+    "espanha": "spain", "espana": "spain",
+    "franca": "france",
+    "reino unido": "united kingdom", "uk": "united kingdom", "inglaterra": "united kingdom",
+    "irlanda": "ireland",
+    "alemanha": "germany", "deutschland": "germany",
+    "italia": "italy",
+    "holanda": "netherlands", "paises baixos": "netherlands",
+    "belgica": "belgium",
+    "luxemburgo": "luxembourg",
+    "suica": "switzerland",
+    "republica checa": "czechia", "chequia": "czechia", "czech republic": "czechia",
+    "polonia": "poland",
+    "hungria": "hungary",
+    "romenia": "romania",
+    "grecia": "greece",
+    "suecia": "sweden",
+    "noruega": "norway",
+    "dinamarca": "denmark",
+    "finlandia": "finland",
+    "brasil": "brazil",
+    "mocambique": "mozambique",
+    "cabo verde": "cape verde",
+    "guine-bissau": "guinea-bissau", "guine bissau": "guinea-bissau",
+    "sao tome e principe": "sao tome and principe",
+    "timor leste": "timor-leste", "timor": "timor-leste",
+    "estados unidos": "united states", "usa": "united states", "eua": "united states",
+}
+
+GEOCODE_CACHE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS geocode_cache (
+        query TEXT PRIMARY KEY,
+        lat REAL NOT NULL,
+        lng REAL NOT NULL,
+        address TEXT,
+        source TEXT,
+        created_at REAL NOT NULL
+    )
+    """,
+]
+
+
+def normalize_location(text):
+    """Minúsculas, sem acentos e com espaços/vírgulas uniformizados ("  Lisboa ,Portugal" -> "lisboa, portugal")."""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    parts = [" ".join(p.split()) for p in text.split(",")]
+    return ", ".join(p for p in parts if p)
+
+
+def _trigrams(name):
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class Place:
+    __slots__ = ("name", "country", "lat", "lng", "population", "names", "country_key")
+
+    def __init__(self, name, country, lat, lng, population=0, alt_names=()):
+        self.name = name
+        self.country = country
+        self.lat = lat
+        self.lng = lng
+        self.population = population
+        self.names = {normalize_location(n) for n in (name, *alt_names)}
+        self.country_key = normalize_location(country)
+
+
+class Gazetteer:
+    """Tabela compacta de cidades com índice exato, por prefixo e por trigramas."""
+
+    def __init__(self, places):
+        self.places = list(places)
+        self._exact = defaultdict(list)
+        self._trigram_index = defaultdict(set)
+        self._name_trigrams = {}
+        for idx, place in enumerate(self.places):
+            for name in place.names:
+                self._exact[name].append(idx)
+        self._sorted_names = sorted(self._exact)
+        for name in self._sorted_names:
+            grams = _trigrams(name)
+            self._name_trigrams[name] = grams
+            for g in grams:
+                self._trigram_index[g].add(name)
+
+    @classmethod
+    def load(cls, path):
+        places = []
+        with open(path, encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                places.append(Place(
+                    row["name"], row["country"], float(row["lat"]), float(row["lng"]),
+                    int(row["population"] or 0), [n for n in row["alt_names"].split("|") if n]))
+        return cls(places)
+
+    def _by_prefix(self, prefix):
+        start = bisect.bisect_left(self._sorted_names, prefix)
+        names = []
+        for name in self._sorted_names[start:]:
+            if not name.startswith(prefix):
+                break
+            names.append(name)
+        return names
+
+    def _by_similarity(self, query, threshold=0.4):
+        grams = _trigrams(query)
+        shared = defaultdict(int)
+        for g in grams:
+            for name in self._trigram_index.get(g, ()):
+                shared[name] += 1
+        scored = []
+        for name, common in shared.items():
+            score = common / len(grams | self._name_trigrams[name])
+            if score >= threshold:
+                scored.append((score, name))
+        scored.sort(reverse=True)
+        return [name for _, name in scored[:5]]
+
+    def resolve(self, query, fuzzy=True):
+        """Place para "cidade" ou "cidade, país"; None se não houver correspondência.
+
+        Com fuzzy=False só aceita o nome exato ou um nome alternativo; prefixo e
+        trigramas podem devolver outra cidade ("Porto Santo" -> Porto).
+        """
+        key = normalize_location(query)
+        if not key:
+            return None
+        parts = key.split(", ")
+        city = parts[0]
+        country = None
+        if len(parts) > 1:
+            country = COUNTRY_ALIASES.get(parts[-1], parts[-1])
+
+        finders = [lambda: [city] if city in self._exact else []]
+        if fuzzy:
+            finders += [lambda: self._by_prefix(city) if len(city) >= 3 else [],
+                        lambda: self._by_similarity(city)]
+        for finder in finders:
+            candidates = [self.places[i] for name in finder() for i in self._exact[name]]
+            if country:
+                candidates = [p for p in candidates if p.country_key == country]
+            if candidates:
+                return max(candidates, key=lambda p: p.population)
+        return None
+
+
+class GeocodeCache:
+    """Resultados de geocoding persistidos em SQLite, por texto de local normalizado."""
+
+    def __init__(self, path):
+        self.pool = SQLitePool(path, max_size=4, schema=GEOCODE_CACHE_SCHEMA)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query):
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT lat, lng, address FROM geocode_cache WHERE query = ?", (normalize_location(query),)).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return row
+
+    def set(self, query, lat, lng, address, source):
+        with self.pool.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO geocode_cache (query, lat, lng, address, source, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (normalize_location(query), lat, lng, address, source, time.time()))
+            conn.commit()
+
+    def stats(self):
+        with self.pool.connection() as conn:
+            size = conn.execute("SELECT COUNT(*) FROM geocode_cache").fetchone()[0]
+        with self._lock:
+            return {"size": size, "hits": self.hits, "misses": self.misses}
+
+
+def _default_gazetteer_path():
+    here = os.path.dirname(os.path.abspath(__file__))
+    # No executável PyInstaller a pasta src/ é copiada para _MEIPASS/src
+    for base in (here, os.path.join(getattr(sys, "_MEIPASS", here), "src")):
+        path = os.path.join(base, "data", "gazetteer.csv")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH") or _default_gazetteer_path()
+GAZETTEER_ENABLED = os.getenv("GAZETTEER_ENABLED", "1") not in ("0", "false", "no")
+
+geocode_cache = GeocodeCache(os.getenv("GEOCODE_CACHE_PATH", "geocode_cache.db"))
+gazetteer = Gazetteer.load(GAZETTEER_PATH) if GAZETTEER_ENABLED and GAZETTEER_PATH else None
+
+_geolocator = None
+_stats = defaultdict(int)
+
+
+def _get_geolocator():
+    global _geolocator
+    if _geolocator is None:
+        from geopy.geocoders import Nominatim
+        # NOMINATIM_DOMAIN/NOMINATIM_SCHEME permitem usar uma instância própria (ou o stub dos benchmarks)
+        _geolocator = Nominatim(user_agent="SCP_Collector",
+                                domain=os.getenv("NOMINATIM_DOMAIN", "nominatim.openstreetmap.org"),
+                                scheme=os.getenv("NOMINATIM_SCHEME", "https"))
+    return _geolocator
+
+
+def resolve_location(location, timeout=10):
+    """(lat, lng, address) para um texto livre.
+
+    Ordem: cache persistente -> nome exato no gazetteer -> Nominatim (resultado guardado
+    na cache). A correspondência aproximada do gazetteer só é usada se o Nominatim falhar
+    (sem rede, timeout) e nunca fica na cache.
+    """
+    with stage_timer("geocode"):
+        return _resolve_location(location, timeout)
+
+
+def _resolve_location(location, timeout):
+    cached = geocode_cache.get(location)
+    if cached is not None:
+        _stats["cache"] += 1
+        return cached
+
+    if gazetteer is not None:
+        place = gazetteer.resolve(location, fuzzy=False)
+        if place is not None:
+            _stats["gazetteer"] += 1
+            return place.lat, place.lng, f"{place.name}, {place.country}"
+
+    start_geo = time.time()
+    try:
+        location_data = _get_geolocator().geocode(location, timeout=timeout)
+    except Exception as e:
+        place = gazetteer.resolve(location) if gazetteer is not None else None
+        if place is None:
+            raise
+        logger.warning("Nominatim indisponível (%s); local aproximado pelo gazetteer: %s", e, place.name)
+        _stats["gazetteer_fuzzy"] += 1
+        return place.lat, place.lng, f"{place.name}, {place.country}"
+    logger.info("Geocode tempo: %.2fs", time.time() - start_geo)
+    if not location_data:
+        raise Exception("Invalid location. Please enter a valid city and country (e.g., 'Lisbon, Portugal').")
+    _stats["nominatim"] += 1
+    result = (location_data.latitude, location_data.longitude, location_data.address)
+    geocode_cache.set(location, *result, source="nominatim")
+    return result
+
+
+def geocode_stats():
+    stats = {"resolved_by": dict(_stats), "cache": geocode_cache.stats()}
+    stats["gazetteer_places"] = len(gazetteer.places) if gazetteer is not None else 0
+    return stats
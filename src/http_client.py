@@ -0,0 +1,137 @@
+# src/http_client.py
+# Cliente HTTP partilhado para APIs externas: keep-alive, limites por host, timeouts e retries com jitter
+
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from urllib.parse import urlsplit
+
+
+# Limites dos buckets do histograma de latência (ms)
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyHistogram:
+    """Histograma cumulativo simples (formato compatível com Prometheus)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # último = +Inf
+        self.total = 0
+        self.sum_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms):
+        idx = bisect_left(self.buckets, ms)  # primeiro limite >= ms (len = +Inf)
+        with self._lock:
+            self.counts[idx] += 1
+            self.total += 1
+            self.sum_ms += ms
+
+    def snapshot(self):
+        with self._lock:
+            cumulative = []
+            running = 0
+            for bound, n in zip(self.buckets + ("+Inf",), self.counts):
+                running += n
+                cumulative.append((bound, running))
+            return {
+                "count": self.total,
+                "sum_ms": round(self.sum_ms, 3),
+                "avg_ms": round(self.sum_ms / self.total, 3) if self.total else 0.0,
+                "buckets": cumulative,
+            }
+
+
+class HTTPClient:
+    """Sessão `requests` partilhada com pool de conexões por host.
+
+    `timeout` é (connect, read) e aplica-se a todas as chamadas; erros de
+    rede e respostas 429/5xx são repetidos com backoff exponencial + jitter.
+    """
+
+    def __init__(self, pool_hosts=10, per_host=4, timeout=(3.05, 10), retries=3, backoff=0.5):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_hosts = pool_hosts
+        self.per_host = per_host
+        self._session = None
+        self._lock = threading.Lock()
+        self._latency = {}
+        self._errors = {}
+
+    @property
+    def session(self):
+        # `requests` só é importado no primeiro pedido (arranque mais rápido)
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    # pool_block: no máximo `per_host` conexões simultâneas a cada host
+                    adapter = HTTPAdapter(pool_connections=self.pool_hosts, pool_maxsize=self.per_host, pool_block=True)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
+
+    def _histogram(self, host):
+        with self._lock:
+            hist = self._latency.get(host)
+            if hist is None:
+                hist = self._latency[host] = LatencyHistogram()
+            return hist
+
+    def _error(self, host):
+        with self._lock:
+            self._errors[host] = self._errors.get(host, 0) + 1
+
+    def _sleep(self, attempt):
+        time.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+    def get(self, url, params=None, timeout=None, retries=None, **kwargs):
+        import requests
+        host = urlsplit(url).netloc
+        attempts = retries or self.retries
+        for attempt in range(attempts):
+            last = attempt == attempts - 1
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, timeout=timeout or self.timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._histogram(host).observe((time.perf_counter() - start) * 1000)
+                self._error(host)
+                # Só o tipo do erro: a mensagem inclui o URL com a chave da API
+                logger.warning("HTTP %s tentativa %d/%d falhou: %s", host, attempt + 1, attempts, type(e).__name__)
+                if last:
+                    raise
+                self._sleep(attempt)
+                continue
+            self._histogram(host).observe((time.perf_counter() - start) * 1000)
+            if response.status_code in RETRY_STATUS and not last:
+                self._error(host)
+                self._sleep(attempt)
+                continue
+            return response
+
+    async def aget(self, url, params=None, timeout=None, retries=None, **kwargs):
+        """Variante asyncio: corre o pedido numa thread, reutilizando o mesmo pool de conexões."""
+        import asyncio
+        return await asyncio.to_thread(self.get, url, params=params, timeout=timeout, retries=retries, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            hosts = dict(self._latency)
+            errors = dict(self._errors)
+        return {host: dict(hist.snapshot(), errors=errors.get(host, 0)) for host, hist in hosts.items()}
+
+
+http_client = HTTPClient()
@@ -0,0 +1,277 @@
+# src/jobs.py
+# Tarefas longas (ex.: sincronização com o MySQL) executadas fora do pedido HTTP
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+JOB_COLUMNS = ("id, kind, key, status, total, rows_done, bytes_sent, result, error, "
+               "cancel_requested, created_at, started_at, finished_at")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """Estado e progresso de uma tarefa; atualizado pela thread que a executa."""
+
+    def __init__(self, kind, key, total=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.status = "queued"   # queued | running | done | cancelled | error
+        self.total = total
+        self.rows_done = 0
+        self.bytes_sent = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_row(cls, row):
+        """Cópia só de leitura de uma tarefa gravada na tabela jobs (p.ex. de outro worker)."""
+        (job_id, kind, key, status, total, rows_done, bytes_sent, result, error,
+         cancel_requested, created_at, started_at, finished_at) = row
+        job = cls(kind, key, total)
+        job.id = job_id
+        job.status = status
+        job.rows_done = rows_done
+        job.bytes_sent = bytes_sent
+        job.result = json.loads(result) if result else None
+        job.error = error
+        job.created_at = created_at
+        job.started_at = started_at
+        job.finished_at = finished_at
+        if cancel_requested:
+            job._cancel.set()
+        return job
+
+    @property
+    def active(self):
+        return self.status in ACTIVE_STATUSES
+
+    def progress(self, rows_done, bytes_sent):
+        with self._lock:
+            self.rows_done = rows_done
+            self.bytes_sent = bytes_sent
+
+    def cancel(self):
+        self._cancel.set()
+
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def eta_seconds(self):
+        # Estimativa pela taxa média desde o início
+        if not self.total or not self.started_at or not self.rows_done or not self.active:
+            return None
+        elapsed = time.time() - self.started_at
+        remaining = max(self.total - self.rows_done, 0)
+        return round(remaining * elapsed / self.rows_done, 1)
+
+    def to_dict(self):
+        with self._lock:
+            end = self.finished_at or time.time()
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "rows_done": self.rows_done,
+                "rows_total": self.total,
+                "bytes_sent": self.bytes_sent,
+                "eta_seconds": self.eta_seconds(),
+                "elapsed_seconds": round(end - self.started_at, 3) if self.started_at else 0.0,
+                "cancel_requested": self._cancel.is_set(),
+                "result": self.result,
+                "error": self.error,
+            }
+
+
+class JobManager:
+    """Executa cada tarefa numa thread própria; no máximo uma tarefa ativa por `key`.
+
+    Com `pool` (SQLitePool com a tabela jobs) o estado fica também no SQLite:
+    qualquer worker vê a tarefa em /jobs/<id>, pode cancelá-la e sabe que já há
+    uma tarefa ativa com a mesma `key` noutro processo. O processo dono grava o
+    progresso e um heartbeat a cada `heartbeat_interval` segundos; uma tarefa
+    sem heartbeat há mais de `stale_after` segundos (processo terminado) deixa
+    de contar como ativa.
+    """
+
+    def __init__(self, max_finished=50, pool=None, heartbeat_interval=1.0, stale_after=30.0):
+        self.max_finished = max_finished
+        self.pool = pool
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self._jobs = OrderedDict()
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, key, fn, total=None):
+        """Inicia `fn(job)` em segundo plano; devolve (job, criado).
+
+        Se já houver uma tarefa ativa com a mesma `key` (neste ou noutro
+        processo), devolve essa tarefa e `criado=False` em vez de iniciar outra.
+        """
+        with self._lock:
+            current = self._active.get(key)
+            if current is not None and current.active:
+                return current, False
+            job = Job(kind, key, total)
+            if self.pool is not None:
+                other = self._claim(job)
+                if other is not None:
+                    return other, False
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._prune()
+        threading.Thread(target=self._run, args=(job, fn), name=f"job-{kind}", daemon=True).start()
+        return job, True
+
+    def _claim(self, job):
+        """Regista a tarefa no SQLite, exceto se outro processo já tiver uma ativa com a mesma key."""
+        now = time.time()
+        with self.pool.connection() as conn:
+            # BEGIN IMMEDIATE: dois workers não podem criar a mesma tarefa ao mesmo tempo
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE jobs SET status = 'error', error = 'Processo da tarefa terminou', finished_at = ? "
+                "WHERE key = ? AND status IN ('queued', 'running') AND heartbeat_at < ?",
+                (now, job.key, now - self.stale_after))
+            row = conn.execute(
+                f"SELECT {JOB_COLUMNS} FROM jobs WHERE key = ? AND status IN ('queued', 'running') "
+                "ORDER BY created_at DESC LIMIT 1", (job.key,)).fetchone()
+            if row is not None:
+                conn.commit()
+                return Job.from_row(row)
+            conn.execute(
+                "INSERT INTO jobs (id, kind, key, status, total, pid, created_at, heartbeat_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.kind, job.key, job.status, job.total, os.getpid(), job.created_at, now))
+            conn.execute(
+                "DELETE FROM jobs WHERE status NOT IN ('queued', 'running') AND id NOT IN "
+                "(SELECT id FROM jobs WHERE status NOT IN ('queued', 'running') ORDER BY created_at DESC LIMIT ?)",
+                (self.max_finished,))
+            conn.commit()
+        return None
+
+    def _save(self, job):
+        """Grava estado, progresso e heartbeat; devolve o pedido de cancelamento vindo de outro worker."""
+        if self.pool is None:
+            return False
+        d = job.to_dict()
+        values = (job.status, d["rows_done"], d["bytes_sent"],
+                  json.dumps(job.result, default=str) if job.result is not None else None,
+                  job.error, job.started_at, job.finished_at, time.time(), job.id)
+        try:
+            with self.pool.connection() as conn:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, rows_done = ?, bytes_sent = ?, result = ?, error = ?, "
+                    "started_at = ?, finished_at = ?, heartbeat_at = ? WHERE id = ?", values)
+                row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job.id,)).fetchone()
+                conn.commit()
+        except Exception as e:
+            logger.warning("Falha ao gravar o estado da tarefa %s: %s", job.id, e)
+            return False
+        return bool(row and row[0])
+
+    def _heartbeat(self, job, finished):
+        while not finished.wait(self.heartbeat_interval):
+            if self._save(job):
+                job.cancel()
+
+    def _run(self, job, fn):
+        job.status = "running"
+        job.started_at = time.time()
+        finished = threading.Event()
+        if self.pool is not None:
+            self._save(job)
+            threading.Thread(target=self._heartbeat, args=(job, finished),
+                             name=f"job-{job.kind}-heartbeat", daemon=True).start()
+        try:
+            job.result = fn(job)
+            job.status = "cancelled" if job.cancel_requested() else "done"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "error"
+        finally:
+            job.finished_at = time.time()
+            finished.set()
+            self._save(job)
+            with self._lock:
+                if self._active.get(job.key) is job:
+                    del self._active[job.key]
+
+    def _prune(self):
+        # Mantém apenas as últimas `max_finished` tarefas terminadas
+        finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+        for job_id in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self._jobs[job_id]
+
+    def _load(self, where, params):
+        if self.pool is None:
+            return None
+        with self.pool.connection() as conn:
+            row = conn.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE {where}", params).fetchone()
+        return Job.from_row(row) if row is not None else None
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            # Tarefa de outro worker (ou deste processo antes de reiniciar)
+            job = self._load("id = ?", (job_id,))
+        return job
+
+    def active(self, key):
+        with self._lock:
+            job = self._active.get(key)
+        if job is None:
+            job = self._load(
+                "key = ? AND status IN ('queued', 'running') AND heartbeat_at >= ? ORDER BY created_at DESC LIMIT 1",
+                (key, time.time() - self.stale_after))
+        return job
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None and job.active:
+            job.cancel()
+            if self.pool is not None:
+                # O processo dono vê o pedido no próximo heartbeat
+                with self.pool.connection() as conn:
+                    conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+                    conn.commit()
+        return job
+
+    def stats(self):
+        if self.pool is not None:
+            with self.pool.connection() as conn:
+                counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+                active = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running') AND heartbeat_at >= ?",
+                    (time.time() - self.stale_after,)).fetchone()[0]
+            return {"jobs": sum(counts.values()), "active": active, "by_status": counts}
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {"jobs": len(self._jobs), "active": len(self._active), "by_status": counts}
@@ -0,0 +1,218 @@
+# src/log_writer.py
+# Escrita assíncrona (write-behind) dos registos do analysis_log em lotes
+
+import logging
+import os
+import queue
+import threading
+import time
+
+from metrics import observe_stage
+
+logger = logging.getLogger(__name__)
+
+INSERT_SQL = """
+    INSERT INTO analysis_log
+    (id_collector,timestamp,event_type,input_type,input_value,
+     location,uv_index,fitzpatrick_type,recommendations,status_message)
+    VALUES (?,?,?,?,?,?,?,?,?,?)
+"""
+
+_WAKE = object()  # sinal para o writer gravar já o que tiver em fila
+
+
+class LogWriter:
+    """Thread de fundo que agrupa INSERTs num único commit por lote.
+
+    O lote é gravado quando atinge `batch_size` registos ou quando passam
+    `flush_interval` segundos desde o primeiro registo pendente. `submit`
+    bloqueia quando a fila está cheia (backpressure) e `flush` espera até
+    que tudo o que já foi submetido esteja no SQLite.
+
+    Um lote que falhe (p.ex. "database is locked") não se perde: volta a ser
+    gravado com espera crescente até `retry_max_delay` segundos. No shutdown
+    desiste ao fim de `close_retries` tentativas.
+    """
+
+    def __init__(self, pool, max_queue=1000, batch_size=100, flush_interval=0.5,
+                 retry_delay=0.1, retry_max_delay=5.0, close_retries=3):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_delay = retry_delay
+        self.retry_max_delay = retry_max_delay
+        self.close_retries = close_retries
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+        self._submitted = 0
+        self._committed = 0
+        self._batches = 0
+        self._errors = 0
+        self._dropped = 0
+        self._last_error = None
+        self._blocked = 0
+        self._commit_ms_total = 0.0
+        self._commit_ms_max = 0.0
+        self._commit_ms_last = 0.0
+
+    def start(self):
+        with self._cond:
+            # Após fork (p.ex. gunicorn) a thread do processo pai não existe
+            if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._stopping = False
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="analysis-log-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, row, timeout=None):
+        """Coloca um registo na fila; bloqueia se a fila estiver cheia."""
+        self.start()
+        with self._cond:
+            self._submitted += 1
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._cond:
+                self._blocked += 1
+            try:
+                self._queue.put(row, timeout=timeout)
+            except queue.Full:
+                with self._cond:
+                    self._submitted -= 1
+                raise
+
+    def submit_many(self, rows, timeout=None):
+        """Submete vários registos e pede gravação imediata (INSERT em lote)."""
+        for row in rows:
+            self.submit(row, timeout=timeout)
+        if rows:
+            try:
+                self._queue.put(_WAKE, timeout=timeout)
+            except queue.Full:
+                pass
+
+    def flush(self, timeout=10):
+        """Espera até que os registos já submetidos estejam gravados.
+
+        Devolve False se o tempo acabar ou se uma gravação falhar entretanto
+        (o lote fica para nova tentativa).
+        """
+        with self._cond:
+            target = self._submitted
+            if self._committed >= target:
+                return True
+            errors = self._errors
+        self.start()
+        try:
+            self._queue.put(_WAKE, timeout=timeout)
+        except queue.Full:
+            pass
+        with self._cond:
+            self._cond.wait_for(lambda: self._committed >= target or self._errors > errors, timeout=timeout)
+            return self._committed >= target
+
+    def close(self, timeout=10):
+        """Grava o que estiver pendente e termina a thread (usar no shutdown)."""
+        if not self._thread or self._pid != os.getpid():
+            return
+        self._stopping = True
+        try:
+            self._queue.put(_WAKE, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def _collect(self):
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            if deadline is None:
+                timeout = self.flush_interval
+            else:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is _WAKE:
+                # Esvazia o que já estiver na fila e grava imediatamente
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _WAKE:
+                        batch.append(item)
+                break
+            batch.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+        return batch
+
+    def _write(self, batch):
+        start = time.perf_counter()
+        try:
+            with self.pool.connection() as conn:
+                conn.executemany(INSERT_SQL, batch)
+                conn.commit()
+        except Exception as e:
+            logger.error("Falha ao gravar lote no SQLite (%d registos): %s", len(batch), e)
+            with self._cond:
+                self._errors += 1
+                self._last_error = str(e)
+                self._cond.notify_all()
+            return False
+        elapsed = (time.perf_counter() - start) * 1000
+        observe_stage("sqlite_insert", elapsed)
+        with self._cond:
+            self._committed += len(batch)
+            self._batches += 1
+            self._commit_ms_last = elapsed
+            self._commit_ms_total += elapsed
+            self._commit_ms_max = max(self._commit_ms_max, elapsed)
+            self._cond.notify_all()
+        return True
+
+    def _write_with_retry(self, batch):
+        """Grava o lote; em caso de erro tenta de novo com espera crescente."""
+        attempt = 0
+        while not self._write(batch):
+            attempt += 1
+            if self._stopping and attempt >= self.close_retries:
+                logger.error("Descartados %d registos do analysis_log no shutdown", len(batch))
+                with self._cond:
+                    self._dropped += len(batch)
+                return
+            time.sleep(min(self.retry_delay * 2 ** (attempt - 1), self.retry_max_delay))
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch:
+                self._write_with_retry(batch)
+            if self._stopping and self._queue.empty():
+                break
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queue_max": self._queue.maxsize,
+                "submitted": self._submitted,
+                "committed": self._committed,
+                "pending": self._submitted - self._committed,
+                "batches": self._batches,
+                "errors": self._errors,
+                "dropped": self._dropped,
+                "last_error": self._last_error,
+                "blocked_submits": self._blocked,
+                "commit_ms_last": round(self._commit_ms_last, 3),
+                "commit_ms_avg": round(self._commit_ms_total / self._batches, 3) if self._batches else 0.0,
+                "commit_ms_max": round(self._commit_ms_max, 3),
+            }
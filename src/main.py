@@ -2,26 +2,51 @@
 # Aplicação Flask para análise de fotos e recomendações de proteção solar
 
 import os
+import sys
+
+if __name__ == "__main__":
+    # `python src/main.py` arranca por run.py: os processos do ProcessPool criados por spawn
+    # reimportam o script de entrada, e este módulo faz todo o arranque ao ser importado
+    import runpy
+    runpy.run_path(os.path.join(os.path.dirname(os.path.abspath(__file__)), "run.py"), run_name="__main__")
+    sys.exit()
+
 import json
+import atexit
+import hashlib
+import io
+import logging
+import secrets
 import time
+import threading
 import uuid
 from datetime import datetime
-from io import StringIO
 
-from flask import Flask, render_template, request, jsonify, session, make_response
-from werkzeug.utils import secure_filename
+from flask import Flask, render_template, request, jsonify, session, make_response, Response, stream_with_context, g, send_from_directory
 import sqlite3
-import mysql.connector
-from mysql.connector import Error as MySQLError
 
 from dotenv import load_dotenv
 
 #from dbconfig import ID_COLLECTOR
-from uv_index import get_uv_index
-from fitzpatrick import analyze_fitzpatrick
-from recommendations import get_recommendations, format_analysis_html
+from uv_index import get_uv_index, get_uv_index_async, prefetch_uv_index, uv_cache, uv_flight, geocode_flight
+from geocode import resolve_location, geocode_stats
+from http_client import http_client
+from fitzpatrick import analyze_fitzpatrick, FITZPATRICK_VERSION, ANALYSIS_SIZE
+from recommendations import get_recommendations, format_analysis_html, lookup_recommendation
+from utils import clean_text
+from batch import analyze_many
+from sqlite_pool import SQLitePool
+from migrations import MIGRATIONS
+from log_writer import LogWriter
+from exports import export_filters, filter_clauses, iter_csv, gzip_chunks, tee_to_file, encode_cursor, decode_cursor, ndjson_page, csv_page
+from sync import SyncEngine
+from jobs import JobManager
+from photo_store import PhotoStore, InvalidImage
+from storage import StorageManager
+from result_cache import ResultCache
+from filelock import FileLock, write_atomic, write_json_atomic, read_json
+from metrics import REGISTRY, stage_timer
 
-import sys
 from dotenv import load_dotenv
 
 
@@ -31,7 +56,14 @@ BASE_DIR = Path().resolve()
 #load_dotenv(os.path.join(BASE_DIR, "../.env"))
 load_dotenv(BASE_DIR / "./src/.env", override=True)
 ID_COLLECTOR = os.getenv("ID_COLLECTOR", "COLLECTOR_XXX")
+
+# LOG_LEVEL=WARNING desliga as mensagens do caminho crítico (DEBUG/INFO)
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s")
+logger = logging.getLogger("main")
 API_KEY = os.getenv("IPGEOLOCATION_API_KEY", "7f71a225406f419b97557e6e267ba07e")
+IPGEOLOCATION_URL = os.getenv("IPGEOLOCATION_URL", "https://api.ipgeolocation.io/ipgeo")
 
 # Configs DB
 #print("----->DB Path:", os.path.join(BASE_DIR,"analysis.db"))
@@ -79,55 +111,117 @@ app = create_flask_app()
 # Criar pastas se não existirem
 app.config["UPLOAD_FOLDER"] = "uploads"
 os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
+photo_store = PhotoStore(app.config["UPLOAD_FOLDER"])
 app.config["EXPORT_FOLDER"] = "exports"
 os.makedirs(app.config["EXPORT_FOLDER"], exist_ok=True)
 
 app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024
-app.secret_key = os.urandom(24)
+def load_secret_key():
+    """SECRET_KEY do ambiente ou de um ficheiro criado uma vez e partilhado por todos os workers."""
+    key = os.getenv("SECRET_KEY")
+    if key:
+        return key
+    path = os.getenv("SECRET_KEY_FILE", os.path.join(BASE_DIR, "secret_key"))
+    with FileLock(f"{path}.lock"):
+        if not os.path.exists(path):
+            write_atomic(path, secrets.token_hex(32))
+        with open(path) as f:
+            return f.read().strip()
+
+# Chave estável: as sessões continuam válidas entre workers e reinícios
+app.secret_key = load_secret_key()
 
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
 
+# Resultados de análises anteriores (mesma foto, mesma versão do classificador); disco opcional via RESULT_CACHE_PATH
+result_cache = ResultCache(
+    max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 256)),
+    disk_path=os.getenv("RESULT_CACHE_PATH") or None)
+RESULT_CACHE_SAVED_MS = REGISTRY.counter(
+    "collector_result_cache_saved_ms_total", "Tempo de análise poupado por acertos na cache de resultados (ms)")
+
+# Registos por lote na sincronização com o MySQL (/export_db)
+SYNC_BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", 50))
+
+SYNC_JOB_KEY = f"sync:{ID_COLLECTOR}"
+# Lock entre processos: com vários workers só um sincroniza de cada vez
+SYNC_LOCK_PATH = os.path.join(BASE_DIR, f"sync_{ID_COLLECTOR}.lock")
+
+# Última localização detetada (partilhada entre workers; escrita com lock e substituição atómica)
+LOCATION_CACHE_PATH = os.getenv("LOCATION_CACHE_PATH", "location_cache.json")
+
 analises_coletadas = []
 
+sqlite_pool = SQLitePool(SQLITE_CONFIG["path"], migrations=MIGRATIONS)
+
 def ensure_sqlite_table():
-    """Garante que a tabela analysis_log existe no SQLite"""
-    db_path = SQLITE_CONFIG["path"]
-    
-    # Cria diretório se não existir
-    os.makedirs(os.path.dirname(db_path) if os.path.dirname(db_path) else '.', exist_ok=True)
-    
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS analysis_log (
-            id_collector TEXT,
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            event_type TEXT NOT NULL,
-            input_type TEXT,
-            input_value TEXT,
-            location TEXT,
-            uv_index REAL,
-            fitzpatrick_type TEXT,
-            recommendations TEXT,
-            status_message TEXT
-        )
-    """)
-    conn.commit()
-    cursor.close()
-    conn.close()
+    """Garante que a tabela analysis_log existe e está na última versão (executado uma vez no arranque)"""
+    sqlite_pool.init_schema()
+
+ensure_sqlite_table()
+
+# Tarefas em segundo plano; uma sincronização de cada vez por coletor. O estado fica no
+# analysis.db (tabela jobs), por isso /jobs/<id> responde em qualquer worker
+job_manager = JobManager(pool=sqlite_pool)
+
+# Registos do analysis_log gravados em lote fora da thread do pedido
+log_writer = LogWriter(sqlite_pool)
+
+def shutdown():
+    """Fecho ordenado do processo: grava a fila de escrita pendente e fecha as conexões."""
+    log_writer.close()
+    sqlite_pool.close_all()
+
+atexit.register(shutdown)
+
+# Miniaturas e retenção dos originais já sincronizados (compactação após cada /export_db)
+storage = StorageManager(
+    app.config["UPLOAD_FOLDER"], sqlite_pool,
+    thumb_size=int(os.getenv("THUMB_SIZE", 512)),
+    thumb_quality=int(os.getenv("THUMB_QUALITY", 75)),
+    thumb_format=os.getenv("THUMB_FORMAT", "webp"),
+    retention_days=float(os.getenv("RETENTION_DAYS", 7)),
+    # "original" (omissão) ou "thumbnail"; com "thumbnail" a compactação não apaga originais
+    sync_blob=os.getenv("SYNC_BLOB", "original"))
+COMPACT_AFTER_SYNC = os.getenv("COMPACT_AFTER_SYNC", "1") == "1"
+
+# Redimensionamento no cliente antes do /upload (anunciado em /client_config). A foto recebida
+# é o "original" que vai para o MySQL (SYNC_BLOB=original), por isso a omissão é independente
+# de THUMB_SIZE: reduz só fotos de câmara muito grandes. Valores baixos poupam rede mas perdem
+# a resolução real, exceto com ARCHIVE_ORIGINALS=1
+UPLOAD_MAX_SIDE = int(os.getenv("UPLOAD_MAX_SIDE", 2048))
+UPLOAD_QUALITY = float(os.getenv("UPLOAD_QUALITY", 0.8))
+UPLOAD_TYPE = os.getenv("UPLOAD_TYPE", "image/jpeg")
+# Original em tamanho real guardado à parte (fora da retenção do storage) com ARCHIVE_ORIGINALS=1
+ARCHIVE_ORIGINALS = os.getenv("ARCHIVE_ORIGINALS", "0") == "1"
+archive_store = PhotoStore(os.getenv("ARCHIVE_FOLDER", "archive")) if ARCHIVE_ORIGINALS else None
+
+# Dependências pesadas carregadas só quando usadas; o pré-aquecimento importa-as
+# numa thread depois do arranque, para a primeira análise não pagar esse custo
+PREWARM_MODULES = ("PIL.Image", "numpy", "requests")
+
+def prewarm_imports(modules=PREWARM_MODULES):
+    import importlib
+    start = time.perf_counter()
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning("Pré-aquecimento: %s indisponível (%s)", name, e)
+    logger.debug("Pré-aquecimento concluído em %.0f ms", (time.perf_counter() - start) * 1000)
+
+if os.getenv("PREWARM_IMPORTS", "1") == "1":
+    threading.Thread(target=prewarm_imports, name="prewarm-imports", daemon=True).start()
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def get_db_connection_sqlite():
-    ensure_sqlite_table()  # Garante que a tabela existe
-    cfg = SQLITE_CONFIG
-    conn = sqlite3.connect(cfg["path"], check_same_thread=False)
-    conn.execute("PRAGMA foreign_keys = ON;")
-    return conn
+    """Empresta uma conexão do pool (usar com `with`)."""
+    return sqlite_pool.connection()
 
 def get_db_connection_mysql():
+    import mysql.connector  # só necessário no /export_db
     cfg = MYSQL_CONFIG
     return mysql.connector.connect(
         host=cfg["host"], port=cfg["port"],
@@ -135,30 +229,17 @@ def get_db_connection_mysql():
         database=cfg["database"], charset="utf8mb4"
     )
 
-import re
-def clean_text(text):
-    # Remove escapes como \uXXXX
-    text = text.encode('utf-8').decode('unicode_escape')
-
-    # Remove emojis e símbolos Unicode
-    text = re.sub(r'^\[|\]$', '', text)  # Remove colchetes
-    text = re.sub(r'\\u[0-9a-fA-F]{4}', '', str(text))
-    text = re.sub(r'[\x00-\x1F\x7F-\x9F]', ' ', text)  # Remove caracteres de controle
-    text = re.sub(r'\\[nrt"\\]', ' ', text)  # Remove barras invertidas comuns
-    text = re.sub(r'\s+', ' ', text)  # Remove espaços extras
-    text = re.sub(r'[^\x20-\x7E]', ' ', text)  # Remove caracteres não-ASCII
-
-    return text.strip()
-
-def log_analysis(event_type, input_type=None, input_value=None, **kwargs):
-
-    #print("Log_analisys chamada:", event_type, input_type, input_value, kwargs)
-    ts = datetime.now().isoformat()
+def build_log_row(event_type, input_type=None, input_value=None, location=None, **kwargs):
+    """Monta a tupla de um registo do analysis_log (na ordem do INSERT)."""
+    # `timestamp`: hora da captura quando a análise chega mais tarde (fila offline)
+    ts = kwargs.get("timestamp") or datetime.now().isoformat()
     
-    # Limpa cada recomendação antes de serializar
-    raw_recs = kwargs.get("recommendations", [])
-    cleaned_recs = [ clean_text(rec) for rec in raw_recs ]
-    recs_json = json.dumps(cleaned_recs, ensure_ascii=False)
+    # Limpa cada recomendação antes de serializar (ou usa o JSON já pré-calculado)
+    recs_json = kwargs.get("recommendations_json")
+    if recs_json is None:
+        raw_recs = kwargs.get("recommendations", [])
+        cleaned_recs = [ clean_text(rec) for rec in raw_recs ]
+        recs_json = json.dumps(cleaned_recs, ensure_ascii=False)
     #print("Recomendações limpas:", recs_json)
     
     data = (
@@ -167,31 +248,41 @@ def log_analysis(event_type, input_type=None, input_value=None, **kwargs):
         event_type, 
         input_type, 
         input_value,
-        session.get("location"), 
+        location, 
         kwargs.get("uv_index"),
         kwargs.get("fitzpatrick_type"), 
         recs_json, 
         kwargs.get("status_message")
     )
+    return data
+
+def log_analysis(event_type, input_type=None, input_value=None, **kwargs):
 
-    conn = get_db_connection_sqlite()
-    cur = conn.cursor()
+    #print("Log_analisys chamada:", event_type, input_type, input_value, kwargs)
+    data = build_log_row(event_type, input_type, input_value, session.get("location"), **kwargs)
 
-    # SQLite
+    # SQLite (gravação em lote pelo log_writer)
     try:
-        cur.execute("""
-            INSERT INTO analysis_log
-            (id_collector,timestamp,event_type,input_type,input_value,
-             location,uv_index,fitzpatrick_type,recommendations,status_message)
-            VALUES (?,?,?,?,?,?,?,?,?,?)
-        """, data)
-        conn.commit()
+        log_writer.submit(data)
         #print("Dados gravados: ",data)
-        print("--> Registros no SQLite: ",data)
-    except:
-        pass
-    finally:
-        cur.close(); conn.close()
+        logger.debug("--> Registros no SQLite: %s", data)
+    except Exception:
+        # A gravação é assíncrona: este é o único sítio onde um registo perdido fica visível
+        logger.exception("Registo do analysis_log não submetido: %s", data)
+
+def compute_asset_version(folder):
+    """Hash do conteúdo de static/: muda a cada alteração e invalida a precache do service worker."""
+    sha = hashlib.sha1()
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            sha.update(os.path.relpath(path, folder).encode("utf-8"))
+            with open(path, "rb") as f:
+                sha.update(f.read())
+    return sha.hexdigest()[:12]
+
+ASSET_VERSION = compute_asset_version(app.static_folder)
 
 @app.route("/")
 def index():
@@ -201,20 +292,30 @@ def index():
     return render_template(
         "index.html",
         status_message=" | ".join(statuses),
-        status_color="#00B300")
+        status_color="#00B300",
+        asset_version=ASSET_VERSION)
+
+@app.route("/service-worker.js")
+def service_worker():
+    """Service worker servido na raiz para controlar toda a aplicação (não só /static/js/)."""
+    response = send_from_directory(os.path.join(app.static_folder, "js"), "service-worker.js", max_age=0)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["Service-Worker-Allowed"] = "/"
+    return response
 
 @app.route("/detect_location", methods=["GET"])
 def detect_location():
-    cache = "location_cache.json"
+    cache = LOCATION_CACHE_PATH
     try:
-        if os.path.exists(cache):
-            with open(cache) as f:
-                c = json.load(f)
+        c = read_json(cache)
+        if c is not None:
             if time.time() - c["timestamp"] < 3600:
                 session["location"] = c["location"]
                 return jsonify(
                     status="success",
                     location=c["location"],
+                    lat=session.get("lat"),
+                    lng=session.get("lng"),
                     message="Localização da cache!",
                     message_color="#00B300"
                 )
@@ -226,26 +327,52 @@ def detect_location():
         #print("API_KEY:", API_KEY)
         if not API_KEY:
             raise Exception("API key faltando")
-        url = f"https://api.ipgeolocation.io/ipgeo?apiKey={API_KEY}"
-        r = json.loads(__import__("requests").get(url).text)
+        r = http_client.get(IPGEOLOCATION_URL, params={"apiKey": API_KEY}).json()
         loc = f"{r.get('city')}, {r.get('country_name')}"
-        session["lat"] = r.get("latitude")
-        session["lng"] = r.get("longitude")
+        # A API devolve as coordenadas como texto
+        session["lat"] = float(r["latitude"]) if r.get("latitude") else None
+        session["lng"] = float(r["longitude"]) if r.get("longitude") else None
         session["location"] = loc
-        with open(cache, "w") as f:
-            json.dump({"location": loc, "timestamp": time.time()}, f)
-        return jsonify(status="success", location=loc, message="Localização detectada!", message_color="#00B300")
+        if session["lat"] is not None and session["lng"] is not None:
+            # Aquece a cache UV em segundo plano para a análise seguinte
+            prefetch_uv_index(session["lat"], session["lng"])
+        write_json_atomic(cache, {"location": loc, "timestamp": time.time()})
+        return jsonify(status="success", location=loc, lat=session["lat"], lng=session["lng"],
+                       message="Localização detectada!", message_color="#00B300")
     except Exception as e:
         try:
-            from geopy.geocoders import Nominatim
-            loc = Nominatim(user_agent="mvp").geocode("Lisbon, Portugal").address
+            # Cache/gazetteer local: funciona mesmo sem rede
+            lat, lng, loc = resolve_location("Lisbon, Portugal")
+            session["lat"] = lat
+            session["lng"] = lng
             session["location"] = loc
             #log_analysis("location_detected", "fallback", loc, status_message=str(e))
-            return jsonify(status="warning", location=loc, message=f"Fallback: {e}", message_color="#FFA500")
+            return jsonify(status="warning", location=loc, lat=lat, lng=lng,
+                           message=f"Fallback: {e}", message_color="#FFA500")
         except Exception as ex:
             #log_analysis("location_failed", None, None, status_message=str(ex))
             return jsonify(status="error", location="Unknown", message="Erro localização", message_color="#FF0000")
 
+def save_upload(f):
+    """Grava o upload no photo_store (por hash do conteúdo); devolve StoredPhoto."""
+    # Logging
+    #print("Salvando foto em:", path)
+    return photo_store.ingest(f.stream)
+
+def find_previous_analysis(path):
+    """Última análise ainda no SQLite para a mesma foto (mesmo hash), se existir."""
+    log_writer.flush()
+    with get_db_connection_sqlite() as conn:
+        row = conn.execute("""
+            SELECT timestamp, location, uv_index, fitzpatrick_type
+            FROM analysis_log
+            WHERE input_value = ? AND event_type = 'analysis_completed'
+            ORDER BY id DESC LIMIT 1
+        """, (path,)).fetchone()
+    if row is None:
+        return None
+    return {"timestamp": row[0], "location": row[1], "uv_index": row[2], "fitzpatrick_type": row[3]}
+
 @app.route("/upload", methods=["POST"])
 def upload_photo():
     if "photo" not in request.files:
@@ -253,24 +380,99 @@ def upload_photo():
     f = request.files["photo"]
     if f.filename == "" or not allowed_file(f.filename):
         return jsonify(status="error", message="Tipo inválido.", message_color="#FF0000")
-    fn = secure_filename(f"{uuid.uuid4()}_{f.filename}")
-    path = os.path.join(app.config["UPLOAD_FOLDER"], fn)
+    try:
+        stored = save_upload(f)
+    except InvalidImage as e:
+        return jsonify(status="error", message=str(e), message_color="#FF0000")
+    fn = os.path.basename(stored.path)
+    session["photo_path"] = stored.path
+    session["photo_hash"] = stored.digest
+    archived = archive_original(request.files.get("original"))
+    if stored.duplicate:
+        return jsonify(status="success", filename=fn, duplicate=True, archived=archived,
+                       previous_analysis=find_previous_analysis(stored.path),
+                       message="Foto já carregada anteriormente!", message_color="#00B300")
+    return jsonify(status="success", filename=fn, duplicate=False, archived=archived,
+                   message="Foto carregada!", message_color="#00B300")
+
+def archive_original(f):
+    """Guarda o original em tamanho real enviado junto da foto reduzida (só com ARCHIVE_ORIGINALS=1)."""
+    session["original_path"] = None
+    if archive_store is None or f is None or f.filename == "":
+        return None
+    try:
+        stored = archive_store.ingest(f.stream)
+    except InvalidImage as e:
+        # O original é opcional: a foto reduzida já foi aceite
+        logger.warning("Original não arquivado: %s", e)
+        return None
+    session["original_path"] = stored.path
+    return os.path.basename(stored.path)
+
+@app.route("/client_config", methods=["GET"])
+def client_config():
+    """Resolução e qualidade para o cliente reduzir as fotos antes do upload."""
+    response = jsonify(
+        status="success",
+        analysis_size=list(ANALYSIS_SIZE),
+        upload_max_side=UPLOAD_MAX_SIDE,
+        upload_quality=UPLOAD_QUALITY,
+        upload_type=UPLOAD_TYPE,
+        archive_original=ARCHIVE_ORIGINALS,
+        max_upload_bytes=app.config["MAX_CONTENT_LENGTH"])
+    response.headers["Cache-Control"] = "max-age=300"
+    return response
 
-    # Logging
-    #print("Salvando foto em:", path)
+def session_uv_args():
+    # FIX: Sempre use location como base; lat/lng só se disponível (evita None)
+    location = session.get("location")
+    if not location:
+        raise Exception("Localização não detectada na session.")
     
-    f.save(path)
-    session["photo_path"] = path
-    return jsonify(status="success", filename=fn, message="Foto carregada!", message_color="#00B300")
+    lat = session.get("lat")
+    lng = session.get("lng")
+    if lat and lng and isinstance(lat, (int, float)) and isinstance(lng, (int, float)):
+        return {"lat": lat, "lng": lng}  # Rápido via cache, sem geocode
+    return {"location": location}  # Fallback: geocode + cache
+
+def resolve_session_uv_index():
+    return get_uv_index(**session_uv_args())
+
+def classify_photo(photo_path):
+    with stage_timer("fitzpatrick"):
+        return analyze_fitzpatrick(photo_path)
+
+def cached_skin_type(source, photo_hash=None):
+    """Tipo de pele de `source`; com `photo_hash` usa a cache de resultados (só depende da foto)."""
+    if not photo_hash:
+        return classify_photo(source)
+    key = ResultCache.key(photo_hash, FITZPATRICK_VERSION)
+    cached, saved_ms = result_cache.lookup(key)
+    if cached is not None:
+        # Mesma foto e mesma versão do classificador: evita descodificar a imagem de novo
+        RESULT_CACHE_SAVED_MS.inc(saved_ms)
+        return cached["fitzpatrick_type"]
+    start = time.perf_counter()
+    st = classify_photo(source)
+    result_cache.put(key, {"fitzpatrick_type": st}, (time.perf_counter() - start) * 1000)
+    return st
+
+async def _uv_and_skin_type(uv_args, source, photo_hash):
+    import asyncio
+    # Consulta UV (rede) em paralelo com a cache/análise da foto (CPU)
+    return await asyncio.gather(
+        get_uv_index_async(**uv_args),
+        asyncio.to_thread(cached_skin_type, source, photo_hash))
+
+def analyze_photo(source, photo_hash=None):
+    """Índice UV da sessão e tipo de pele de `source` (caminho ou ficheiro em memória)."""
+    import asyncio
+    uv_index, st = asyncio.run(_uv_and_skin_type(session_uv_args(), source, photo_hash))
+    return uv_index, st
 
 @app.route("/analyze", methods=["POST"])
 def analyze():
     
-    print("Variaveis de ambiente carregadas:")
-    print("base_dir:", BASE_DIR)
-    print("ID_COLLECTOR:", ID_COLLECTOR)
-    print("API_KEY:", API_KEY)
-    
     if not session.get("location"):
         return jsonify(status="error", message="Localização não detectada.", message_color="#FF0000")
     pp = session.get("photo_path")
@@ -294,27 +496,17 @@ def analyze():
         session["skin_type"] = st
         return jsonify(status="success", result_html=html, message="Análise concluída!", message_color="#00B300")
         '''
-        # FIX: Sempre use location como base; lat/lng só se disponível (evita None)
-        location = session.get("location")
-        if not location:
-            raise Exception("Localização não detectada na session.")
-        
-        lat = session.get("lat")
-        lng = session.get("lng")
-        if lat and lng and isinstance(lat, (int, float)) and isinstance(lng, (int, float)):
-            uv_index = get_uv_index(lat=lat, lng=lng)  # Rápido via cache, sem geocode
-        else:
-            uv_index = get_uv_index(location=location)  # Fallback: geocode + cache
-        
-        st = analyze_fitzpatrick(pp)
-        recs = get_recommendations(uv_index, st)
-        html = format_analysis_html(uv_index, st, recs)
+        uv_index, st = analyze_photo(pp, session.get("photo_hash"))
+        # Recomendações, HTML e JSON do log pré-calculados por (faixa UV, tipo de pele)
+        with stage_timer("recommendations"):
+            rec = lookup_recommendation(uv_index, st)
+            html = format_analysis_html(uv_index, st, rec.recommendations)
         log_analysis("analysis_completed", 
                     "photo+location", 
                     pp, 
                     uv_index=uv_index, 
                     fitzpatrick_type=st, 
-                    recommendations=recs, 
+                    recommendations_json=rec.log_json, 
                     status_message="Análise concluída!")
         session["uv_index"] = uv_index
         session["skin_type"] = st
@@ -323,24 +515,313 @@ def analyze():
         #log_analysis("analysis_failed", None, None, status_message=str(e))
         return jsonify(status="error", message=f"Erro na análise: {e}", message_color="#FF0000")
 
+@app.route("/upload_analyze", methods=["POST"])
+def upload_analyze():
+    """
+    Upload e análise num só pedido: a foto é analisada a partir da memória e
+    gravada no disco (com o registo do analysis_log) só depois de a resposta
+    ser enviada. O fluxo /upload + /analyze continua disponível.
+    """
+    if not session.get("location"):
+        return jsonify(status="error", message="Localização não detectada.", message_color="#FF0000")
+    if "photo" not in request.files:
+        return jsonify(status="error", message="Nenhuma foto enviada.", message_color="#FF0000")
+    f = request.files["photo"]
+    if f.filename == "" or not allowed_file(f.filename):
+        return jsonify(status="error", message="Tipo inválido.", message_color="#FF0000")
+    data = f.read()  # limitado por MAX_CONTENT_LENGTH
+    try:
+        digest, ext = photo_store.inspect(data)
+    except InvalidImage as e:
+        return jsonify(status="error", message=str(e), message_color="#FF0000")
+    existing = photo_store.find(f"{digest}.{ext}")
+    path = existing or photo_store.path_for(digest, ext)
+    try:
+        uv_index, st = analyze_photo(io.BytesIO(data), digest)
+        with stage_timer("recommendations"):
+            rec = lookup_recommendation(uv_index, st)
+            html = format_analysis_html(uv_index, st, rec.recommendations)
+    except Exception as e:
+        return jsonify(status="error", message=f"Erro na análise: {e}", message_color="#FF0000")
+    row = build_log_row("analysis_completed", "photo+location", path, session.get("location"),
+                        uv_index=uv_index, fitzpatrick_type=st,
+                        recommendations_json=rec.log_json, status_message="Análise concluída!")
+    session["photo_path"] = path
+    session["photo_hash"] = digest
+    session["uv_index"] = uv_index
+    session["skin_type"] = st
+    archived = archive_original(request.files.get("original"))
+    response = jsonify(status="success", filename=os.path.basename(path), duplicate=existing is not None,
+                       archived=archived, result_html=html,
+                       message="Análise concluída!", message_color="#00B300")
+    response.call_on_close(lambda: persist_upload(data, digest, ext, row))
+    return response
+
+def persist_upload(data, digest, ext, row):
+    """Grava a foto e depois o registo da análise (corre depois de a resposta ser enviada)."""
+    try:
+        with stage_timer("persist_upload"):
+            photo_store.store_bytes(data, digest, ext)
+    except OSError as e:
+        # Sem ficheiro não há registo: a sincronização nunca envia uma análise sem imagem
+        logger.error("Foto %s.%s não gravada; análise não registada: %s", digest, ext, e)
+        return
+    log_writer.submit(row)
+
+def parse_capture_meta(raw):
+    """Local, coordenadas e hora da captura enviados com uma foto da fila offline (campos inválidos ignorados)."""
+    raw = raw if isinstance(raw, dict) else {}
+    meta = {"location": None, "lat": None, "lng": None, "timestamp": None}
+    if isinstance(raw.get("location"), str) and raw["location"].strip():
+        meta["location"] = raw["location"].strip()
+    try:
+        lat, lng = float(raw["lat"]), float(raw["lng"])
+        if -90 <= lat <= 90 and -180 <= lng <= 180:
+            meta["lat"], meta["lng"] = lat, lng
+    except (KeyError, TypeError, ValueError):
+        pass
+    try:
+        captured = datetime.fromisoformat(str(raw["captured_at"]))
+        # Hora local sem fuso, como os restantes registos do analysis_log
+        if captured.tzinfo is not None:
+            captured = captured.astimezone().replace(tzinfo=None)
+        meta["timestamp"] = captured.isoformat()
+    except (KeyError, TypeError, ValueError):
+        pass
+    return meta
+
+@app.route("/analyze_batch", methods=["POST"])
+def analyze_batch():
+    """
+    Analisa várias fotos (campo `photos`). O índice UV é obtido uma vez por
+    local; os resultados são enviados em NDJSON à medida que cada foto
+    termina, e uma falha numa foto não afeta as outras.
+
+    O campo `stored` aceita nomes de fotos já carregadas por /upload (fila
+    offline do service worker); os seus índices seguem os de `photos`. O campo
+    opcional `meta` (lista JSON na mesma ordem) traz location/lat/lng/captured_at
+    de cada captura; sem ele usa-se a localização da sessão e a hora atual.
+    Fotos sem índice UV (local por resolver, API indisponível) têm uma linha
+    com status "retry" e não são gravadas.
+    """
+    files = request.files.getlist("photos")
+    stored_names = request.form.getlist("stored")
+    if not files and not stored_names:
+        return jsonify(status="error", message="Nenhuma foto enviada.", message_color="#FF0000")
+    try:
+        raw_meta = json.loads(request.form.get("meta") or "[]")
+    except ValueError:
+        return jsonify(status="error", message="Campo meta inválido.", message_color="#FF0000")
+    raw_meta = raw_meta if isinstance(raw_meta, list) else []
+    total = len(files) + len(stored_names)
+    metas = [parse_capture_meta(raw_meta[i] if i < len(raw_meta) else None) for i in range(total)]
+    if not session.get("location") and not all(m["location"] for m in metas):
+        return jsonify(status="error", message="Localização não detectada.", message_color="#FF0000")
+
+    # Índice UV uma vez por local de captura (coordenadas, texto ou sessão)
+    uv_by_place = {}
+
+    def uv_for(meta):
+        if meta["lat"] is not None:
+            args = {"lat": meta["lat"], "lng": meta["lng"]}
+        elif meta["location"]:
+            args = {"location": meta["location"]}
+        else:
+            args = session_uv_args()
+        place = tuple(sorted(args.items()))
+        if place not in uv_by_place:
+            try:
+                uv_by_place[place] = get_uv_index(**args)
+            except Exception as e:
+                uv_by_place[place] = e
+        return uv_by_place[place]
+
+    rejected = []  # erros definitivos e fotos a repetir (status "retry")
+    accepted = []  # (índice no pedido, caminho, índice UV)
+    candidates = [(i, f.filename, f) for i, f in enumerate(files)]
+    candidates += [(i, name, None) for i, name in enumerate(stored_names, start=len(files))]
+    for i, name, f in candidates:
+        if f is not None and (name == "" or not allowed_file(name)):
+            rejected.append({"index": i, "filename": name, "status": "error", "error": "Tipo inválido."})
+            continue
+        uv = uv_for(metas[i])
+        if isinstance(uv, Exception):
+            # Sem índice UV: nada é gravado e a foto fica na fila do cliente para nova tentativa
+            rejected.append({"index": i, "filename": name, "status": "retry",
+                             "error": f"Índice UV indisponível: {uv}"})
+            continue
+        if f is None:
+            path = photo_store.find(name)
+            if path is None:
+                rejected.append({"index": i, "filename": name, "status": "error", "error": "Foto não encontrada."})
+                continue
+        else:
+            try:
+                path = save_upload(f).path
+            except InvalidImage as e:
+                rejected.append({"index": i, "filename": name, "status": "error", "error": str(e)})
+                continue
+        accepted.append((i, path, uv))
+    accepted_paths = {i: p for i, p, _ in accepted}
+    mask_skin = request.form.get("mask_skin") in ("1", "true")
+    first_uv = accepted[0][2] if accepted else None
+
+    def generate():
+        rows = []
+        retry = sum(1 for item in rejected if item["status"] == "retry")
+        failed = len(rejected) - retry
+        try:
+            for item in rejected:
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+            for item in analyze_many([p for _, p, _ in accepted], [uv for _, _, uv in accepted], mask_skin=mask_skin):
+                item["index"] = accepted[item["index"]][0]
+                item["filename"] = os.path.basename(item.pop("path"))
+                if item["status"] == "success":
+                    meta = metas[item["index"]]
+                    uv_index = item["uv_index"]
+                    rows.append(build_log_row(
+                        "analysis_completed", "photo+location", accepted_paths[item["index"]],
+                        meta["location"] or session.get("location"),
+                        timestamp=meta["timestamp"],
+                        uv_index=uv_index,
+                        fitzpatrick_type=item["fitzpatrick_type"],
+                        recommendations_json=lookup_recommendation(uv_index, item["fitzpatrick_type"]).log_json,
+                        status_message="Análise concluída!"))
+                else:
+                    failed += 1
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+        finally:
+            # Um único INSERT em lote para todas as análises concluídas
+            log_writer.submit_many(rows)
+        yield json.dumps({
+            "status": "done", "uv_index": first_uv,
+            "analyzed": len(rows), "failed": failed, "retry": retry, "total": total,
+        }) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
 @app.route("/count_analyses", methods=["GET"])
 def count_analyses():
     """
     Retorna o total de registros no SQLite para este ID_COLLECTOR.
     """
     try:
-        conn = get_db_connection_sqlite()
-        cur = conn.cursor()
-        cur.execute(
-            "SELECT COUNT(*) FROM analysis_log"
-        )
-        count = cur.fetchone()[0]
-        cur.close()
-        conn.close()
+        log_writer.flush()
+        with get_db_connection_sqlite() as conn:
+            # analysis_summary é mantida por triggers: não percorre o analysis_log
+            count = conn.execute(
+                "SELECT COALESCE(SUM(total), 0) FROM analysis_summary"
+            ).fetchone()[0]
         return jsonify(status="success", count=count)
     except Exception as e:
         return jsonify(status="error", message=str(e), count=0)
 
+@app.route("/statistics", methods=["GET"])
+def statistics():
+    """
+    Totais por coletor: eventos por tipo, média/desvio do índice UV e contagem por tipo de pele.
+    Lê apenas as tabelas de resumo (custo independente do tamanho do analysis_log).
+    """
+    try:
+        log_writer.flush()
+        collector = request.args.get("id_collector")
+        where, params = ("WHERE id_collector = ?", (collector,)) if collector is not None else ("", ())
+        collectors = {}
+        with get_db_connection_sqlite() as conn:
+            for id_collector, event_type, total, uv_count, uv_sum, uv_sq_sum in conn.execute(
+                    f"SELECT id_collector, event_type, total, uv_count, uv_sum, uv_sq_sum "
+                    f"FROM analysis_summary {where}", params):
+                if not total:
+                    continue
+                entry = collectors.setdefault(id_collector, {
+                    "total": 0, "events": {}, "uv_count": 0, "uv_sum": 0.0, "uv_sq_sum": 0.0, "skin_types": {}})
+                entry["total"] += total
+                entry["events"][event_type] = total
+                entry["uv_count"] += uv_count
+                entry["uv_sum"] += uv_sum
+                entry["uv_sq_sum"] += uv_sq_sum
+            for id_collector, skin_type, total in conn.execute(
+                    f"SELECT id_collector, fitzpatrick_type, total FROM analysis_skin_summary {where}", params):
+                if total and id_collector in collectors:
+                    collectors[id_collector]["skin_types"][skin_type] = total
+
+        for entry in collectors.values():
+            n = entry.pop("uv_count")
+            uv_sum, uv_sq_sum = entry.pop("uv_sum"), entry.pop("uv_sq_sum")
+            mean = uv_sum / n if n else None
+            entry["uv"] = {
+                "count": n,
+                "mean": round(mean, 3) if n else None,
+                "stddev": round(max(uv_sq_sum / n - mean * mean, 0.0) ** 0.5, 3) if n else None,
+            }
+        return jsonify(status="success", id_collector=ID_COLLECTOR, collectors=collectors)
+    except Exception as e:
+        return jsonify(status="error", message=str(e), collectors={})
+
+# -------------------------------------------------------------------------------------------------------------------------------------
+# Métricas (/metrics, formato de texto do Prometheus)
+
+# Com vários workers (gunicorn) o serve.py define METRICS_DIR: contadores e histogramas
+# de todos os processos são somados em cada /metrics
+METRICS_DIR = os.getenv("METRICS_DIR")
+if METRICS_DIR:
+    REGISTRY.enable_multiprocess(METRICS_DIR)
+    REGISTRY.track()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "collector_http_request_duration_seconds", "Latência dos pedidos por rota", ("route", "method"))
+REQUESTS_TOTAL = REGISTRY.counter(
+    "collector_http_requests_total", "Pedidos por rota e código de resposta", ("route", "method", "status"))
+
+def _gauge(name, help, fn, labelnames=()):
+    REGISTRY.gauge(name, help, labelnames).set_function(fn)
+
+_gauge("collector_sqlite_pool_connections", "Conexões do pool SQLite por estado",
+       lambda: {(k,): v for k, v in sqlite_pool.stats().items() if k in ("created", "in_use", "idle")}, ("state",))
+_gauge("collector_sqlite_pool_waits", "Pedidos que esperaram por uma conexão livre", lambda: sqlite_pool.stats()["waits"])
+_gauge("collector_log_writer_queue_depth", "Registos na fila de escrita", lambda: log_writer.stats()["queue_depth"])
+_gauge("collector_log_writer_pending", "Registos submetidos ainda não gravados", lambda: log_writer.stats()["pending"])
+_gauge("collector_log_writer_errors", "Lotes que falharam a gravação", lambda: log_writer.stats()["errors"])
+_gauge("collector_cache_hit_ratio", "Taxa de acertos por cache",
+       lambda: {("uv",): uv_cache.stats()["hit_ratio"], ("result",): result_cache.stats()["hit_ratio"]}, ("cache",))
+def _cache_lookups():
+    uv, result = uv_cache.stats(), result_cache.stats()
+    return {
+        ("uv", "hit"): uv["hits"], ("uv", "stale"): uv["stale_hits"], ("uv", "miss"): uv["misses"],
+        ("result", "hit"): result["memory_hits"] + result["disk_hits"], ("result", "miss"): result["misses"],
+    }
+
+_gauge("collector_cache_lookups", "Consultas por cache e resultado", _cache_lookups, ("cache", "result"))
+_gauge("collector_geocode_resolved", "Localizações resolvidas por origem",
+       lambda: {(k,): v for k, v in geocode_stats()["resolved_by"].items()}, ("source",))
+_gauge("collector_jobs_active", "Tarefas em segundo plano ativas", lambda: job_manager.stats()["active"])
+
+@app.before_request
+def _start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def _record_request(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        REQUEST_SECONDS.observe((time.perf_counter() - start) * 1000, route=route, method=request.method)
+        REQUESTS_TOTAL.inc(route=route, method=request.method, status=response.status_code)
+    return response
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Métricas em formato Prometheus; com METRICS_DIR os contadores e histogramas somam todos os workers."""
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/pool_stats", methods=["GET"])
+def pool_stats():
+    """Estatísticas do pool SQLite, da fila de escrita e da cache UV."""
+    return jsonify(status="success", sqlite=sqlite_pool.stats(), writer=log_writer.stats(), uv_cache=uv_cache.stats(),
+                   singleflight={"uv": uv_flight.stats(), "geocode": geocode_flight.stats()},
+                   geocode=geocode_stats(), http=http_client.stats(), result_cache=result_cache.stats(),
+                   jobs=job_manager.stats(), storage=storage.stats())
+
 # Alias para /export
 @app.route("/export", methods=["GET"])
 def export_alias():
@@ -348,8 +829,6 @@ def export_alias():
 
 def log_sqlite(event, input_type=None, input_val=None, **kwargs):
     """Grava apenas no SQLite."""
-    conn = get_db_connection_sqlite()
-    cur = conn.cursor()
     ts = datetime.now().isoformat()
 
     #recs = json.dumps(kwargs.get("recommendations", []))
@@ -368,218 +847,254 @@ def log_sqlite(event, input_type=None, input_val=None, **kwargs):
         session.get("location"), kwargs.get("uv_index"),
         kwargs.get("fitzpatrick_type"), recs, status_message
     )
-    cur.execute("""
-        INSERT INTO analysis_log
-        (id_collector,timestamp,event_type,input_type,input_value,
-         location,uv_index,fitzpatrick_type,recommendations,status_message)
-        VALUES (?,?,?,?,?,?,?,?,?,?)
-    """, data)
-    conn.commit()
-    cur.close()
-    conn.close()
-
+    log_writer.submit(data)
 
-from io import StringIO
-import uuid, os, csv
-from flask import make_response
 
 @app.route("/export_csv", methods=["GET"])
 def export_csv():
-    # 1. Lê do SQLite e prepara CSV em memória
-    conn = get_db_connection_sqlite()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM analysis_log")
-    rows = cur.fetchall()
-    cols = [d[0] for d in cur.description]
-    cur.close()
-    conn.close()
-
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(cols)
-    writer.writerows(rows)
-    csv_data = output.getvalue()
-
-    # 2. Gera nome único e caminho completo
+    """
+    CSV do analysis_log enviado em streaming (blocos de linhas do cursor),
+    gravado em simultâneo em exports/. Filtros opcionais: since, until,
+    id_collector; gzip=1 comprime a resposta e o ficheiro.
+    """
+    log_writer.flush()
+    where, params = export_filters(
+        since=request.args.get("since"),
+        until=request.args.get("until"),
+        id_collector=request.args.get("id_collector"))
+    use_gzip = request.args.get("gzip") in ("1", "true")
+
+    # 1. Gera nome único e caminho completo
     unique_hash = uuid.uuid4().hex
-    filename = f"{ID_COLLECTOR}_{unique_hash}.csv"
+    filename = f"{ID_COLLECTOR}_{unique_hash}.csv" + (".gz" if use_gzip else "")
     full_path = os.path.join(app.config["EXPORT_FOLDER"], filename)
     #print("--> Salvando CSV em:", full_path)
 
-    # 3. Grava o CSV no diretório de export
-    with open(full_path, "w", encoding="utf-8", newline="") as f:
-        f.write(csv_data)
+    def generate():
+        # 2. Lê o SQLite por blocos; memória constante independentemente do nº de linhas
+        with get_db_connection_sqlite() as conn:
+            cur = conn.execute(f"SELECT * FROM analysis_log{where} ORDER BY id", params)
+            try:
+                chunks = iter_csv(cur)
+                if use_gzip:
+                    chunks = gzip_chunks(chunks)
+                # 3. Grava no diretório de export enquanto envia ao cliente
+                yield from tee_to_file(chunks, full_path)
+            finally:
+                cur.close()
 
     # 4. Retorna o CSV como download, usando apenas o nome do arquivo
-    response = make_response(csv_data)
+    response = Response(stream_with_context(generate()),
+                        mimetype="application/gzip" if use_gzip else "text/csv")
     response.headers["Content-Disposition"] = f"attachment; filename={filename}"
-    response.headers["Content-Type"] = "text/csv; charset=utf-8"
+    if not use_gzip:
+        response.headers["Content-Type"] = "text/csv; charset=utf-8"
     return response
 
 
+# Exportação incremental: páginas limitadas a partir de um cursor opaco
+DELTA_PAGE_SIZE = int(os.getenv("DELTA_PAGE_SIZE", 1000))
+DELTA_MAX_PAGE_SIZE = int(os.getenv("DELTA_MAX_PAGE_SIZE", 10000))
+# Dias que os registos já sincronizados continuam disponíveis no /export_delta (0 desliga)
+DELTA_RETENTION_DAYS = float(os.getenv("DELTA_RETENTION_DAYS", 30))
+DELTA_COLUMNS = ("id", "id_collector", "timestamp", "event_type", "input_type", "input_value",
+                 "location", "uv_index", "fitzpatrick_type", "recommendations", "status_message")
+
+def data_version():
+    """Versão dos registos do /export_delta, mantida por triggers (igual em todos os workers)."""
+    with get_db_connection_sqlite() as conn:
+        # X-Delta-Expired-Through também entra na resposta
+        version, expired = conn.execute(
+            "SELECT (SELECT version FROM data_version WHERE name = 'analysis_log'), "
+            "(SELECT last_id FROM sync_state WHERE name = 'delta_retained')").fetchone()
+    return f"{version}:{expired}"
+
+@app.route("/export_delta", methods=["GET"])
+def export_delta():
+    """
+    Registos depois de `cursor` (opaco, devolvido em X-Next-Cursor), no máximo
+    `limit` por página, em NDJSON (omissão) ou CSV (format=csv). Sem cursor,
+    começa no início; os filtros since/until/id_collector da primeira página
+    ficam no cursor e aplicam-se a todas as seguintes. Com If-None-Match igual
+    ao ETag anterior e sem escritas desde então, responde 304 sem ler os registos
+    (o ETag usa o contador data_version, não o mtime/tamanho do analysis.db).
+    """
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in ("ndjson", "csv"):
+        return jsonify(status="error", message="Formato inválido (ndjson ou csv)."), 400
+    try:
+        limit = min(max(int(request.args.get("limit", DELTA_PAGE_SIZE)), 1), DELTA_MAX_PAGE_SIZE)
+        cursor = request.args.get("cursor")
+        if cursor:
+            last_id, last_ts, filters = decode_cursor(cursor)
+        else:
+            last_id, last_ts = 0, None
+            filters = {name: request.args.get(name) for name in ("since", "until", "id_collector")
+                       if request.args.get(name)}
+    except ValueError as e:
+        return jsonify(status="error", message=str(e)), 400
+
+    # Registos ainda na fila de escrita entram já nesta página (e mudam o ETag)
+    log_writer.flush()
+    key = f"{cursor}|{sorted(filters.items())}|{limit}|{fmt}|{data_version()}"
+    etag = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+
+    clauses, params = filter_clauses(**filters)
+    where = " AND ".join(["id > ?"] + clauses)
+    params = [last_id] + params
+    columns = ", ".join(DELTA_COLUMNS)
+    with get_db_connection_sqlite() as conn:
+        # Página e MAX(id) lidos no mesmo snapshot (transação de leitura)
+        conn.execute("BEGIN")
+        # Registos já enviados para o MySQL continuam em analysis_log_synced durante DELTA_RETENTION_DAYS
+        rows = conn.execute(
+            f"SELECT {columns} FROM analysis_log_synced WHERE {where} "
+            f"UNION ALL SELECT {columns} FROM analysis_log WHERE {where} ORDER BY id LIMIT ?",
+            params + params + [limit + 1]).fetchall()
+        max_id = None
+        if not rows:
+            # Nenhum registo depois do cursor cumpre os filtros: avança até ao último id atual
+            max_id = conn.execute(
+                "SELECT MAX(id) FROM (SELECT MAX(id) AS id FROM analysis_log_synced "
+                "UNION ALL SELECT MAX(id) FROM analysis_log)").fetchone()[0]
+        expired = conn.execute("SELECT last_id FROM sync_state WHERE name = 'delta_retained'").fetchone()
+        conn.commit()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        next_cursor = encode_cursor(rows[-1][0], rows[-1][2], filters)
+    else:
+        next_cursor = encode_cursor(max(last_id, max_id or 0), last_ts, filters)
+
+    if fmt == "csv":
+        response = Response(csv_page(DELTA_COLUMNS, rows), content_type="text/csv; charset=utf-8")
+    else:
+        response = Response(ndjson_page(DELTA_COLUMNS, rows), mimetype="application/x-ndjson")
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Next-Cursor"] = next_cursor
+    response.headers["X-Has-More"] = "1" if has_more else "0"
+    response.headers["X-Record-Count"] = str(len(rows))
+    # Registos depois do cursor que já saíram da retenção (só existem no MySQL)
+    if expired and expired[0] > last_id:
+        response.headers["X-Delta-Expired-Through"] = str(expired[0])
+    return response
 
 #
 # -------------------------------------------------------------------------------------------------------------------------------------
 #
+def sync_error_message(error):
+    """Mensagem de erro da sincronização no formato usado pelo /export_db."""
+    if isinstance(error, sqlite3.Error):
+        return f"Erro no SQLite: {error}"
+    # mysql.connector só está carregado se já houve uma ligação ao MySQL
+    mysql_connector = sys.modules.get("mysql.connector")
+    if mysql_connector is not None and isinstance(error, mysql_connector.Error):
+        return f"Erro no MySQL: {error}"
+    return f"Erro geral: {error}"
+
+def run_sync_job(job):
+    """Corre na thread da tarefa: sincroniza e reporta o progresso por lote."""
+    engine = SyncEngine(sqlite_pool, get_db_connection_mysql, batch_size=SYNC_BATCH_SIZE,
+                        read_blob=storage.read_blob, retain_seconds=DELTA_RETENTION_DAYS * 86400)
+    lock = FileLock(SYNC_LOCK_PATH)
+    if not lock.acquire(blocking=False):
+        raise RuntimeError("Já existe uma sincronização em curso noutro processo")
+    try:
+        result = engine.run(progress=job.progress, cancelled=job.cancel_requested)
+    except Exception as e:
+        logger.error(sync_error_message(e))
+        raise RuntimeError(sync_error_message(e)) from e
+    finally:
+        lock.release()
+    logger.info("--> Transferidos %d registros para MySQL com sucesso", result["transferred"])
+    if COMPACT_AFTER_SYNC and result["transferred"]:
+        try:
+            # Registos ainda na fila apontam para fotos por sincronizar
+            log_writer.flush()
+            result["storage"] = storage.compact()
+        except Exception as e:
+            logger.warning("Falha na compactação dos uploads: %s", e)
+    return result
+
 @app.route("/export_db", methods=["POST"])
 def export_db():
-    sqlite_conn = None
-    mysql_conn = None
-    sqlite_cursor = None
-    mysql_cursor = None
-
+    """
+    Inicia a sincronização SQLite -> MySQL em segundo plano e devolve o id da tarefa (202).
+    O progresso consulta-se em /jobs/<id>; só há uma sincronização ativa por coletor.
+    """
     try:
-        # 1. Conectar ao SQLite e ler registros
-        sqlite_conn = get_db_connection_sqlite()
-        sqlite_cursor = sqlite_conn.cursor()
-        
-        # Selecionar campos específicos na ordem correta
-        sqlite_cursor.execute("""
-            SELECT id_collector, id, timestamp, event_type, input_type, 
-                   input_value, location, uv_index, fitzpatrick_type, 
-                   recommendations, status_message
-            FROM analysis_log
-        """)
-        records = sqlite_cursor.fetchall()
-
-        if not records:
-            print("Nenhum registro encontrado no SQLite")
+        # 1. Garante que tudo o que está na fila de escrita já está no SQLite
+        if not log_writer.flush():
+            # O que ficou por gravar entra na próxima sincronização
+            logger.warning("Fila do analysis_log por gravar antes da sincronização: %s",
+                           log_writer.stats()["last_error"])
+        running = job_manager.active(SYNC_JOB_KEY)
+        if running is not None and running.active:
+            return jsonify({
+                "status": "running",
+                "message": "Já existe uma sincronização em curso",
+                "job_id": running.id,
+                "transferred": running.rows_done
+            }), 409
+
+        pending = SyncEngine(sqlite_pool, get_db_connection_mysql).pending()
+        if not pending:
+            logger.info("Nenhum registro encontrado no SQLite")
             return jsonify({
                 "status": "warning",
                 "message": "Nenhum registro encontrado no SQLite",
                 "transferred": 0
             }), 200
 
-        # 2. Conectar ao MySQL
-        #print("Conectando ao MySQL...")
-        mysql_conn = get_db_connection_mysql()
-        mysql_cursor = mysql_conn.cursor()
-        #print("Conectado ao MySQL com sucesso")
-
-        # 3. Processar e inserir cada registro
-        transferred_count = 0
-        
-        for record in records:
-            # Mapeamento dos campos conforme especificado
-            id_collector = record[0]        # analysis_log.id_collector
-            timestamp = record[2]           # analysis_log.timestamp  
-            input_value = record[5]         # analysis_log.input_value (nome_imagem)
-            location = record[6]            # analysis_log.location
-            uv_index = record[7]            # analysis_log.uv_index
-            fitzpatrick_type = record[8]    # analysis_log.fitzpatrick_type
-            recommendations = record[9]     # analysis_log.recommendations
-            status_message = record[10]     # analysis_log.status_message
-
-            # Preparar imagem_blob (path + nome da imagem)
-            imagem_blob = None
-            if input_value:
-                #image_path = os.path.join(app.config["UPLOAD_FOLDER"], input_value)
-                #print("UPLOAD_FOLDER:", app.config["UPLOAD_FOLDER"])
-                try:
-                    with open(input_value, "rb") as f:
-                        imagem_blob = f.read()
-                except Exception as e:
-                    print(f"Falha ao ler imagem: {e}")
-                    imagem_blob = None
-
-            # Debug: mostrar dados que serão inseridos
-            '''
-            print("----------------------------------------------------------------")
-            print(f"\nInserindo registro {transferred_count + 1}:")
-            print(f"  id_colletor: {id_collector}")
-            print(f"  data_hora: {timestamp}")
-            print(f"  nome_imagem: {input_value}")
-            print(f"  localizacao: {location}")
-            print(f"  indice_uv: {uv_index}")
-            print(f"  tipo_pele: {fitzpatrick_type}")
-            print(f"  recomendacoes: {recommendations}")
-            print(f"  estado: {status_message}")
-            print("----------------------------------------------------------------")
-            '''
-
-            # Inserir no MySQL (id é auto-incremental, não precisa ser especificado)
-            mysql_cursor.execute("""
-                INSERT INTO scp.analises 
-                (id_colletor, data_hora, nome_imagem, localizacao, 
-                 indice_uv, tipo_pele, recomendacoes, estado, imagem_blob)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                id_collector,     # analises.id_colletor
-                timestamp,        # analises.data_hora
-                input_value,      # analises.nome_imagem
-                location,         # analises.localizacao
-                uv_index,         # analises.indice_uv
-                fitzpatrick_type, # analises.tipo_pele
-                recommendations,  # analises.recomendacoes
-                status_message,   # analises.estado
-                imagem_blob       # analises.imagem_blob
-            ))
-            
-            transferred_count += 1
-
-        # 4. Confirmar transação MySQL
-        mysql_conn.commit()
-        print(f"--> Transferidos {transferred_count} registros para MySQL com sucesso")
-
-        # 5. limpar SQLite após sucesso
-        sqlite_cursor.execute("DELETE FROM analysis_log")
-        sqlite_conn.commit()
-
-        return jsonify({
-            "status": "success",
-            "message": f"{transferred_count} registros transferidos com sucesso",
-            "transferred": transferred_count
-        }), 200
-
-    except sqlite3.Error as sqlite_err:
-        print(f"Erro no SQLite: {sqlite_err}")
-        if sqlite_conn:
-            sqlite_conn.rollback()
-        return jsonify({
-            "status": "error",
-            "message": f"Erro no SQLite: {sqlite_err}",
-            "transferred": 0
-        }), 500
-
-    except MySQLError as mysql_err:
-        print(f"Erro no MySQL: {mysql_err}")
-        if mysql_conn:
-            mysql_conn.rollback()
+        # 2. Envia por lotes noutra thread; cada lote confirmado é removido do SQLite
+        job, created = job_manager.submit("sync", SYNC_JOB_KEY, run_sync_job, total=pending)
         return jsonify({
-            "status": "error",
-            "message": f"Erro no MySQL: {mysql_err}",
+            "status": "accepted" if created else "running",
+            "message": f"Sincronização de {pending} registros iniciada",
+            "job_id": job.id,
+            "pending": pending,
             "transferred": 0
-        }), 500
+        }), 202 if created else 409
 
     except Exception as e:
-        print(f"Erro geral: {e}")
-        if mysql_conn:
-            mysql_conn.rollback()
-        if sqlite_conn:
-            sqlite_conn.rollback()
+        message = sync_error_message(e)
+        logger.error(message)
         return jsonify({
             "status": "error",
-            "message": f"Erro geral: {e}",
+            "message": message,
             "transferred": 0
         }), 500
 
-    finally:
-        # Fechar conexões
-        if sqlite_cursor:
-            sqlite_cursor.close()
-        if mysql_cursor:
-            mysql_cursor.close()
-        if mysql_conn and mysql_conn.is_connected():
-            mysql_conn.close()
-        if sqlite_conn:
-            sqlite_conn.close()
-        #####
+@app.route("/storage/compact", methods=["POST"])
+def storage_compact():
+    """Cria miniaturas e apaga originais já sincronizados; devolve os bytes recuperados."""
+    try:
+        log_writer.flush()
+        return jsonify(status="success", report=storage.compact())
+    except Exception as e:
+        return jsonify(status="error", message=str(e)), 500
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """Progresso de uma tarefa em segundo plano (linhas, bytes enviados, ETA)."""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify(status="error", message="Tarefa não encontrada"), 404
+    return jsonify(status="success", job=job.to_dict())
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def job_cancel(job_id):
+    """Pede o cancelamento; a tarefa pára no fim do lote atual sem perder registos."""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify(status="error", message="Tarefa não encontrada"), 404
+    return jsonify(status="success", job=job.to_dict())
             
             
 # -------------------------------------------------------------------------------------------------------------------------------------
 # 
-
-
-if __name__ == "__main__":
-    print("Iniciando Flask em http://localhost:5000...")
-    app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,279 @@
+# src/metrics.py
+# Métricas em memória (contadores, gauges, histogramas) exportadas no formato de texto do Prometheus
+
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from http_client import LatencyHistogram, LATENCY_BUCKETS_MS
+from filelock import write_atomic
+
+logger = logging.getLogger(__name__)
+
+# Etapas do pedido são mais curtas que as chamadas HTTP externas
+STAGE_BUCKETS_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + list(extra or [])
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(k), v] for k, v in self._values.items()]
+
+    def render(self, merged=None):
+        if merged is not None:
+            items = list(merged.items())
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items]
+        return lines
+
+
+class Gauge:
+    """Valor instantâneo; `set()` direto ou `set_function()` lido a cada exportação.
+
+    A função devolve um número ou um dict {valores das labels (tuplo): número}.
+    """
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._fn = None
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(self.labelnames, labels)] = value
+
+    def set_function(self, fn):
+        self._fn = fn
+
+    def render(self):
+        if self._fn is not None:
+            try:
+                value = self._fn()
+            except Exception:
+                value = {}
+            items = value.items() if isinstance(value, dict) else [((), value)]
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        lines += [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items if v is not None]
+        return lines
+
+
+class Histogram:
+    """Um LatencyHistogram (ms) por combinação de labels; exportado em segundos."""
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS_MS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def _get(self, labels):
+        key = _label_key(self.labelnames, labels)
+        hist = self._histograms.get(key)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.setdefault(key, LatencyHistogram(self.buckets))
+        return hist
+
+    def observe(self, ms, **labels):
+        self._get(labels).observe(ms)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._get(labels).observe((time.perf_counter() - start) * 1000)
+
+    def snapshot(self):
+        with self._lock:
+            items = list(self._histograms.items())
+        return [[list(k), hist.snapshot()] for k, hist in items]
+
+    def render(self, merged=None):
+        if merged is not None:
+            snaps = list(merged.items())
+        else:
+            with self._lock:
+                items = list(self._histograms.items())
+            snaps = [(key, hist.snapshot()) for key, hist in items]
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, snap in snaps:
+            for bound, count in snap["buckets"]:
+                le = "+Inf" if bound == "+Inf" else f"{bound / 1000:g}"
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {snap['sum_ms'] / 1000:g}")
+            lines.append(f"{self.name}_count{labels} {snap['count']}")
+        return lines
+
+
+def _merge_histogram(total, snap):
+    if total is None:
+        return {"count": snap["count"], "sum_ms": snap["sum_ms"], "buckets": [list(b) for b in snap["buckets"]]}
+    total["count"] += snap["count"]
+    total["sum_ms"] += snap["sum_ms"]
+    for bucket, (_, n) in zip(total["buckets"], snap["buckets"]):
+        bucket[1] += n
+    return total
+
+
+class Registry:
+    """Conjunto de métricas exportadas em /metrics.
+
+    Com `enable_multiprocess(path)` cada processo grava periodicamente os seus
+    contadores e histogramas em `path/<pid>-<id>.json`, e `render()` soma os
+    ficheiros de todos os processos (incluindo workers já terminados, para os
+    contadores nunca descerem). Os gauges continuam a ser os do processo que
+    responde ao pedido.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+        self._dir = None
+        self._file = None
+        self._pid = None
+        self._interval = 1.0
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS_MS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def enable_multiprocess(self, path, interval=1.0):
+        """Agrega contadores e histogramas de todos os processos que usam a mesma pasta."""
+        os.makedirs(path, exist_ok=True)
+        self._dir = path
+        self._interval = interval
+        atexit.register(self.write_snapshot)
+
+    def _ensure_writer(self):
+        # Um ficheiro e uma thread por processo (também depois de fork)
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._file = os.path.join(self._dir, f"{self._pid}-{uuid.uuid4().hex[:8]}.json")
+        threading.Thread(target=self._write_loop, name="metrics-snapshot", daemon=True).start()
+
+    def _write_loop(self):
+        while True:
+            time.sleep(self._interval)
+            self.write_snapshot()
+
+    def write_snapshot(self):
+        if self._dir is None or self._pid != os.getpid():
+            return
+        with self._lock:
+            metrics = list(self._metrics)
+        snapshot = {m.name: m.snapshot() for m in metrics if isinstance(m, (Counter, Histogram))}
+        try:
+            # Um só escritor por ficheiro: basta a substituição atómica, sem lock
+            write_atomic(self._file, json.dumps(snapshot))
+        except OSError as e:
+            logger.warning("Falha ao gravar métricas em %s: %s", self._file, e)
+
+    def _merged(self):
+        """{nome: {labels (tuplo): valor}} somado sobre os ficheiros de todos os processos."""
+        merged = {}
+        for path in glob.glob(os.path.join(self._dir, "*.json")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, entries in snapshot.items():
+                values = merged.setdefault(name, {})
+                for key, value in entries:
+                    key = tuple(key)
+                    if isinstance(value, dict):
+                        values[key] = _merge_histogram(values.get(key), value)
+                    else:
+                        values[key] = values.get(key, 0) + value
+        return merged
+
+    def track(self):
+        """Inicia a gravação periódica deste processo (chamado no arranque de cada worker)."""
+        if self._dir is not None:
+            self._ensure_writer()
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        merged = None
+        if self._dir is not None:
+            self._ensure_writer()
+            self.write_snapshot()
+            merged = self._merged()
+        lines = []
+        for metric in metrics:
+            if merged is not None and isinstance(metric, (Counter, Histogram)):
+                lines += metric.render(merged.get(metric.name, {}))
+            else:
+                lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "collector_stage_duration_seconds", "Duração de cada etapa da análise", ("stage",), STAGE_BUCKETS_MS)
+
+
+def stage_timer(stage):
+    """Mede um bloco como etapa (geocode, uv_fetch, fitzpatrick, recommendations, sqlite_insert)."""
+    return STAGE_SECONDS.time(stage=stage)
+
+
+def observe_stage(stage, ms):
+    STAGE_SECONDS.observe(ms, stage=stage)
@@ -0,0 +1,158 @@
+# src/migrations.py
+# Migrações versionadas do analysis.db (aplicadas por SQLitePool via PRAGMA user_version)
+
+# Totais por coletor/evento e por tipo de pele, mantidos por triggers no analysis_log
+_SUMMARY_INSERT = """
+    INSERT INTO analysis_summary (id_collector, event_type, total, uv_count, uv_sum, uv_sq_sum)
+    VALUES (COALESCE(NEW.id_collector, ''), NEW.event_type, 1,
+            NEW.uv_index IS NOT NULL, COALESCE(NEW.uv_index, 0), COALESCE(NEW.uv_index * NEW.uv_index, 0))
+    ON CONFLICT (id_collector, event_type) DO UPDATE SET
+        total = total + 1,
+        uv_count = uv_count + excluded.uv_count,
+        uv_sum = uv_sum + excluded.uv_sum,
+        uv_sq_sum = uv_sq_sum + excluded.uv_sq_sum;
+    INSERT INTO analysis_skin_summary (id_collector, fitzpatrick_type, total)
+    SELECT COALESCE(NEW.id_collector, ''), NEW.fitzpatrick_type, 1
+    WHERE NEW.fitzpatrick_type IS NOT NULL
+    ON CONFLICT (id_collector, fitzpatrick_type) DO UPDATE SET total = total + 1;
+"""
+
+_SUMMARY_DELETE = """
+    UPDATE analysis_summary SET
+        total = total - 1,
+        uv_count = uv_count - (OLD.uv_index IS NOT NULL),
+        uv_sum = uv_sum - COALESCE(OLD.uv_index, 0),
+        uv_sq_sum = uv_sq_sum - COALESCE(OLD.uv_index * OLD.uv_index, 0)
+    WHERE id_collector = COALESCE(OLD.id_collector, '') AND event_type = OLD.event_type;
+    UPDATE analysis_skin_summary SET total = total - 1
+    WHERE id_collector = COALESCE(OLD.id_collector, '') AND fitzpatrick_type = OLD.fitzpatrick_type;
+"""
+
+# Contador de alterações dos registos do /export_delta (analysis_log e analysis_log_synced)
+_BUMP_DATA_VERSION = "UPDATE data_version SET version = version + 1 WHERE name = 'analysis_log';"
+
+MIGRATIONS = [
+    # 1: esquema base (IF NOT EXISTS para bases criadas antes das migrações)
+    (1, [
+        """
+        CREATE TABLE IF NOT EXISTS analysis_log (
+            id_collector TEXT,
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            event_type TEXT NOT NULL,
+            input_type TEXT,
+            input_value TEXT,
+            location TEXT,
+            uv_index REAL,
+            fitzpatrick_type TEXT,
+            recommendations TEXT,
+            status_message TEXT
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_analysis_log_input_value ON analysis_log (input_value)",
+        """
+        CREATE TABLE IF NOT EXISTS sync_state (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL,
+            updated_at TEXT
+        )
+        """,
+    ]),
+    # 2: índices de consulta e tabelas de resumo mantidas por triggers
+    (2, [
+        "CREATE INDEX IF NOT EXISTS idx_analysis_log_collector_ts ON analysis_log (id_collector, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_analysis_log_event_type ON analysis_log (event_type)",
+        """
+        CREATE TABLE analysis_summary (
+            id_collector TEXT NOT NULL,
+            event_type TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            uv_count INTEGER NOT NULL DEFAULT 0,
+            uv_sum REAL NOT NULL DEFAULT 0,
+            uv_sq_sum REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (id_collector, event_type)
+        )
+        """,
+        """
+        CREATE TABLE analysis_skin_summary (
+            id_collector TEXT NOT NULL,
+            fitzpatrick_type TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (id_collector, fitzpatrick_type)
+        )
+        """,
+        # Preenche os resumos com os registos já existentes
+        """
+        INSERT INTO analysis_summary (id_collector, event_type, total, uv_count, uv_sum, uv_sq_sum)
+        SELECT COALESCE(id_collector, ''), event_type, COUNT(*), COUNT(uv_index),
+               TOTAL(uv_index), TOTAL(uv_index * uv_index)
+        FROM analysis_log GROUP BY 1, 2
+        """,
+        """
+        INSERT INTO analysis_skin_summary (id_collector, fitzpatrick_type, total)
+        SELECT COALESCE(id_collector, ''), fitzpatrick_type, COUNT(*)
+        FROM analysis_log WHERE fitzpatrick_type IS NOT NULL GROUP BY 1, 2
+        """,
+        f"CREATE TRIGGER trg_analysis_log_insert AFTER INSERT ON analysis_log BEGIN {_SUMMARY_INSERT} END",
+        f"CREATE TRIGGER trg_analysis_log_delete AFTER DELETE ON analysis_log BEGIN {_SUMMARY_DELETE} END",
+        f"CREATE TRIGGER trg_analysis_log_update AFTER UPDATE ON analysis_log BEGIN {_SUMMARY_DELETE} {_SUMMARY_INSERT} END",
+    ]),
+    # 3: estado das tarefas em segundo plano partilhado entre workers (JobManager)
+    (3, [
+        """
+        CREATE TABLE jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            status TEXT NOT NULL,
+            total INTEGER,
+            rows_done INTEGER NOT NULL DEFAULT 0,
+            bytes_sent INTEGER NOT NULL DEFAULT 0,
+            result TEXT,
+            error TEXT,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            pid INTEGER,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            heartbeat_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX idx_jobs_key_status ON jobs (key, status)",
+    ]),
+    # 4: registos já enviados para o MySQL, guardados para o /export_delta (sem triggers de resumo)
+    (4, [
+        """
+        CREATE TABLE analysis_log_synced (
+            id_collector TEXT,
+            id INTEGER PRIMARY KEY,
+            timestamp TEXT NOT NULL,
+            event_type TEXT NOT NULL,
+            input_type TEXT,
+            input_value TEXT,
+            location TEXT,
+            uv_index REAL,
+            fitzpatrick_type TEXT,
+            recommendations TEXT,
+            status_message TEXT,
+            synced_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX idx_analysis_log_synced_at ON analysis_log_synced (synced_at)",
+    ]),
+    # 5: versão dos dados para o ETag do /export_delta (não depende de mtime/tamanho dos ficheiros)
+    (5, [
+        """
+        CREATE TABLE data_version (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+        """,
+        "INSERT INTO data_version (name, version) VALUES ('analysis_log', 0)",
+        f"CREATE TRIGGER trg_analysis_log_version_insert AFTER INSERT ON analysis_log BEGIN {_BUMP_DATA_VERSION} END",
+        f"CREATE TRIGGER trg_analysis_log_version_update AFTER UPDATE ON analysis_log BEGIN {_BUMP_DATA_VERSION} END",
+        f"CREATE TRIGGER trg_analysis_log_version_delete AFTER DELETE ON analysis_log BEGIN {_BUMP_DATA_VERSION} END",
+        f"CREATE TRIGGER trg_analysis_log_synced_version_insert AFTER INSERT ON analysis_log_synced BEGIN {_BUMP_DATA_VERSION} END",
+        f"CREATE TRIGGER trg_analysis_log_synced_version_delete AFTER DELETE ON analysis_log_synced BEGIN {_BUMP_DATA_VERSION} END",
+    ]),
+]
@@ -0,0 +1,157 @@
+# src/photo_store.py
+# Armazenamento de fotos por hash do conteúdo (deduplicação) com ingestão em streaming
+
+import hashlib
+import io
+import os
+import uuid
+from collections import namedtuple
+
+CHUNK_SIZE = 64 * 1024
+
+# Assinaturas (magic bytes) dos formatos aceites
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+
+StoredPhoto = namedtuple("StoredPhoto", "path digest duplicate")
+
+# Níveis de subdiretórios (2 caracteres cada): uploads/ab/cd/<hash>.<ext>
+SHARD_LEVELS = 2
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def shard_key(stem):
+    """Chave usada para escolher o subdiretório (o próprio hash ou o sha1 de nomes antigos)."""
+    if len(stem) >= 2 * SHARD_LEVELS and all(c in "0123456789abcdef" for c in stem[:2 * SHARD_LEVELS]):
+        return stem
+    return hashlib.sha1(stem.encode("utf-8")).hexdigest()
+
+
+def sharded_path(folder, filename):
+    """Caminho de `filename` dentro de `folder`, repartido em subdiretórios pelo hash."""
+    key = shard_key(os.path.splitext(filename)[0])
+    parts = [key[2 * i:2 * i + 2] for i in range(SHARD_LEVELS)]
+    return os.path.join(folder, *parts, filename)
+
+
+def sniff_image_type(header):
+    """Extensão correspondente aos primeiros bytes do ficheiro, ou None."""
+    for signature, ext in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return ext
+    return None
+
+
+class PhotoStore:
+    """Guarda cada foto como `ab/cd/<sha256>.<ext>`; uploads repetidos apontam para o mesmo ficheiro."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def path_for(self, digest, ext):
+        return sharded_path(self.folder, f"{digest}.{ext}")
+
+    def legacy_path_for(self, digest, ext):
+        # Fotos gravadas antes da repartição em subdiretórios
+        return os.path.join(self.folder, f"{digest}.{ext}")
+
+    def find(self, filename):
+        """Caminho de uma foto já guardada a partir do nome `<sha256>.<ext>`, ou None."""
+        digest, _, ext = filename.partition(".")
+        if len(digest) != 64 or any(c not in "0123456789abcdef" for c in digest):
+            return None
+        if ext not in {e for _, e in IMAGE_SIGNATURES}:
+            return None
+        for path in (self.path_for(digest, ext), self.legacy_path_for(digest, ext)):
+            if os.path.exists(path):
+                return path
+        return None
+
+    def inspect(self, data):
+        """Valida uma foto já em memória; devolve (digest, ext) sem gravar nada."""
+        if not data:
+            raise InvalidImage("Ficheiro vazio.")
+        ext = sniff_image_type(data[:16])
+        if ext is None:
+            raise InvalidImage("Formato de imagem não suportado.")
+        from PIL import Image
+        try:
+            with Image.open(io.BytesIO(data)) as img:  # lê só o cabeçalho
+                width, height = img.size
+        except Exception as e:
+            raise InvalidImage(f"Imagem inválida: {e}")
+        if not width or not height:
+            raise InvalidImage("Imagem sem dimensões.")
+        return hashlib.sha256(data).hexdigest(), ext
+
+    def store_bytes(self, data, digest, ext):
+        """Grava `data` (já validado por `inspect`) em ab/cd/<digest>.<ext>, de forma atómica."""
+        existing = self.find(f"{digest}.{ext}")
+        if existing is not None:
+            return StoredPhoto(existing, digest, True)
+        path = self.path_for(digest, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = os.path.join(self.folder, f".{uuid.uuid4().hex}.part")
+        try:
+            with open(tmp_path, "wb") as out:
+                out.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return StoredPhoto(path, digest, False)
+
+    def ingest(self, stream):
+        """Copia `stream` para disco por blocos, calculando o hash e validando o cabeçalho.
+
+        Não descodifica a imagem: apenas confirma a assinatura e que o Pillow
+        consegue ler o cabeçalho (dimensões).
+        """
+        tmp_path = os.path.join(self.folder, f".{uuid.uuid4().hex}.part")
+        sha = hashlib.sha256()
+        ext = None
+        try:
+            with open(tmp_path, "wb") as out:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if ext is None:
+                        ext = sniff_image_type(chunk)
+                        if ext is None:
+                            raise InvalidImage("Formato de imagem não suportado.")
+                    sha.update(chunk)
+                    out.write(chunk)
+            if ext is None:
+                raise InvalidImage("Ficheiro vazio.")
+            from PIL import Image  # carregado no primeiro upload
+            try:
+                with Image.open(tmp_path) as img:  # lê só o cabeçalho
+                    width, height = img.size
+            except Exception as e:
+                raise InvalidImage(f"Imagem inválida: {e}")
+            if not width or not height:
+                raise InvalidImage("Imagem sem dimensões.")
+
+            digest = sha.hexdigest()
+            for existing in (self.path_for(digest, ext), self.legacy_path_for(digest, ext)):
+                if os.path.exists(existing):
+                    os.remove(tmp_path)
+                    return StoredPhoto(existing, digest, True)
+            path = self.path_for(digest, ext)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+            return StoredPhoto(path, digest, False)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
@@ -1,7 +1,57 @@
 # src/recommendations.py
 
+import json
+from collections import namedtuple
+
+from utils import clean_text
+
+SKIN_MAP = {
+    "Tipo I - Pele Muito Clara": [
+        "Use protetor solar FPS 50+",
+        "Limite exposição a 10-15 minutos",
+        "Use roupas com proteção UV"
+    ],
+    "Tipo II -  Pele Clara": [
+        "Use protetor solar FPS 30+",
+        "Limite exposição a 15-20 minutos",
+        "Use camiseta em exposição prolongada"
+    ],
+    "Tipo III - Pele Morena Clara": [
+        "Use protetor solar FPS 25+",
+        "Pode se expor até 25-30 minutos",
+        "Hidrate a pele após exposição"
+    ],
+    "Tipo IV - Pele Morena": [
+        "Use protetor solar FPS 20+",
+        "Pode se expor até 40 minutos",
+        "Mantenha a pele hidratada"
+    ],
+    "Tipo V - Pele Morena Escura": [
+        "Use protetor solar FPS 15+",
+        "Tolerância maior ao sol",
+        "Hidrate bem a pele"
+    ],
+    "Tipo VI - Pele Muito Escura": [
+        "Use protetor solar FPS 15+",
+        "Alta tolerância ao sol",
+        "Mantenha hidratação"
+    ]
+}
+
+# Tipos devolvidos por analyze_fitzpatrick
+SKIN_TYPES = ("Tipo I", "Tipo II", "Tipo III", "Tipo IV", "Tipo V", "Tipo VI")
+
+UV_BANDS = (0, 1, 2)
+
+# Valor representativo de cada faixa (para gerar a tabela)
+_BAND_UV = {0: 0.0, 1: 6.0, 2: 8.0}
+
+def uv_band(uv_index):
+    """Faixa de risco UV usada nas recomendações: 0 = baixo, 1 = moderado (>= 6), 2 = alto (>= 8)."""
+    return 2 if uv_index >= 8 else 1 if uv_index >= 6 else 0
+
 # Modulo original com imagens
-def get_recommendations(uv_index, skin_type):
+def _build_recommendations(uv_index, skin_type):
 
     # UV level categories
     recommendations = []
@@ -20,55 +70,53 @@ def get_recommendations(uv_index, skin_type):
             "Evite exposição entre 10h-16h"
         ]
 
-    skin_map = {
-        "Tipo I - Pele Muito Clara": [
-            "Use protetor solar FPS 50+",
-            "Limite exposição a 10-15 minutos",
-            "Use roupas com proteção UV"
-        ],
-        "Tipo II -  Pele Clara": [
-            "Use protetor solar FPS 30+",
-            "Limite exposição a 15-20 minutos",
-            "Use camiseta em exposição prolongada"
-        ],
-        "Tipo III - Pele Morena Clara": [
-            "Use protetor solar FPS 25+",
-            "Pode se expor até 25-30 minutos",
-            "Hidrate a pele após exposição"
-        ],
-        "Tipo IV - Pele Morena": [
-            "Use protetor solar FPS 20+",
-            "Pode se expor até 40 minutos",
-            "Mantenha a pele hidratada"
-        ],
-        "Tipo V - Pele Morena Escura": [
-            "Use protetor solar FPS 15+",
-            "Tolerância maior ao sol",
-            "Hidrate bem a pele"
-        ],
-        "Tipo VI - Pele Muito Escura": [
-            "Use protetor solar FPS 15+",
-            "Alta tolerância ao sol",
-            "Mantenha hidratação"
-        ]
-    }
     #recommendations += skin_map.get(skin_type, [])
-    recommendations += next((v for k, v in skin_map.items() if skin_type in k),[])
+    recommendations += next((v for k, v in SKIN_MAP.items() if skin_type in k),[])
 
     recommendations.append(f"Beba bastante água")
     recommendations.append(f"Coma alimentos ricos em antioxidantes")
     return recommendations
 
+def _render_tail(skin_type, recommendations):
+    # Parte do HTML que não depende do valor exato do índice UV
+    html = f"<p><strong>Tipo de Pele:</strong> {skin_type}</p>"
+    html += "<p><strong>Recomendações:</strong></p><ul>"
+    for rec in recommendations:
+        html += f"<li>{rec}</li>"
+    html += "</ul>"
+    return html
+
+# Resultado pré-calculado para uma combinação (faixa UV, tipo de pele)
+Recommendation = namedtuple("Recommendation", "recommendations html_tail log_json")
+
+def _compile(uv_index, skin_type):
+    recs = tuple(_build_recommendations(uv_index, skin_type))
+    log_json = json.dumps([clean_text(rec) for rec in recs], ensure_ascii=False)
+    return Recommendation(recs, _render_tail(skin_type, recs), log_json)
+
+# Todas as combinações faixa x tipo, calculadas uma vez na importação
+RECOMMENDATION_TABLE = {
+    (band, skin_type): _compile(_BAND_UV[band], skin_type)
+    for band in UV_BANDS for skin_type in SKIN_TYPES
+}
+
+def lookup_recommendation(uv_index, skin_type):
+    """Recommendation pré-calculada (O(1)); calcula na hora para tipos fora da tabela."""
+    entry = RECOMMENDATION_TABLE.get((uv_band(uv_index), skin_type))
+    if entry is None:
+        entry = _compile(uv_index, skin_type)
+    return entry
+
+def get_recommendations(uv_index, skin_type):
+    return list(lookup_recommendation(uv_index, skin_type).recommendations)
+
 def format_analysis_html(uv_index, skin_type, recommendations):
     #Gera bloco HTML estruturado para exibir:
     #- Índice UV
     #- Tipo de Pele
     #- Lista de Recomendações
     html = f"<p><strong>Índice UV:</strong> {uv_index:}</p>"
-    html += f"<p><strong>Tipo de Pele:</strong> {skin_type}</p>"
-    html += "<p><strong>Recomendações:</strong></p><ul>"
-    for rec in recommendations:
-        html += f"<li>{rec}</li>"
-    html += "</ul>"
-    return html
-    
+    entry = RECOMMENDATION_TABLE.get((uv_band(uv_index), skin_type))
+    if entry is not None and tuple(recommendations) == entry.recommendations:
+        return html + entry.html_tail
+    return html + _render_tail(skin_type, recommendations)
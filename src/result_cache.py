@@ -0,0 +1,103 @@
+# src/result_cache.py
+# Cache de resultados de análise por (hash da foto, versão do classificador)
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from sqlite_pool import SQLitePool
+
+RESULT_CACHE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS result_cache (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        compute_ms REAL NOT NULL,
+        created_at REAL NOT NULL
+    )
+    """,
+]
+
+
+class ResultCache:
+    """LRU em memória com um segundo nível opcional em disco (SQLite).
+
+    Cada entrada guarda também quanto tempo custou a calcular, para se
+    poder reportar o tempo poupado pelos acertos.
+    """
+
+    def __init__(self, max_entries=256, disk_path=None, disk_max_entries=10000):
+        self.max_entries = max_entries
+        self.disk_max_entries = disk_max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = SQLitePool(disk_path, max_size=2, schema=RESULT_CACHE_SCHEMA) if disk_path else None
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._saved_ms = 0.0
+
+    @staticmethod
+    def key(photo_hash, version):
+        return f"{photo_hash}:{version}"
+
+    def _remember(self, key, value, compute_ms):
+        with self._lock:
+            self._memory[key] = (value, compute_ms)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        return self.lookup(key)[0]
+
+    def lookup(self, key):
+        """(valor, ms que custou a calcular) ou (None, 0.0) se não estiver em cache."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._memory_hits += 1
+                self._saved_ms += entry[1]
+                return entry
+        if self._disk is not None:
+            with self._disk.connection() as conn:
+                row = conn.execute("SELECT value, compute_ms FROM result_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                value = json.loads(row[0])
+                self._remember(key, value, row[1])
+                with self._lock:
+                    self._disk_hits += 1
+                    self._saved_ms += row[1]
+                return value, row[1]
+        with self._lock:
+            self._misses += 1
+        return None, 0.0
+
+    def put(self, key, value, compute_ms):
+        self._remember(key, value, compute_ms)
+        if self._disk is not None:
+            with self._disk.connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO result_cache (key, value, compute_ms, created_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), compute_ms, time.time()))
+                conn.execute(
+                    "DELETE FROM result_cache WHERE key IN (SELECT key FROM result_cache "
+                    "ORDER BY created_at DESC LIMIT -1 OFFSET ?)", (self.disk_max_entries,))
+                conn.commit()
+
+    def stats(self):
+        with self._lock:
+            hits = self._memory_hits + self._disk_hits
+            lookups = hits + self._misses
+            return {
+                "size": len(self._memory),
+                "max_entries": self.max_entries,
+                "disk": self._disk is not None,
+                "memory_hits": self._memory_hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+                "saved_ms": round(self._saved_ms, 3),
+            }
@@ -0,0 +1,27 @@
+# src/run.py
+# Ponto de entrada do executável PyInstaller e do servidor de desenvolvimento
+#
+#   python src/run.py        (python src/main.py também passa por aqui)
+#
+# Sem código ao nível do módulo: com spawn (Windows, executável) os processos do
+# ProcessPool reimportam o script de entrada antes do freeze_support(). Com main.py
+# como entrada, cada processo voltaria a criar a app, migrar o SQLite, ler a secret
+# key, calcular a versão dos assets e lançar o pré-aquecimento.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def run():
+    import multiprocessing
+    multiprocessing.freeze_support()  # necessário para o ProcessPool no executável PyInstaller
+    import main
+    # Servidor de desenvolvimento; em produção usar `python src/serve.py`
+    print("Iniciando Flask em http://localhost:5000...")
+    main.app.run(host="0.0.0.0", port=5000, debug=os.getenv("FLASK_DEBUG", "0") == "1")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,141 @@
+# src/serve.py
+# Arranque em produção: gunicorn (POSIX), waitress (Windows) ou servidor werkzeug com threads
+#
+#   python src/serve.py --workers 4 --threads 8 --port 5000
+#
+# Variáveis: SERVE_WORKERS, SERVE_THREADS, SERVE_HOST, SERVE_PORT, SERVE_BACKEND (auto|gunicorn|waitress|werkzeug)
+
+import argparse
+import glob
+import os
+import signal
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def _available(module):
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+
+def choose_backend(requested="auto"):
+    if requested != "auto":
+        return requested
+    if os.name != "nt" and _available("gunicorn"):
+        return "gunicorn"
+    if _available("waitress"):
+        return "waitress"
+    return "werkzeug"
+
+
+def prepare_metrics_dir(port):
+    """Pasta partilhada pelas métricas dos workers (METRICS_DIR), limpa a cada arranque do servidor."""
+    path = os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), f"mvp-collector-metrics-{port}"))
+    os.makedirs(path, exist_ok=True)
+    for stale in glob.glob(os.path.join(path, "*.json")):
+        os.remove(stale)
+    return path
+
+
+def serve_gunicorn(host, port, workers, threads, timeout):
+    from gunicorn.app.base import BaseApplication
+
+    # Cada worker tem as suas métricas: o /metrics soma-as a partir desta pasta
+    if workers > 1:
+        prepare_metrics_dir(port)
+
+    def worker_exit(server, worker):
+        # Grava a fila de escrita do worker antes de sair
+        import main
+        main.shutdown()
+        # Últimos valores dos contadores do worker (o atexit não corre com os._exit)
+        main.REGISTRY.write_snapshot()
+
+    class CollectorApplication(BaseApplication):
+        def load_config(self):
+            options = {
+                "bind": f"{host}:{port}",
+                "workers": workers,
+                "threads": threads,
+                "worker_class": "gthread" if threads > 1 else "sync",
+                "timeout": timeout,
+                "graceful_timeout": timeout,
+                "worker_exit": worker_exit,
+                # Sem preload: cada worker cria os seus pools, threads e ProcessPool depois do fork
+                "preload_app": False,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            import main
+            return main.app
+
+    CollectorApplication().run()
+
+
+def _install_signal_handlers():
+    # SIGTERM termina com SystemExit para que o atexit (main.shutdown) corra
+    def handle(signum, frame):
+        raise SystemExit(0)
+    signal.signal(signal.SIGTERM, handle)
+    if hasattr(signal, "SIGBREAK"):
+        signal.signal(signal.SIGBREAK, handle)
+
+
+def serve_waitress(host, port, workers, threads):
+    from waitress import serve
+    import main
+    if workers > 1:
+        print("waitress corre num único processo; a usar apenas --threads")
+    _install_signal_handlers()
+    try:
+        serve(main.app, host=host, port=port, threads=threads)
+    finally:
+        main.shutdown()
+
+
+def serve_werkzeug(host, port, workers, threads):
+    from werkzeug.serving import run_simple
+    import main
+    # O modo multi-processo do werkzeug faz fork por pedido (perderia a fila de escrita): só threads
+    if workers > 1:
+        print("werkzeug corre num único processo; instale gunicorn para vários workers")
+    _install_signal_handlers()
+    try:
+        run_simple(host, port, main.app, threaded=True, use_reloader=False, use_debugger=False)
+    finally:
+        main.shutdown()
+
+
+def run_server(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor de produção do MVP Collector")
+    parser.add_argument("--host", default=os.getenv("SERVE_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVE_PORT", 5000)))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SERVE_WORKERS", 2)))
+    parser.add_argument("--threads", type=int, default=int(os.getenv("SERVE_THREADS", 4)))
+    parser.add_argument("--timeout", type=int, default=int(os.getenv("SERVE_TIMEOUT", 60)))
+    parser.add_argument("--backend", default=os.getenv("SERVE_BACKEND", "auto"),
+                        choices=["auto", "gunicorn", "waitress", "werkzeug"])
+    args = parser.parse_args(argv)
+
+    backend = choose_backend(args.backend)
+    print(f"Iniciando {backend} em http://{args.host}:{args.port} "
+          f"({args.workers} worker(s), {args.threads} thread(s))...")
+    if backend == "gunicorn":
+        serve_gunicorn(args.host, args.port, args.workers, args.threads, args.timeout)
+    elif backend == "waitress":
+        serve_waitress(args.host, args.port, args.workers, args.threads)
+    else:
+        serve_werkzeug(args.host, args.port, args.workers, args.threads)
+
+
+if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
+    run_server()
@@ -0,0 +1,99 @@
+# src/singleflight.py
+# Coalescência de pedidos: chamadas concorrentes com a mesma chave partilham uma única execução
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    __slots__ = ("event", "result", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Garante no máximo uma execução em curso por chave.
+
+    O primeiro chamador executa `fn`; os restantes esperam e recebem o mesmo
+    resultado (ou a mesma exceção).
+    """
+
+    def __init__(self, name="singleflight"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._executions = 0
+        self._shared = 0
+        self._background = 0
+
+    def _join(self, key):
+        """(call, leader): o primeiro chamador de uma chave fica responsável pela execução."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._shared += 1
+                return call, False
+            call = self._calls[key] = _Call()
+            self._executions += 1
+            return call, True
+
+    def _lead(self, key, call, fn, args, kwargs):
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def do(self, key, fn, *args, **kwargs):
+        call, leader = self._join(key)
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        return self._lead(key, call, fn, args, kwargs)
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+    def refresh_async(self, key, fn, *args, **kwargs):
+        """Executa `fn` numa thread de fundo, exceto se já houver uma execução para a chave."""
+        # A chave fica registada antes de a thread arrancar: pedidos simultâneos com o
+        # valor expirado não lançam cada um a sua atualização
+        with self._lock:
+            if key in self._calls:
+                return False
+            call = self._calls[key] = _Call()
+            self._executions += 1
+            self._background += 1
+
+        def run():
+            try:
+                self._lead(key, call, fn, args, kwargs)
+            except Exception as e:
+                logger.warning("Atualização em segundo plano falhou (%s, %s): %s", self.name, key, e)
+
+        threading.Thread(target=run, name=f"{self.name}-refresh", daemon=True).start()
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "executions": self._executions,
+                "shared": self._shared,
+                "background_refreshes": self._background,
+                "in_flight": len(self._calls),
+            }
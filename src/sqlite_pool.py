@@ -0,0 +1,161 @@
+# src/sqlite_pool.py
+# Pool de conexões SQLite reutilizáveis (modo WAL) para o analysis_log
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Pragmas aplicados a cada conexão nova
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",       # seguro em WAL, evita fsync por commit
+    "cache_size": -8000,           # ~8 MB de page cache por conexão
+    "mmap_size": 64 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+    "foreign_keys": "ON",
+}
+
+
+class SQLitePool:
+    """Mantém um conjunto limitado de conexões SQLite abertas e reutiliza-as entre pedidos."""
+
+    def __init__(self, path, max_size=8, pragmas=None, schema=None, migrations=None):
+        self.path = path
+        self.max_size = max_size
+        self.pragmas = dict(PRAGMAS if pragmas is None else pragmas)
+        # schema: DDL idempotente executado sempre; migrations: [(versão, [sql, ...]), ...]
+        self.schema = list(schema or [])
+        self.migrations = sorted(migrations or [], key=lambda m: m[0])
+        self.schema_version = 0
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._acquired = 0
+        self._reused = 0
+        self._waits = 0
+        self._initialized = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=self.pragmas.get("busy_timeout", 5000) / 1000)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def init_schema(self):
+        """Cria diretório e tabelas e aplica migrações pendentes (apenas na primeira chamada)."""
+        with self._lock:
+            if self._initialized:
+                return
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            conn = self._connect()
+            try:
+                for ddl in self.schema:
+                    conn.execute(ddl)
+                conn.commit()
+                self.schema_version = self._migrate(conn)
+            finally:
+                conn.close()
+            self._initialized = True
+
+    def _migrate(self, conn):
+        """Aplica as migrações com versão > PRAGMA user_version, cada uma numa transação."""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target, statements in self.migrations:
+            if target <= version:
+                continue
+            # BEGIN IMMEDIATE serializa processos que arrancam ao mesmo tempo
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if target > version:
+                    for sql in statements:
+                        conn.execute(sql)
+                    conn.execute(f"PRAGMA user_version = {int(target)}")
+                    version = target
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return version
+
+    def acquire(self, timeout=10):
+        if not self._initialized:
+            self.init_schema()
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self._reused += 1
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.max_size
+                if can_create:
+                    self._created += 1
+                else:
+                    self._waits += 1
+            if can_create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                conn = self._idle.get(timeout=timeout)
+                with self._lock:
+                    self._reused += 1
+        with self._lock:
+            self._acquired += 1
+            self._in_use += 1
+        return conn
+
+    def release(self, conn):
+        # Nunca devolver ao pool uma conexão com transação pendente
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Empresta uma conexão do pool; devolve-a no fim do bloco."""
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "path": self.path,
+                "schema_version": self.schema_version,
+                "max_size": self.max_size,
+                "created": self._created,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "acquired": self._acquired,
+                "reused": self._reused,
+                "waits": self._waits,
+                "reuse_ratio": round(self._reused / self._acquired, 4) if self._acquired else 0.0,
+            }
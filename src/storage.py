@@ -0,0 +1,185 @@
+# src/storage.py
+# Gestão do diretório de uploads: miniaturas, retenção dos originais e compactação
+
+import logging
+import os
+import time
+
+from photo_store import sharded_path
+
+logger = logging.getLogger(__name__)
+
+THUMBS_DIRNAME = "thumbs"
+
+# Extensões tratadas como fotos originais
+ORIGINAL_EXTENSIONS = {"jpg", "jpeg", "png", "gif"}
+
+
+class StorageManager:
+    """Miniaturas WebP/JPEG dos uploads e remoção dos originais já sincronizados.
+
+    A compactação só cria miniaturas de fotos já sincronizadas. Um original
+    só é apagado quando (1) é mais antigo que `retention_days`, (2) já tem
+    miniatura, (3) nenhum registo ainda por sincronizar no analysis_log
+    aponta para ele e (4) o MySQL recebeu o original (`sync_blob="original"`).
+    Com `sync_blob="thumbnail"` o imagem_blob é a miniatura (WebP/JPEG) e os
+    originais ficam sempre no disco.
+    """
+
+    def __init__(self, folder, sqlite_pool=None, thumb_size=512, thumb_quality=75,
+                 thumb_format="webp", retention_days=7, sync_blob="original"):
+        self.folder = folder
+        self.thumbs_folder = os.path.join(folder, THUMBS_DIRNAME)
+        self.sqlite_pool = sqlite_pool
+        self.thumb_size = thumb_size
+        self.thumb_quality = thumb_quality
+        self._requested_format = thumb_format.lower()
+        self._thumb_format = None
+        self.retention_days = retention_days
+        self.sync_blob = sync_blob
+        self._last_report = None
+
+    @property
+    def thumb_format(self):
+        # Sem suporte WebP no Pillow usa JPEG (verificado no primeiro uso, não no arranque)
+        if self._thumb_format is None:
+            from PIL import features
+            webp = self._requested_format == "webp" and features.check("webp")
+            self._thumb_format = "webp" if webp else "jpeg"
+        return self._thumb_format
+
+    @property
+    def thumb_ext(self):
+        return "webp" if self.thumb_format == "webp" else "jpg"
+
+    def thumbnail_path(self, original_path):
+        stem = os.path.splitext(os.path.basename(original_path))[0]
+        return sharded_path(self.thumbs_folder, f"{stem}.{self.thumb_ext}")
+
+    def ensure_thumbnail(self, original_path):
+        """Cria a miniatura se ainda não existir; devolve (caminho, criada)."""
+        thumb = self.thumbnail_path(original_path)
+        if os.path.exists(thumb):
+            return thumb, False
+        os.makedirs(os.path.dirname(thumb), exist_ok=True)
+        size = (self.thumb_size, self.thumb_size)
+        tmp = f"{thumb}.part"
+        from PIL import Image, ImageOps
+        with Image.open(original_path) as img:
+            if img.format == "JPEG":
+                img.draft("RGB", size)
+            img = ImageOps.exif_transpose(img).convert("RGB")
+            img.thumbnail(size)
+            if self.thumb_format == "webp":
+                img.save(tmp, "WEBP", quality=self.thumb_quality, method=4)
+            else:
+                img.save(tmp, "JPEG", quality=self.thumb_quality, optimize=True, progressive=True)
+        os.replace(tmp, thumb)
+        return thumb, True
+
+    def read_blob(self, path):
+        """Conteúdo enviado como imagem_blob: miniatura ou original, conforme `sync_blob`."""
+        if not path:
+            return None
+        try:
+            if self.sync_blob == "thumbnail" or not os.path.exists(path):
+                thumb = self.thumbnail_path(path)
+                if os.path.exists(path):
+                    thumb, _ = self.ensure_thumbnail(path)
+                path = thumb
+            with open(path, "rb") as f:
+                return f.read()
+        except Exception as e:
+            logger.warning("Falha ao ler imagem: %s", e)
+            return None
+
+    def iter_originals(self):
+        """Percorre os originais (raiz e subdiretórios), ignorando miniaturas e ficheiros parciais."""
+        stack = [self.folder]
+        while stack:
+            current = stack.pop()
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.path != self.thumbs_folder:
+                            stack.append(entry.path)
+                    elif not entry.name.startswith(".") and \
+                            entry.name.rsplit(".", 1)[-1].lower() in ORIGINAL_EXTENSIONS:
+                        yield entry
+
+    def _unsynced_paths(self, conn):
+        # Registos ainda no SQLite acima do último id confirmado no MySQL
+        row = conn.execute("SELECT last_id FROM sync_state WHERE name = 'mysql'").fetchone()
+        hwm = row[0] if row else 0
+        return {r[0] for r in conn.execute(
+            "SELECT DISTINCT input_value FROM analysis_log WHERE id > ? AND input_value IS NOT NULL", (hwm,))}
+
+    def shard_legacy(self, conn):
+        """Move fotos da raiz de uploads/ para os subdiretórios e atualiza os registos."""
+        moved = 0
+        with os.scandir(self.folder) as entries:
+            legacy = [e.path for e in entries if e.is_file() and not e.name.startswith(".")
+                      and e.name.rsplit(".", 1)[-1].lower() in ORIGINAL_EXTENSIONS]
+        for old in legacy:
+            new = sharded_path(self.folder, os.path.basename(old))
+            os.makedirs(os.path.dirname(new), exist_ok=True)
+            os.replace(old, new)
+            conn.execute("UPDATE analysis_log SET input_value = ? WHERE input_value = ?", (new, old))
+            moved += 1
+        conn.commit()
+        return moved
+
+    def compact(self, now=None):
+        """Aplica a política de retenção; devolve um relatório com os bytes recuperados."""
+        now = time.time() if now is None else now
+        cutoff = now - self.retention_days * 86400
+        report = {
+            "scanned": 0, "moved_to_shards": 0, "thumbnails_created": 0, "originals_deleted": 0,
+            "kept_unsynced": 0, "kept_recent": 0, "kept_not_shipped": 0, "errors": 0,
+            "bytes_reclaimed": 0,
+        }
+        # Só o original enviado para o MySQL torna a cópia local dispensável
+        originals_shipped = self.sync_blob == "original"
+        with self.sqlite_pool.connection() as conn:
+            report["moved_to_shards"] = self.shard_legacy(conn)
+            unsynced = self._unsynced_paths(conn)
+        unsynced = {os.path.normpath(p) for p in unsynced}
+
+        for entry in self.iter_originals():
+            report["scanned"] += 1
+            try:
+                # Fotos por sincronizar ficam como estão (nem miniatura)
+                if os.path.normpath(entry.path) in unsynced:
+                    report["kept_unsynced"] += 1
+                    continue
+                st = entry.stat()
+                thumb, created = self.ensure_thumbnail(entry.path)
+                if created:
+                    report["thumbnails_created"] += 1
+                    report["bytes_reclaimed"] -= os.path.getsize(thumb)
+                if st.st_mtime > cutoff:
+                    report["kept_recent"] += 1
+                    continue
+                if not originals_shipped:
+                    report["kept_not_shipped"] += 1
+                    continue
+                os.remove(entry.path)
+                report["originals_deleted"] += 1
+                report["bytes_reclaimed"] += st.st_size
+            except Exception as e:
+                logger.warning("Falha na compactação de %s: %s", entry.path, e)
+                report["errors"] += 1
+        report["finished_at"] = now
+        self._last_report = report
+        return report
+
+    def stats(self):
+        return {
+            "folder": self.folder,
+            "thumb_format": self.thumb_format,
+            "thumb_size": self.thumb_size,
+            "thumb_quality": self.thumb_quality,
+            "retention_days": self.retention_days,
+            "sync_blob": self.sync_blob,
+            "last_compaction": self._last_report,
+        }
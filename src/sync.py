@@ -0,0 +1,214 @@
+# src/sync.py
+# Sincronização SQLite -> MySQL em lotes, retomável a partir do último id sincronizado
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+SELECT_BATCH_SQL = """
+    SELECT id_collector, id, timestamp, event_type, input_type,
+           input_value, location, uv_index, fitzpatrick_type,
+           recommendations, status_message
+    FROM analysis_log
+    WHERE id > ?
+    ORDER BY id
+    LIMIT ?
+"""
+
+# Um registo já enviado (mesmo coletor e id de origem) é ignorado: reenviar um lote
+# depois de uma falha entre o COMMIT no MySQL e a confirmação no SQLite não duplica
+MYSQL_ON_DUPLICATE = "ON DUPLICATE KEY UPDATE id_origem = id_origem"
+
+MYSQL_INSERT_SQL = f"""
+    INSERT INTO scp.analises
+    (id_colletor, data_hora, nome_imagem, localizacao,
+     indice_uv, tipo_pele, recomendacoes, estado, imagem_blob, id_origem)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    {MYSQL_ON_DUPLICATE}
+"""
+
+# id do registo no analysis_log do coletor e chave única (coletor, id de origem)
+MYSQL_SCHEMA_CHECK_SQL = """
+    SELECT COUNT(*) FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = 'scp' AND TABLE_NAME = 'analises' AND COLUMN_NAME = 'id_origem'
+"""
+MYSQL_SCHEMA_SQL = """
+    ALTER TABLE scp.analises
+    ADD COLUMN id_origem BIGINT NULL,
+    ADD UNIQUE KEY uq_analises_origem (id_colletor, id_origem)
+"""
+# Coluna/chave já criadas por outro coletor entre a verificação e o ALTER
+MYSQL_DUPLICATE_SCHEMA_ERRORS = (1060, 1061)
+
+SYNC_NAME = "mysql"
+# Último id removido de analysis_log_synced (registos que o /export_delta já não tem)
+RETAINED_NAME = "delta_retained"
+
+LOG_COLUMNS = ("id_collector, id, timestamp, event_type, input_type, input_value, location, "
+               "uv_index, fitzpatrick_type, recommendations, status_message")
+
+
+def read_image_blob(path):
+    """Conteúdo da imagem (imagem_blob) ou None se não for possível ler."""
+    if not path:
+        return None
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except Exception as e:
+        logger.warning("Falha ao ler imagem: %s", e)
+        return None
+
+
+def ensure_mysql_schema(cursor):
+    """Acrescenta id_origem e a chave única a scp.analises se ainda não existirem."""
+    cursor.execute(MYSQL_SCHEMA_CHECK_SQL)
+    if cursor.fetchone()[0]:
+        return False
+    try:
+        cursor.execute(MYSQL_SCHEMA_SQL)
+    except Exception as e:
+        if getattr(e, "errno", None) not in MYSQL_DUPLICATE_SCHEMA_ERRORS:
+            raise
+        return False
+    logger.info("scp.analises: coluna id_origem e chave única criadas")
+    return True
+
+
+def _row_bytes(values):
+    # Tamanho aproximado enviado para o MySQL (texto + imagem)
+    return sum(len(v) for v in values if isinstance(v, (str, bytes)))
+
+
+class SyncEngine:
+    """Copia o analysis_log para scp.analises por lotes.
+
+    Cada lote é inserido com `executemany` (INSERT multi-linha) e confirmado
+    no MySQL; o id do último registo fica guardado em `sync_state` e só os
+    registos até esse id saem do analysis_log. O INSERT é idempotente (chave
+    única id_colletor + id_origem), por isso um lote reenviado após uma falha
+    entre os dois COMMITs não cria linhas repetidas. As imagens do lote seguinte
+    são lidas em paralelo enquanto o lote atual é enviado.
+
+    Com `retain_seconds` os registos removidos ficam em analysis_log_synced
+    durante esse tempo, para os consumidores do /export_delta que ainda não
+    os leram.
+    """
+
+    def __init__(self, sqlite_pool, mysql_connect, batch_size=50, blob_workers=4, read_blob=read_image_blob,
+                 retain_seconds=0, prepare_mysql=ensure_mysql_schema):
+        self.sqlite_pool = sqlite_pool
+        self.mysql_connect = mysql_connect
+        self.batch_size = batch_size
+        self.blob_workers = blob_workers
+        self.read_blob = read_blob
+        self.retain_seconds = retain_seconds
+        # Chamado com o cursor do MySQL antes do primeiro lote (None desliga)
+        self.prepare_mysql = prepare_mysql
+
+    def high_water_mark(self, conn):
+        row = conn.execute("SELECT last_id FROM sync_state WHERE name = ?", (SYNC_NAME,)).fetchone()
+        return row[0] if row else 0
+
+    def _confirm(self, conn, last_id):
+        # Regista o progresso e remove apenas o que já está no MySQL
+        conn.execute(
+            "INSERT OR REPLACE INTO sync_state (name, last_id, updated_at) VALUES (?, ?, ?)",
+            (SYNC_NAME, last_id, datetime.now().isoformat()))
+        if self.retain_seconds > 0:
+            conn.execute(
+                f"INSERT OR IGNORE INTO analysis_log_synced ({LOG_COLUMNS}, synced_at) "
+                f"SELECT {LOG_COLUMNS}, ? FROM analysis_log WHERE id <= ?", (time.time(), last_id))
+        deleted = conn.execute("DELETE FROM analysis_log WHERE id <= ?", (last_id,)).rowcount
+        self._expire_retained(conn, last_id)
+        conn.commit()
+        return deleted
+
+    def _expire_retained(self, conn, last_id):
+        # Sem retenção, tudo até last_id deixa de estar disponível para o /export_delta
+        cutoff = time.time() - self.retain_seconds
+        expired = conn.execute(
+            "SELECT MAX(id) FROM analysis_log_synced WHERE synced_at < ?", (cutoff,)).fetchone()[0]
+        through = last_id if self.retain_seconds <= 0 else expired
+        if through is None:
+            return
+        conn.execute("DELETE FROM analysis_log_synced WHERE id <= ?", (through,))
+        conn.execute(
+            "INSERT INTO sync_state (name, last_id, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET last_id = MAX(last_id, excluded.last_id), updated_at = excluded.updated_at",
+            (RETAINED_NAME, through, datetime.now().isoformat()))
+
+    def _fetch(self, conn, after_id):
+        return conn.execute(SELECT_BATCH_SQL, (after_id, self.batch_size)).fetchall()
+
+    def pending(self):
+        with self.sqlite_pool.connection() as conn:
+            hwm = self.high_water_mark(conn)
+            return conn.execute("SELECT COUNT(*) FROM analysis_log WHERE id > ?", (hwm,)).fetchone()[0]
+
+    def run(self, progress=None, cancelled=None):
+        """Executa a sincronização; devolve um resumo com o nº de registos transferidos.
+
+        `progress(transferred, bytes_sent)` é chamado após cada lote confirmado.
+        `cancelled()` é consultado entre lotes: ao cancelar, os lotes já
+        confirmados ficam no MySQL e os restantes ficam no SQLite.
+        """
+        transferred = 0
+        deleted = 0
+        batches = 0
+        bytes_sent = 0
+        was_cancelled = False
+        mysql_conn = None
+        mysql_cursor = None
+        with self.sqlite_pool.connection() as conn, ThreadPoolExecutor(self.blob_workers) as pool:
+            hwm = self.high_water_mark(conn)
+            # Registos sincronizados numa execução anterior interrompida antes do DELETE
+            deleted += self._confirm(conn, hwm) if hwm else 0
+
+            batch = self._fetch(conn, hwm)
+            if not batch:
+                return {"transferred": 0, "batches": 0, "deleted": deleted, "last_id": hwm,
+                        "bytes_sent": 0, "cancelled": False}
+            blobs = [pool.submit(self.read_blob, r[5]) for r in batch]
+            try:
+                mysql_conn = self.mysql_connect()
+                mysql_cursor = mysql_conn.cursor()
+                if self.prepare_mysql is not None:
+                    self.prepare_mysql(mysql_cursor)
+                while batch:
+                    if cancelled is not None and cancelled():
+                        was_cancelled = True
+                        break
+                    # Pré-carrega as imagens do lote seguinte enquanto envia o atual
+                    next_batch = self._fetch(conn, batch[-1][1])
+                    next_blobs = [pool.submit(self.read_blob, r[5]) for r in next_batch]
+
+                    values = [
+                        (r[0], r[2], r[5], r[6], r[7], r[8], r[9], r[10], blob.result(), r[1])
+                        for r, blob in zip(batch, blobs)
+                    ]
+                    mysql_cursor.executemany(MYSQL_INSERT_SQL, values)
+                    mysql_conn.commit()
+
+                    hwm = batch[-1][1]
+                    deleted += self._confirm(conn, hwm)
+                    transferred += len(batch)
+                    batches += 1
+                    bytes_sent += sum(_row_bytes(v) for v in values)
+                    if progress is not None:
+                        progress(transferred, bytes_sent)
+                    batch, blobs = next_batch, next_blobs
+            except Exception:
+                if mysql_conn is not None:
+                    mysql_conn.rollback()
+                raise
+            finally:
+                if mysql_cursor is not None:
+                    mysql_cursor.close()
+                if mysql_conn is not None:
+                    mysql_conn.close()
+        return {"transferred": transferred, "batches": batches, "deleted": deleted, "last_id": hwm,
+                "bytes_sent": bytes_sent, "cancelled": was_cancelled}
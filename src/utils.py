@@ -1,4 +1,20 @@
+import re
+
 # Placeholder for utility functions
 def preprocess_image(image_path):
     # Add any image preprocessing logic if needed
-    pass
\ No newline at end of file
+    pass
+
+def clean_text(text):
+    # Remove escapes como \uXXXX
+    text = text.encode('utf-8').decode('unicode_escape')
+
+    # Remove emojis e símbolos Unicode
+    text = re.sub(r'^\[|\]$', '', text)  # Remove colchetes
+    text = re.sub(r'\\u[0-9a-fA-F]{4}', '', str(text))
+    text = re.sub(r'[\x00-\x1F\x7F-\x9F]', ' ', text)  # Remove caracteres de controle
+    text = re.sub(r'\\[nrt"\\]', ' ', text)  # Remove barras invertidas comuns
+    text = re.sub(r'\s+', ' ', text)  # Remove espaços extras
+    text = re.sub(r'[^\x20-\x7E]', ' ', text)  # Remove caracteres não-ASCII
+
+    return text.strip()
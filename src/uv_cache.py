@@ -0,0 +1,137 @@
+# src/uv_cache.py
+# Cache persistente do índice UV, partilhada por todos os processos através de SQLite
+
+import math
+import threading
+import time
+
+from sqlite_pool import SQLitePool
+
+UV_CACHE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS uv_cache (
+        bucket TEXT PRIMARY KEY,
+        uv_index REAL NOT NULL,
+        fetched_at REAL NOT NULL,
+        last_access REAL NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_uv_cache_last_access ON uv_cache (last_access)",
+]
+
+
+class UVCache:
+    """Cache UV com coordenadas agrupadas numa grelha, TTL e limite de entradas (LRU).
+
+    Coordenadas dentro da mesma célula de `resolution` graus (0.05° ≈ 5 km)
+    partilham a mesma entrada. Os valores ficam num ficheiro SQLite, por isso
+    sobrevivem a reinícios e são vistos por todos os workers.
+
+    Um acerto só atualiza `last_access` (ordem do LRU) se a última atualização
+    tiver mais de `touch_interval` segundos: a leitura normal não escreve.
+    """
+
+    def __init__(self, path, resolution=0.05, ttl=1800, max_entries=1024, stale_ttl=0, touch_interval=60):
+        self.resolution = resolution
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self.pool = SQLitePool(path, max_size=4, schema=UV_CACHE_SCHEMA)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._stale = 0
+        self._expired = 0
+        self._evictions = 0
+        self._touches = 0
+
+    def bucket(self, lat, lng):
+        """Chave da célula da grelha que contém (lat, lng)."""
+        return f"{math.floor(float(lat) / self.resolution)}_{math.floor(float(lng) / self.resolution)}"
+
+    def _count(self, name, n=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def lookup(self, lat, lng):
+        """(uv, idade em segundos) da célula, ou None.
+
+        Devolve também valores expirados há menos de `stale_ttl` segundos,
+        para servir o valor antigo enquanto outro pedido o atualiza.
+        """
+        key = self.bucket(lat, lng)
+        now = time.time()
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT uv_index, fetched_at, last_access FROM uv_cache WHERE bucket = ?", (key,)).fetchone()
+            if row is None:
+                self._count("_misses")
+                return None
+            uv, fetched_at, last_access = row
+            age = now - fetched_at
+            if age >= self.ttl + self.stale_ttl:
+                self._count("_misses")
+                self._count("_expired")
+                return None
+            # Transação de escrita só de vez em quando (evita disputar o WAL entre workers)
+            if now - last_access >= self.touch_interval:
+                conn.execute("UPDATE uv_cache SET last_access = ? WHERE bucket = ?", (now, key))
+                conn.commit()
+                self._count("_touches")
+        self._count("_hits" if age < self.ttl else "_stale")
+        return float(uv), age
+
+    def get(self, lat, lng):
+        """Valor UV ainda válido (não expirado) para a célula, ou None."""
+        found = self.lookup(lat, lng)
+        if found is None or found[1] >= self.ttl:
+            return None
+        return found[0]
+
+    def set(self, lat, lng, uv_index):
+        key = self.bucket(lat, lng)
+        now = time.time()
+        with self.pool.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO uv_cache (bucket, uv_index, fetched_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, float(uv_index), now, now))
+            evicted = self._evict(conn, now)
+            conn.commit()
+        if evicted:
+            self._count("_evictions", evicted)
+
+    def _evict(self, conn, now):
+        # Primeiro as entradas expiradas, depois as menos usadas acima do limite
+        evicted = conn.execute("DELETE FROM uv_cache WHERE fetched_at <= ?", (now - self.ttl - self.stale_ttl,)).rowcount
+        excess = conn.execute("SELECT COUNT(*) FROM uv_cache").fetchone()[0] - self.max_entries
+        if excess > 0:
+            evicted += conn.execute(
+                "DELETE FROM uv_cache WHERE bucket IN "
+                "(SELECT bucket FROM uv_cache ORDER BY last_access LIMIT ?)", (excess,)).rowcount
+        return evicted
+
+    def clear(self):
+        with self.pool.connection() as conn:
+            conn.execute("DELETE FROM uv_cache")
+            conn.commit()
+
+    def stats(self):
+        with self.pool.connection() as conn:
+            size = conn.execute("SELECT COUNT(*) FROM uv_cache").fetchone()[0]
+        with self._lock:
+            lookups = self._hits + self._stale + self._misses
+            return {
+                "size": size,
+                "max_entries": self.max_entries,
+                "resolution_deg": self.resolution,
+                "ttl_s": self.ttl,
+                "stale_ttl_s": self.stale_ttl,
+                "hits": self._hits,
+                "stale_hits": self._stale,
+                "misses": self._misses,
+                "expired": self._expired,
+                "evictions": self._evictions,
+                "touches": self._touches,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
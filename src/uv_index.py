@@ -1,91 +1,148 @@
-import requests
+import logging
 import os
+import threading
 import time
-from geopy.geocoders import Nominatim
 from dotenv import load_dotenv
 
+from geocode import resolve_location
+from http_client import http_client
+from metrics import stage_timer
+from singleflight import SingleFlight
+from uv_cache import UVCache
+
 load_dotenv()  # Carrega .env
 
+logger = logging.getLogger(__name__)
+
 # API_KEY do OpenWeather (cadastre grátis em openweathermap.org/api)
 API_KEY = os.getenv("OPENWEATHER_API_KEY")
 if not API_KEY:
-    print("AVISO: OPENWEATHER_API_KEY faltando no .env — use fallback 4.4")
+    logger.warning("OPENWEATHER_API_KEY faltando no .env — use fallback 4.4")
+
+# Cache partilhada entre processos (SQLite), agrupada por células de UV_CACHE_RESOLUTION graus
+CACHE_TTL = int(os.getenv("UV_CACHE_TTL", 1800))  # 30 minutos em segundos
+uv_cache = UVCache(
+    os.getenv("UV_CACHE_PATH", "uv_cache.db"),
+    resolution=float(os.getenv("UV_CACHE_RESOLUTION", 0.05)),
+    ttl=CACHE_TTL,
+    max_entries=int(os.getenv("UV_CACHE_MAX_ENTRIES", 1024)),
+    stale_ttl=int(os.getenv("UV_CACHE_STALE_TTL", 1800)),  # serve o valor expirado enquanto atualiza
+    touch_interval=int(os.getenv("UV_CACHE_TOUCH_INTERVAL", 60)),  # precisão do LRU (segundos)
+)
+
+OPENWEATHER_URL = os.getenv("OPENWEATHER_URL", "https://api.openweathermap.org/data/2.5/uvi")
 
-# Cache simples (dict global: chave=lat_lng, valor=(uv, timestamp))
-uv_cache = {}
-CACHE_TTL = 1800  # 30 minutos em segundos
+UV_FALLBACK = 4.4
+# Depois de uma falha, a célula usa o valor por omissão durante UV_NEGATIVE_TTL segundos sem
+# voltar a chamar a API (sem rede, cada pedido pagaria os retries e o backoff do http_client)
+NEGATIVE_TTL = float(os.getenv("UV_NEGATIVE_TTL", 60))
+NEGATIVE_MAX_ENTRIES = 1024
+_failures = {}  # célula -> time.monotonic() até ao qual não se tenta de novo
+_failures_lock = threading.Lock()
+
+# Pedidos concorrentes para a mesma célula/local partilham uma única chamada externa
+uv_flight = SingleFlight("uv")
+geocode_flight = SingleFlight("geocode")
+
+def _geocode(location):
+    try:
+        lat, lng, _address = resolve_location(location)
+        return lat, lng
+    except Exception as e:
+        raise Exception(f"Geocoding failed: {str(e)}")
 
 def get_uv_index(location=None, lat=None, lng=None):
     # Primeiro, obtenha lat/lng (como antes)
     if lat is not None and lng is not None:
-        print("Usando lat/lng direto (otimizado)")
-        cache_key = f"{lat}_{lng}"
+        logger.debug("Usando lat/lng direto (otimizado)")
     elif location:
         # Fallback para geocode se só location
-        geolocator = Nominatim(user_agent="SCP_Collector")
-        try:
-            start_geo = time.time()
-            location_data = geolocator.geocode(location, timeout=10)
-            print(f"Geocode tempo: {time.time() - start_geo:.2f}s")
-            if not location_data:
-                raise Exception("Invalid location. Please enter a valid city and country (e.g., 'Lisbon, Portugal').")
-            lat = location_data.latitude
-            lng = location_data.longitude
-            cache_key = f"{lat}_{lng}"
-        except Exception as e:
-            raise Exception(f"Geocoding failed: {str(e)}")
+        lat, lng = geocode_flight.do(" ".join(location.lower().split()), _geocode, location)
     else:
         raise Exception("Forneça 'location' OU 'lat' e 'lng'")
 
     # Checa cache primeiro (instantâneo!)
-    if cache_key in uv_cache:
-        cached_uv, cached_time = uv_cache[cache_key]
-        if time.time() - cached_time < CACHE_TTL:
-            print(f"Cache hit para {cache_key}: UV {cached_uv} (válido por mais {(CACHE_TTL - (time.time() - cached_time)) / 60:.1f} min)")
-            return float(cached_uv)
+    cache_key = uv_cache.bucket(lat, lng)
+    cached = uv_cache.lookup(lat, lng)
+    if cached is not None:
+        cached_uv, age = cached
+        if age < CACHE_TTL:
+            logger.debug("Cache hit para %s: UV %s", cache_key, cached_uv)
         else:
-            print(f"Cache expirado para {cache_key}, atualizando...")
+            # Stale-while-revalidate: responde já e atualiza em segundo plano
+            logger.debug("Cache expirado para %s, a atualizar em segundo plano...", cache_key)
+            uv_flight.refresh_async(cache_key, fetch_uv_index, lat, lng)
+        return cached_uv
+
+    return uv_flight.do(cache_key, fetch_uv_index, lat, lng)
+
+def _failed_recently(cache_key):
+    with _failures_lock:
+        until = _failures.get(cache_key)
+        if until is None:
+            return False
+        if until > time.monotonic():
+            return True
+        del _failures[cache_key]
+        return False
+
+def _remember_failure(cache_key):
+    now = time.monotonic()
+    with _failures_lock:
+        if len(_failures) >= NEGATIVE_MAX_ENTRIES:
+            for key in [k for k, until in _failures.items() if until <= now]:
+                del _failures[key]
+        _failures[cache_key] = now + NEGATIVE_TTL
+
+def fetch_uv_index(lat, lng):
+    """Consulta a API OpenWeather e atualiza a cache; em caso de falha devolve UV_FALLBACK."""
+    cache_key = uv_cache.bucket(lat, lng)
 
     # OpenWeather UV API (rápida, confiável)
     if not API_KEY:
-        print("Sem API key — usando fallback 4.4")
-        uv_index = 4.4
-        uv_cache[cache_key] = (uv_index, time.time())  # Cache até fallback
+        logger.debug("Sem API key — usando fallback 4.4")
+        uv_index = UV_FALLBACK
+        uv_cache.set(lat, lng, uv_index)  # Cache até fallback
         return uv_index
 
-    url = "https://api.openweathermap.org/data/2.5/uvi"
+    if _failed_recently(cache_key):
+        logger.debug("Falha recente para %s — usando fallback 4.4 sem chamar a API", cache_key)
+        return UV_FALLBACK
+
+    url = OPENWEATHER_URL
     params = {"lat": lat, "lon": lng, "appid": API_KEY}
 
-    # Make API request (com retry)
-    uv_index = 4.4  # Default
+    # Make API request (pool keep-alive, retry com jitter no http_client)
     try:
         start_api = time.time()
-        for attempt in range(3):
-            try:
-                response = requests.get(url, params=params, timeout=10)
-                print(f"API tentativa {attempt+1}: tempo {time.time() - start_api:.2f}s, status: {response.status_code}")
-                response.raise_for_status()
-                break
-            except requests.exceptions.Timeout:
-                print(f"Timeout na tentativa {attempt+1}/3. Aguardando...")
-                time.sleep(2 ** attempt)
-                if attempt == 2:
-                    raise
-        else:
-            raise requests.exceptions.Timeout("Todas tentativas falharam")
+        with stage_timer("uv_fetch"):
+            response = http_client.get(url, params=params)
+        logger.debug("API tempo %.2fs, status: %s", time.time() - start_api, response.status_code)
+        response.raise_for_status()
 
         data = response.json()
         uv_index = data.get("value")  # Formato: {"value": 4.2}
         if uv_index is None:
             raise Exception("UV index not found in API response.")
-        
-        # Salva no cache após sucesso
-        uv_cache[cache_key] = (float(uv_index), time.time())
-        print(f"Cache atualizado para {cache_key}: UV {uv_index}")
-        
-        return float(uv_index)
-    except requests.exceptions.RequestException as e:
-        print(f"Request failed: {e}. Using default UV index value.")
-        raise Exception(f"Failed to fetch UV index: {str(e)}")
-    finally:
-        return uv_index
\ No newline at end of file
+        uv_index = float(uv_index)
+    except Exception as e:
+        # O valor por omissão não entra na cache UV; só a falha fica registada (NEGATIVE_TTL)
+        logger.warning("Falha ao obter o índice UV para %s (%s: %s). Usando 4.4 durante %ss.",
+                       cache_key, type(e).__name__, e, NEGATIVE_TTL)
+        _remember_failure(cache_key)
+        return UV_FALLBACK
+
+    # Salva no cache após sucesso
+    uv_cache.set(lat, lng, uv_index)
+    logger.debug("Cache atualizado para %s: UV %s", cache_key, uv_index)
+    return uv_index
+
+async def get_uv_index_async(location=None, lat=None, lng=None):
+    """Variante asyncio de get_uv_index, para correr em paralelo com outras consultas."""
+    import asyncio
+    return await asyncio.to_thread(get_uv_index, location=location, lat=lat, lng=lng)
+
+def prefetch_uv_index(lat, lng):
+    """Aquece a cache UV numa thread de fundo (não bloqueia o pedido)."""
+    threading.Thread(target=get_uv_index, kwargs={"lat": lat, "lng": lng},
+                     name="uv-prefetch", daemon=True).start()
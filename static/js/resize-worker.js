@@ -0,0 +1,45 @@
+// resize-worker.js
+// Reduz a foto numa OffscreenCanvas fora da thread principal antes do upload.
+//
+// Mensagem: { id, source, maxSide, quality, type, keepOriginal }
+//   source: Blob (ficheiro escolhido) ou ImageBitmap (frame da câmara)
+//   keepOriginal: com um ImageBitmap, codifica também o frame em tamanho real (arquivo)
+// Resposta: { id, blob, original, width, height, originalWidth, originalHeight } ou { id, error }
+
+async function encode(bitmap, width, height, type, quality) {
+    const canvas = new OffscreenCanvas(width, height);
+    const ctx = canvas.getContext("2d");
+    ctx.imageSmoothingQuality = "high";
+    ctx.drawImage(bitmap, 0, 0, width, height);
+    return canvas.convertToBlob({ type, quality });
+}
+
+self.onmessage = async event => {
+    const { id, source, maxSide, quality, type, keepOriginal } = event.data;
+    let bitmap = null;
+    try {
+        // imageOrientation: aplica a rotação EXIF das fotos do telemóvel
+        bitmap = source instanceof Blob
+            ? await createImageBitmap(source, { imageOrientation: "from-image" })
+            : source;
+        const originalWidth = bitmap.width;
+        const originalHeight = bitmap.height;
+        const scale = Math.min(1, maxSide / Math.max(originalWidth, originalHeight));
+        const width = Math.max(1, Math.round(originalWidth * scale));
+        const height = Math.max(1, Math.round(originalHeight * scale));
+
+        let original = null;
+        if (keepOriginal && !(source instanceof Blob)) {
+            original = await encode(bitmap, originalWidth, originalHeight, "image/jpeg", 0.92);
+        }
+        // Ficheiro já pequeno e no formato pedido: envia tal como está
+        const blob = scale === 1 && source instanceof Blob && source.type === type
+            ? source
+            : await encode(bitmap, width, height, type, quality);
+        self.postMessage({ id, blob, original, width, height, originalWidth, originalHeight });
+    } catch (err) {
+        self.postMessage({ id, error: String((err && err.message) || err) });
+    } finally {
+        if (bitmap) bitmap.close();
+    }
+};
@@ -18,6 +18,8 @@ document.addEventListener("DOMContentLoaded", () => {
     const countEl = document.getElementById("analysis-count");
 
     let photoPath = null;
+    let pendingPhoto = null;  // FormData da foto ainda por enviar (enviada com a análise)
+    let photoCapturedAt = null;
     let stream = null;
     let isDialogOpen = false;
 
@@ -48,6 +50,109 @@ document.addEventListener("DOMContentLoaded", () => {
     }
     updateAnalysisCount();
 
+    // Análises feitas offline reenviadas pelo service worker
+    if ("serviceWorker" in navigator) {
+        navigator.serviceWorker.addEventListener("message", event => {
+            const data = event.data || {};
+            if (data.type !== "queue-replayed" || !(data.analyzed || data.failed || data.dropped)) return;
+            const pending = data.remaining ? `, ${data.remaining} pendente(s)` : "";
+            const dropped = data.dropped ? `, ${data.dropped} descartada(s) após várias tentativas` : "";
+            showStatus(`${data.analyzed} análise(s) em fila concluída(s)${pending}${dropped}`,
+                data.failed || data.dropped ? "#FFA500" : "#00B300");
+            updateAnalysisCount();
+        });
+    }
+
+    // Redimensionamento no cliente: resolução/qualidade anunciadas pelo servidor em /client_config
+    const defaultUploadConfig = { upload_max_side: 2048, upload_quality: 0.8, upload_type: "image/jpeg", archive_original: false };
+    const uploadConfig = axios.get("/client_config")
+        .then(res => ({ ...defaultUploadConfig, ...res.data }))
+        .catch(() => defaultUploadConfig);
+
+    const canResizeOffThread = typeof Worker !== "undefined" && typeof OffscreenCanvas !== "undefined"
+        && typeof createImageBitmap !== "undefined";
+    let resizeWorker = null;
+    let resizeSeq = 0;
+    const pendingResizes = new Map();
+
+    function getResizeWorker() {
+        if (!resizeWorker) {
+            resizeWorker = new Worker("/static/js/resize-worker.js");
+            resizeWorker.onmessage = event => {
+                const pending = pendingResizes.get(event.data.id);
+                if (!pending) return;
+                pendingResizes.delete(event.data.id);
+                if (event.data.error) pending.reject(new Error(event.data.error));
+                else pending.resolve(event.data);
+            };
+        }
+        return resizeWorker;
+    }
+
+    // Reduz um Blob ou ImageBitmap no worker; resolve com { blob, original, width, height, ... }
+    function resizeOffThread(source, config) {
+        return new Promise((resolve, reject) => {
+            const id = ++resizeSeq;
+            pendingResizes.set(id, { resolve, reject });
+            const message = {
+                id, source,
+                maxSide: config.upload_max_side,
+                quality: config.upload_quality,
+                type: config.upload_type,
+                keepOriginal: config.archive_original,
+            };
+            // O ImageBitmap é transferido (não copiado) para o worker
+            getResizeWorker().postMessage(message, source instanceof Blob ? [] : [source]);
+        });
+    }
+
+    // Foto reduzida (e o original, se o servidor o arquivar) pronta a enviar
+    async function preparePhoto(source, filename) {
+        const config = await uploadConfig;
+        let photo = source;
+        let original = null;
+        if (canResizeOffThread) {
+            try {
+                const resized = await resizeOffThread(source, config);
+                photo = resized.blob;
+                if (config.archive_original) original = source instanceof Blob ? source : resized.original;
+            } catch (err) {
+                // O frame da câmara já foi transferido para o worker: não há como o reenviar
+                if (!(source instanceof Blob)) throw err;
+                // Sem redimensionamento possível: envia o ficheiro tal como está
+                console.warn("Redimensionamento falhou:", err);
+            }
+        }
+        if (!(photo instanceof Blob)) {
+            // Frame da câmara sem worker: codifica na thread principal, já no tamanho reduzido
+            photo = await frameToBlob(photo, config);
+        }
+        const formData = new FormData();
+        const ext = photo.type === "image/png" ? "png" : "jpg";
+        formData.append("photo", photo, filename.replace(/\.[^.]+$/, "") + "." + ext);
+        if (original) formData.append("original", original, "original_" + filename);
+        return formData;
+    }
+
+    // A foto só é enviada com o pedido de análise (/upload_analyze: uma única ida ao servidor)
+    function photoReady(formData, filename) {
+        pendingPhoto = formData;
+        photoCapturedAt = new Date().toISOString();
+        photoPath = filename;
+        analyzeButton.disabled = false;
+        stopCamera();
+        showStatus("Foto pronta para análise", "#00B300");
+    }
+
+    function frameToBlob(bitmap, config) {
+        const scale = Math.min(1, config.upload_max_side / Math.max(bitmap.width, bitmap.height));
+        const canvas = document.createElement("canvas");
+        canvas.width = Math.round(bitmap.width * scale);
+        canvas.height = Math.round(bitmap.height * scale);
+        canvas.getContext("2d").drawImage(bitmap.source || bitmap, 0, 0, canvas.width, canvas.height);
+        return new Promise(resolve => canvas.toBlob(resolve, config.upload_type, config.upload_quality));
+    }
+
     // Detectar localização
     if (locationLabel) {
         axios.get("/detect_location")
@@ -58,6 +163,7 @@ document.addEventListener("DOMContentLoaded", () => {
                 }
                 showStatus(d.message, d.message_color);
                 window.locationData = d.location;
+                window.locationCoords = d.lat != null && d.lng != null ? { lat: d.lat, lng: d.lng } : null;
             })
             .catch(() => {
                 showStatus("Erro ao detectar localização", "#FF0000");
@@ -83,20 +189,11 @@ document.addEventListener("DOMContentLoaded", () => {
                 showStatus("Nenhuma foto selecionada", "#FF0000");
                 return;
             }
-            const formData = new FormData();
-            formData.append("photo", photoUpload.files[0]);
-            showStatus("A carregar foto...", "#0080FF");
+            const file = photoUpload.files[0];
+            showStatus("A preparar foto...", "#0080FF");
 
-            axios.post("/upload", formData)
-                .then(response => {
-                    const res = response.data;
-                    showStatus(res.message, res.message_color);
-                    if (res.status === "success") {
-                        photoPath = res.filename;
-                        analyzeButton.disabled = false;
-                        stopCamera();
-                    }
-                })
+            preparePhoto(file, file.name)
+                .then(formData => photoReady(formData, file.name))
                 .catch(error => {
                     console.error("Erro upload:", error);
                     showStatus("Erro ao carregar foto", "#FF0000");
@@ -123,37 +220,30 @@ document.addEventListener("DOMContentLoaded", () => {
             }
         });
 
-        captureButton.addEventListener("click", () => {
+        captureButton.addEventListener("click", async () => {
+            let frame;
             try {
-                const canvas = document.createElement("canvas");
-                canvas.width = cameraFeed.videoWidth;
-                canvas.height = cameraFeed.videoHeight;
-                canvas.getContext("2d").drawImage(cameraFeed, 0, 0);
-                canvas.toBlob(blob => {
-                    const formData = new FormData();
-                    formData.append("photo", blob, "captured_photo.jpg");
-                    showStatus("A processar foto capturada...", "#0080FF");
-
-                    axios.post("/upload", formData)
-                        .then(response => {
-                            const res = response.data;
-                            showStatus(res.message, res.message_color);
-                            if (res.status === "success") {
-                                photoPath = res.filename;
-                                analyzeButton.disabled = false;
-                                stopCamera();
-                            }
-                        })
-                        .catch(error => {
-                            console.error("Erro captura:", error);
-                            showStatus("Erro ao processar foto", "#FF0000");
-                            alert("Erro ao capturar foto: " + error.message);
-                        });
-                }, "image/jpeg", 0.8);
+                // Frame em tamanho real; a redução e a codificação JPEG correm no worker
+                frame = typeof createImageBitmap !== "undefined"
+                    ? await createImageBitmap(cameraFeed)
+                    : cameraFeed;
             } catch (err) {
                 console.error("Erro captura canvas:", err);
                 showStatus("Erro na captura", "#FF0000");
+                return;
+            }
+            if (frame === cameraFeed) {
+                frame = { width: cameraFeed.videoWidth, height: cameraFeed.videoHeight, source: cameraFeed };
             }
+            showStatus("A processar foto capturada...", "#0080FF");
+
+            preparePhoto(frame, "captured_photo.jpg")
+                .then(formData => photoReady(formData, "captured_photo.jpg"))
+                .catch(error => {
+                    console.error("Erro captura:", error);
+                    showStatus("Erro ao processar foto", "#FF0000");
+                    alert("Erro ao capturar foto: " + error.message);
+                });
         });
     }
 
@@ -187,7 +277,18 @@ document.addEventListener("DOMContentLoaded", () => {
             analyzeButton.disabled = true;
             analyzeButton.textContent = "🔄 Analisando...";
 
-            axios.post("/analyze", { filename: photoPath })
+            // Local e hora da captura: sem rede o service worker guarda-os com a foto em fila
+            const capture = {
+                location: window.locationData,
+                lat: window.locationCoords ? window.locationCoords.lat : "",
+                lng: window.locationCoords ? window.locationCoords.lng : "",
+                captured_at: photoCapturedAt || new Date().toISOString(),
+            };
+            if (pendingPhoto) Object.entries(capture).forEach(([k, v]) => pendingPhoto.set(k, v));
+            const request = pendingPhoto
+                ? axios.post("/upload_analyze", pendingPhoto)
+                : axios.post("/analyze", { filename: photoPath, ...capture });
+            request
                 .then(response => {
                     const res = response.data;
                     if (spinner) spinner.classList.add("d-none");
@@ -198,6 +299,7 @@ document.addEventListener("DOMContentLoaded", () => {
                         updateAnalysisCount();
                         photoUpload.value = "";
                         photoPath = null;
+                        pendingPhoto = null;
                         analyzeButton.textContent = "🔍 Analisar e Obter Dicas";
                         analyzeButton.disabled = true;
                     } else {
@@ -232,32 +334,55 @@ document.addEventListener("DOMContentLoaded", () => {
         setTimeout(() => { if (dataMessage) dataMessage.innerHTML = ''; }, 2000);
     };
 
-    // Export MySQL
+    // Export MySQL (tarefa em segundo plano; progresso por polling em /jobs/<id>)
+    const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+
+    async function waitForJob(jobId, msgEl) {
+        while (true) {
+            const { data } = await axios.get(`/jobs/${jobId}`);
+            const job = data.job;
+            if (job.status !== "queued" && job.status !== "running") return job;
+            if (msgEl) {
+                const total = job.rows_total ? `/${job.rows_total}` : "";
+                const eta = job.eta_seconds != null ? ` (~${Math.ceil(job.eta_seconds)}s)` : "";
+                msgEl.textContent = `💾 Exportando para MySQL... ${job.rows_done}${total}${eta}`;
+            }
+            await sleep(1000);
+        }
+    }
+
     window.exportDb = async function() {
         const msgEl = document.getElementById("data-message");
         if (msgEl) msgEl.textContent = '💾 Exportando para MySQL...';
 
         try {
-            const response = await axios.post('/export_db', {});
+            const response = await axios.post('/export_db', {}, { validateStatus: s => s < 500 });
             const res = response.data;
-            if (msgEl) {
-                if (res.status === "success") {
-                    msgEl.textContent = `✓ ${res.quantidade} registro(s) salvos no MySQL!`;
-                } else {
-                    msgEl.textContent = `⚠️ ${res.message}`;
+            if (res.job_id) {
+                const job = await waitForJob(res.job_id, msgEl);
+                if (msgEl) {
+                    if (job.status === "done") {
+                        msgEl.textContent = `✓ ${job.result.transferred} registro(s) salvos no MySQL!`;
+                    } else if (job.status === "cancelled") {
+                        msgEl.textContent = `⚠️ Exportação cancelada (${job.rows_done} registro(s) salvos)`;
+                    } else {
+                        msgEl.textContent = `❌ ${job.error}`;
+                    }
                 }
+            } else if (msgEl) {
+                msgEl.textContent = `⚠️ ${res.message}`;
             }
             // Atualizar contador de análises se necessário
             updateAnalysisCount();
         } catch (error) {
             console.error("Erro exportDb:", error);
-            if (msgEl) msgEl.textContent = `❌ Erro: ${error.message}`;
+            if (msgEl) msgEl.textContent = `❌ Erro: ${error.response?.data?.message || error.message}`;
         }
 
-        // Limpar mensagem após 1s
+        // Limpar mensagem após 3s
         setTimeout(() => {
             if (msgEl) msgEl.textContent = "";
-        }, 1000);
+        }, 3000);
     };
 
 
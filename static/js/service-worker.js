@@ -1,36 +1,355 @@
-const CACHE_NAME = 'mvp-collector-cache-v1';
-const URLsToCache = [
-  '/', 
-  '/static/css/styles.css',
-  '/static/js/scripts.js',
-  // adicione aqui outros recursos estáticos que queira cachear
+// service-worker.js
+// Estratégia offline da aplicação (servido em /service-worker.js?v=<versão dos assets>):
+//  - assets estáticos e do CDN: precache versionada, cache-first
+//  - página inicial: network-first, com a última versão em cache como fallback
+//  - API (GET): network-first com TTL curto por rota; sem rede usa a cópia se ainda válida
+//  - /upload, /analyze e /upload_analyze sem rede: guardados numa fila IndexedDB e reenviados em lotes
+//    por /analyze_batch via Background Sync (ou quando a página avisa que voltou a rede)
+
+const VERSION = new URL(self.location).searchParams.get("v") || "dev";
+const STATIC_CACHE = `mvp-static-${VERSION}`;
+const API_CACHE = "mvp-api";
+
+// Versões fixas no CDN: o URL identifica o conteúdo, por isso pode ficar em cache
+const CDN_ASSETS = [
+  "https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css",
+  "https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js",
+  "https://cdn.jsdelivr.net/npm/axios@1.7.9/dist/axios.min.js",
+];
+const LOCAL_ASSETS = [
+  "/static/css/styles.css",
+  "/static/js/scripts.js",
+  "/static/js/resize-worker.js",
+  "/static/manifest.json",
 ];
 
-// Instalação: cache dos recursos
-self.addEventListener('install', event => {
-  event.waitUntil(
-    caches.open(CACHE_NAME)
-      .then(cache => cache.addAll(URLsToCache))
-      .then(self.skipWaiting())
-  );
+// Validade das respostas da API em cache quando não há rede (segundos)
+const API_TTL = {
+  "/count_analyses": 60,
+  "/statistics": 60,
+  "/client_config": 300,
+  "/detect_location": 3600,
+};
+const NETWORK_TIMEOUT_MS = 4000;
+
+const DB_NAME = "mvp-collector";
+const QUEUE_STORE = "queue";
+const SYNC_TAG = "analysis-queue";
+const REPLAY_BATCH_SIZE = 10;
+// Reenvios com resposta "retry" (p.ex. local sem índice UV) antes de a entrada sair da fila
+const MAX_REPLAY_ATTEMPTS = 5;
+const QUEUED_POSTS = ["/upload", "/analyze", "/upload_analyze"];
+
+// ---------------------------------------------------------------------------------------------
+// Instalação e ativação
+
+self.addEventListener("install", event => {
+  event.waitUntil((async () => {
+    const cache = await caches.open(STATIC_CACHE);
+    await cache.addAll([
+      ...LOCAL_ASSETS,
+      ...CDN_ASSETS.map(url => new Request(url, { mode: "cors" })),
+    ]);
+    // Sem cookies: o pedido a "/" reinicia a sessão (localização/foto) no servidor
+    const shell = await fetch(new Request("/", { credentials: "omit" }));
+    if (shell.ok) await cache.put("/", shell);
+    await self.skipWaiting();
+  })());
+});
+
+self.addEventListener("activate", event => {
+  event.waitUntil((async () => {
+    const keys = await caches.keys();
+    await Promise.all(keys
+      .filter(key => key !== STATIC_CACHE && key !== API_CACHE)
+      .map(key => caches.delete(key)));
+    await self.clients.claim();
+  })());
 });
 
-// Ativação: limpar caches antigos
-self.addEventListener('activate', event => {
-  event.waitUntil(
-    caches.keys().then(keys => 
-      Promise.all(
-        keys.filter(key => key !== CACHE_NAME)
-            .map(key => caches.delete(key))
-      )
-    )
-  );
+// ---------------------------------------------------------------------------------------------
+// Pedidos
+
+self.addEventListener("fetch", event => {
+  const request = event.request;
+  const url = new URL(request.url);
+
+  if (url.origin !== self.location.origin) {
+    if (request.method === "GET" && CDN_ASSETS.includes(request.url)) {
+      event.respondWith(cacheFirst(request));
+    }
+    return;
+  }
+  if (request.method === "POST" && QUEUED_POSTS.includes(url.pathname)) {
+    event.respondWith(postOrQueue(request, url.pathname));
+    return;
+  }
+  if (request.method !== "GET") return;
+
+  if (request.mode === "navigate") {
+    event.respondWith(pageNetworkFirst(request));
+  } else if (url.pathname.startsWith("/static/")) {
+    event.respondWith(cacheFirst(request));
+  } else if (url.pathname in API_TTL) {
+    event.respondWith(apiNetworkFirst(request, API_TTL[url.pathname]));
+  }
+  // Restantes rotas (/jobs, /export, /metrics, ...): sempre pela rede
+});
+
+async function cacheFirst(request) {
+  const cached = await caches.match(request, { ignoreSearch: true });
+  if (cached) return cached;
+  const response = await fetch(request);
+  if (response.ok) {
+    const cache = await caches.open(STATIC_CACHE);
+    cache.put(request, response.clone());
+  }
+  return response;
+}
+
+function fetchWithTimeout(request, ms = NETWORK_TIMEOUT_MS) {
+  const controller = new AbortController();
+  const timer = setTimeout(() => controller.abort(), ms);
+  return fetch(request, { signal: controller.signal }).finally(() => clearTimeout(timer));
+}
+
+async function pageNetworkFirst(request) {
+  try {
+    return await fetchWithTimeout(request);
+  } catch (err) {
+    const cached = await caches.match("/", { cacheName: STATIC_CACHE });
+    if (cached) return cached;
+    throw err;
+  }
+}
+
+async function apiNetworkFirst(request, ttlSeconds) {
+  const cache = await caches.open(API_CACHE);
+  try {
+    const response = await fetchWithTimeout(request);
+    if (response.ok) {
+      // Guarda a hora da resposta para verificar o TTL quando não houver rede
+      const body = await response.clone().blob();
+      const headers = new Headers(response.headers);
+      headers.set("sw-fetched-at", String(Date.now()));
+      await cache.put(request, new Response(body, { status: response.status, headers }));
+    }
+    return response;
+  } catch (err) {
+    const cached = await cache.match(request);
+    const fetchedAt = cached ? Number(cached.headers.get("sw-fetched-at")) : 0;
+    if (cached && Date.now() - fetchedAt < ttlSeconds * 1000) return cached;
+    return jsonResponse({
+      status: "error", offline: true,
+      message: "Sem ligação ao servidor", message_color: "#FFA500",
+    }, 503);
+  }
+}
+
+function jsonResponse(payload, status = 200) {
+  return new Response(JSON.stringify(payload), {
+    status, headers: { "Content-Type": "application/json" },
+  });
+}
+
+// ---------------------------------------------------------------------------------------------
+// Fila offline (IndexedDB)
+// Entradas: { id, kind: "photo", photo: Blob, filename, capture, attempts, created_at }
+//           { id, kind: "stored", filename, capture, attempts, created_at }  (foto já no servidor, falta a análise)
+// capture: { location, lat, lng, captured_at } no momento da captura (enviado em `meta` no reenvio)
+// attempts: reenvios com resposta "retry"; entradas com menos tentativas seguem primeiro
+
+function openDb() {
+  return new Promise((resolve, reject) => {
+    const open = indexedDB.open(DB_NAME, 1);
+    open.onupgradeneeded = () => open.result.createObjectStore(QUEUE_STORE, { keyPath: "id", autoIncrement: true });
+    open.onsuccess = () => resolve(open.result);
+    open.onerror = () => reject(open.error);
+  });
+}
+
+async function withStore(mode, fn) {
+  const db = await openDb();
+  try {
+    return await new Promise((resolve, reject) => {
+      const tx = db.transaction(QUEUE_STORE, mode);
+      const result = fn(tx.objectStore(QUEUE_STORE));
+      tx.oncomplete = () => resolve(result && "result" in result ? result.result : undefined);
+      tx.onerror = () => reject(tx.error);
+    });
+  } finally {
+    db.close();
+  }
+}
+
+const queueAdd = entry => withStore("readwrite", store => store.add({ ...entry, attempts: 0, created_at: Date.now() }));
+const queueAll = () => withStore("readonly", store => store.getAll());
+const queueDelete = ids => withStore("readwrite", store => ids.forEach(id => store.delete(id)));
+const queuePut = entries => withStore("readwrite", store => entries.forEach(entry => store.put(entry)));
+
+async function requestReplay() {
+  // Sem Background Sync (Firefox, Safari) a página pede o reenvio no evento "online"
+  if (!self.registration.sync) return;
+  try {
+    await self.registration.sync.register(SYNC_TAG);
+  } catch (err) {
+    console.warn("Background Sync indisponível:", err);
+  }
+}
+
+// Local e hora da captura enviados pela página; sem captured_at usa a hora em que entrou na fila
+function captureInfo(fields) {
+  const value = name => {
+    const v = fields(name);
+    return v === null || v === undefined || v === "" ? null : v;
+  };
+  const lat = Number(value("lat"));
+  const lng = Number(value("lng"));
+  const hasCoords = value("lat") !== null && value("lng") !== null && Number.isFinite(lat) && Number.isFinite(lng);
+  return {
+    location: value("location"),
+    lat: hasCoords ? lat : null,
+    lng: hasCoords ? lng : null,
+    captured_at: value("captured_at") || new Date().toISOString(),
+  };
+}
+
+async function postOrQueue(request, pathname) {
+  const copy = request.clone();
+  try {
+    return await fetch(request);
+  } catch (err) {
+    // Só falhas de rede chegam aqui; erros HTTP seguem para a página normalmente
+  }
+  if (pathname === "/upload" || pathname === "/upload_analyze") {
+    const form = await copy.formData();
+    const photo = form.get("photo");
+    if (!(photo instanceof Blob)) {
+      return jsonResponse({ status: "error", message: "Nenhuma foto enviada.", message_color: "#FF0000" });
+    }
+    const capture = captureInfo(name => form.get(name));
+    const id = await queueAdd({ kind: "photo", photo, filename: photo.name || "foto.jpg", capture });
+    await requestReplay();
+    if (pathname === "/upload_analyze") return queuedAnalysisResponse();
+    return jsonResponse({
+      status: "success", queued: true, filename: `queued-${id}`,
+      message: "Sem ligação: foto guardada para análise", message_color: "#FFA500",
+    });
+  }
+
+  // /analyze: fotos já em fila são analisadas no reenvio; fotos já no servidor entram na fila pelo nome
+  let body = {};
+  try {
+    body = (await copy.json()) || {};
+  } catch (err) {
+    body = {};
+  }
+  const filename = body.filename;
+  if (filename && !filename.startsWith("queued-")) {
+    await queueAdd({ kind: "stored", filename, capture: captureInfo(name => body[name]) });
+  }
+  await requestReplay();
+  return queuedAnalysisResponse();
+}
+
+function queuedAnalysisResponse() {
+  return jsonResponse({
+    status: "success", queued: true,
+    result_html: "<p>⏳ Análise em fila: será feita quando houver ligação.</p>",
+    message: "Sem ligação: análise em fila", message_color: "#FFA500",
+  });
+}
+
+// ---------------------------------------------------------------------------------------------
+// Reenvio em lotes por /analyze_batch
+
+let replaying = null;
+
+function replayQueue() {
+  // Um reenvio de cada vez (sync e mensagens da página podem chegar juntos)
+  if (!replaying) {
+    replaying = doReplay().finally(() => { replaying = null; });
+  }
+  return replaying;
+}
+
+async function sendBatch(batch) {
+  const form = new FormData();
+  // Índices no NDJSON: primeiro os de `photos`, depois os de `stored`
+  const photos = batch.filter(e => e.kind === "photo");
+  const stored = batch.filter(e => e.kind === "stored");
+  photos.forEach(e => form.append("photos", e.photo, e.filename));
+  stored.forEach(e => form.append("stored", e.filename));
+  const ordered = [...photos, ...stored];
+  // Local/hora de cada captura, na mesma ordem (entradas antigas sem `capture` usam a sessão)
+  form.append("meta", JSON.stringify(ordered.map(e => e.capture || {})));
+
+  const isNdjson = r => (r.headers.get("Content-Type") || "").includes("ndjson");
+  let response = await fetch("/analyze_batch", { method: "POST", body: form });
+  if (response.ok && !isNdjson(response)) {
+    const res = await response.json();
+    if (res.message && res.message.includes("Localização")) {
+      // Sessão sem localização (p.ex. servidor reiniciado): deteta e tenta de novo
+      await fetch("/detect_location");
+      response = await fetch("/analyze_batch", { method: "POST", body: form });
+    }
+  }
+  if (!response.ok || !isNdjson(response)) {
+    throw new Error(`analyze_batch: ${response.status}`);
+  }
+
+  const done = [];
+  const retried = [];
+  let summary = null;
+  for (const line of (await response.text()).split("\n")) {
+    if (!line.trim()) continue;
+    const item = JSON.parse(line);
+    if (item.status === "done") summary = item;
+    else if (!ordered[item.index]) continue;
+    else if (item.status === "retry") retried.push(ordered[item.index]);
+    else done.push(ordered[item.index].id);
+  }
+  if (!summary) throw new Error("analyze_batch: resposta incompleta");
+  // Sucessos e erros definitivos (foto inválida) saem da fila; "retry" conta uma tentativa
+  // e, ao fim de MAX_REPLAY_ATTEMPTS, também sai (contada em `dropped`)
+  const exhausted = retried.filter(e => (e.attempts || 0) + 1 >= MAX_REPLAY_ATTEMPTS);
+  const kept = retried.filter(e => !exhausted.includes(e));
+  await queueDelete([...done, ...exhausted.map(e => e.id)]);
+  await queuePut(kept.map(e => ({ ...e, attempts: (e.attempts || 0) + 1 })));
+  if (exhausted.length) console.warn("Entradas retiradas da fila após várias tentativas:", exhausted.map(e => e.filename));
+  return { ...summary, dropped: exhausted.length };
+}
+
+async function doReplay() {
+  let analyzed = 0;
+  let failed = 0;
+  let dropped = 0;
+  // Uma passagem pela fila: cada entrada é enviada no máximo uma vez por reenvio, e as que
+  // já falharam vão para o fim, por isso não bloqueiam as capturas mais recentes
+  const entries = (await queueAll())
+    .sort((a, b) => (a.attempts || 0) - (b.attempts || 0) || a.id - b.id);
+  for (let start = 0; start < entries.length; start += REPLAY_BATCH_SIZE) {
+    const summary = await sendBatch(entries.slice(start, start + REPLAY_BATCH_SIZE));
+    analyzed += summary.analyzed;
+    failed += summary.failed;
+    dropped += summary.dropped;
+  }
+  const remaining = (await queueAll()).length;
+  const clients = await self.clients.matchAll();
+  clients.forEach(client => client.postMessage({
+    type: "queue-replayed", analyzed, failed, dropped, remaining,
+  }));
+}
+
+self.addEventListener("sync", event => {
+  if (event.tag === SYNC_TAG) event.waitUntil(replayQueue());
 });
 
-// Interceptar fetch: servir do cache, fallback para rede
-self.addEventListener('fetch', event => {
-  event.respondWith(
-    caches.match(event.request)
-      .then(cached => cached || fetch(event.request))
-  );
+self.addEventListener("message", event => {
+  const data = event.data || {};
+  if (data.type === "replay-queue") {
+    event.waitUntil(replayQueue().catch(err => console.warn("Reenvio da fila falhou:", err)));
+  } else if (data.type === "queue-size") {
+    event.waitUntil(queueAll().then(entries => event.source.postMessage({ type: "queue-size", size: entries.length })));
+  }
 });
@@ -0,0 +1,33 @@
+# tests/conftest.py
+# Os módulos da aplicação vivem em src/ (importam-se sem pacote) e o stub HTTP em benchmarks/
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, "src")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# Caches SQLite criadas no import (uv_index, geocode) fora da pasta do projeto
+_CACHE_DIR = tempfile.mkdtemp(prefix="mvp-tests-")
+os.environ.setdefault("UV_CACHE_PATH", os.path.join(_CACHE_DIR, "uv_cache.db"))
+os.environ.setdefault("GEOCODE_CACHE_PATH", os.path.join(_CACHE_DIR, "geocode_cache.db"))
+
+
+@pytest.fixture(scope="session")
+def main_app(tmp_path_factory):
+    """Módulo main importado numa pasta temporária (analysis.db, uploads/ e exports/ próprios)."""
+    workdir = tmp_path_factory.mktemp("app")
+    previous = os.getcwd()
+    os.chdir(workdir)
+    os.environ.setdefault("PREWARM_IMPORTS", "0")
+    os.environ.setdefault("SECRET_KEY", "tests")
+    try:
+        import main
+        yield main
+    finally:
+        os.chdir(previous)
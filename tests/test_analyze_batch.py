@@ -0,0 +1,25 @@
+# tests/test_analyze_batch.py
+# /analyze_batch: uma linha NDJSON por foto, incluindo as que ficam para nova tentativa
+
+import json
+
+
+def test_uv_failure_reports_retry_per_item(main_app, monkeypatch):
+    def fake_uv(location=None, lat=None, lng=None):
+        if location == "Unknown":
+            raise RuntimeError("local desconhecido")
+        return 5.0
+
+    monkeypatch.setattr(main_app, "get_uv_index", fake_uv)
+    meta = [{"location": "Unknown"}, {"location": "Lisbon, Portugal"}, {"location": "Unknown"}]
+    response = main_app.app.test_client().post("/analyze_batch", data={
+        "stored": ["a.jpg", "b.jpg", "c.jpg"], "meta": json.dumps(meta)})
+    assert response.mimetype == "application/x-ndjson"
+
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    items = {item["index"]: item for item in lines if item["status"] != "done"}
+    assert items[0]["status"] == "retry" and items[2]["status"] == "retry"
+    assert items[1]["status"] == "error"  # foto inexistente: erro definitivo
+    summary = lines[-1]
+    assert summary["status"] == "done"
+    assert (summary["analyzed"], summary["failed"], summary["retry"]) == (0, 1, 2)
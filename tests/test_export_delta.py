@@ -0,0 +1,102 @@
+# tests/test_export_delta.py
+# /export_delta: filtros guardados no cursor e paginação até X-Has-More=0
+
+import json
+
+import pytest
+
+
+@pytest.fixture
+def delta(main_app):
+    """Cliente Flask com o analysis_log (e a retenção) vazios."""
+    main_app.log_writer.flush()
+    with main_app.sqlite_pool.connection() as conn:
+        for table in ("analysis_log", "analysis_log_synced", "sync_state"):
+            conn.execute(f"DELETE FROM {table}")
+        conn.commit()
+    return main_app.app.test_client()
+
+
+def insert_rows(main_app, timestamps, id_collector="COLLECTOR_A"):
+    with main_app.sqlite_pool.connection() as conn:
+        conn.executemany(
+            "INSERT INTO analysis_log (id_collector, timestamp, event_type) VALUES (?, ?, 'analysis')",
+            [(id_collector, ts) for ts in timestamps])
+        conn.commit()
+
+
+def get_page(client, **params):
+    response = client.get("/export_delta", query_string=params)
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    return rows, response.headers["X-Next-Cursor"], response.headers["X-Has-More"] == "1"
+
+
+def walk(client, **params):
+    """Segue X-Next-Cursor até X-Has-More=0; devolve todos os registos e o último cursor."""
+    rows, cursor, more = get_page(client, **params)
+    pages = 1
+    while more:
+        page, cursor, more = get_page(client, cursor=cursor, limit=params.get("limit"))
+        rows += page
+        pages += 1
+    return rows, cursor, pages
+
+
+def test_empty_first_page_keeps_since_filter(main_app, delta):
+    insert_rows(main_app, ["2026-01-01T10:00:00", "2026-01-02T10:00:00", "2026-01-03T10:00:00"])
+
+    rows, cursor, more = get_page(delta, since="2030-01-01")
+    assert rows == [] and not more
+
+    # O cursor da página vazia não volta a entregar os registos anteriores a `since`
+    rows, cursor, _ = get_page(delta, cursor=cursor)
+    assert rows == []
+
+    insert_rows(main_app, ["2025-12-31T10:00:00", "2030-02-01T10:00:00"])
+    rows, _, _ = get_page(delta, cursor=cursor)
+    assert [r["timestamp"] for r in rows] == ["2030-02-01T10:00:00"]
+
+
+def test_multi_page_walk_applies_filters_on_every_page(main_app, delta):
+    timestamps = [f"2026-03-{day:02d}T12:00:00" for day in range(1, 21)]
+    insert_rows(main_app, timestamps)
+    insert_rows(main_app, timestamps, id_collector="COLLECTOR_B")
+
+    rows, cursor, pages = walk(delta, since="2026-03-05", until="2026-03-15",
+                               id_collector="COLLECTOR_A", limit=3)
+    assert [r["timestamp"] for r in rows] == timestamps[4:14]
+    assert {r["id_collector"] for r in rows} == {"COLLECTOR_A"}
+    assert pages == 4
+    ids = [r["id"] for r in rows]
+    assert ids == sorted(set(ids))
+
+    # Registos novos chegam pelo último cursor, com os mesmos filtros
+    insert_rows(main_app, ["2026-03-10T18:00:00", "2026-03-20T18:00:00"])
+    insert_rows(main_app, ["2026-03-10T19:00:00"], id_collector="COLLECTOR_B")
+    rows, _, _ = get_page(delta, cursor=cursor)
+    assert [r["timestamp"] for r in rows] == ["2026-03-10T18:00:00"]
+
+
+def test_invalid_cursor_is_rejected(delta):
+    assert delta.get("/export_delta", query_string={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_etag_changes_with_every_write(main_app, delta):
+    insert_rows(main_app, ["2026-04-01T10:00:00"])
+    first = delta.get("/export_delta")
+    etag = first.headers["ETag"]
+    assert delta.get("/export_delta", headers={"If-None-Match": etag}).status_code == 304
+
+    # Mesmo tamanho e mesmo instante de escrita não bastam para repetir o ETag
+    for _ in range(3):
+        insert_rows(main_app, ["2026-04-01T11:00:00"])
+        response = delta.get("/export_delta", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        etag = response.headers["ETag"]
+
+    with main_app.sqlite_pool.connection() as conn:
+        conn.execute("DELETE FROM analysis_log WHERE id = (SELECT MAX(id) FROM analysis_log)")
+        conn.commit()
+    assert delta.get("/export_delta", headers={"If-None-Match": etag}).status_code == 200
@@ -0,0 +1,115 @@
+# tests/test_jobs.py
+# JobManager partilhado pelo SQLite: dois "workers" (pools e gestores distintos) sobre o mesmo analysis.db
+
+import threading
+import time
+
+import pytest
+
+from jobs import JobManager
+from migrations import MIGRATIONS
+from sqlite_pool import SQLitePool
+
+KEY = "sync:TEST"
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Dois JobManager, cada um com o seu pool, como dois workers do gunicorn."""
+    path = str(tmp_path / "analysis.db")
+    pools = [SQLitePool(path, migrations=MIGRATIONS) for _ in range(2)]
+    managers = [JobManager(pool=p, heartbeat_interval=0.05, stale_after=1.0) for p in pools]
+    yield managers
+    for p in pools:
+        p.close_all()
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def blocking_task(release):
+    def run(job):
+        rows = 0
+        while not release.is_set():
+            if job.cancel_requested():
+                return {"transferred": rows}
+            rows += 1
+            job.progress(rows, rows * 10)
+            time.sleep(0.01)
+        return {"transferred": rows}
+    return run
+
+
+def test_claim_once_across_workers(workers):
+    release = threading.Event()
+    barrier = threading.Barrier(len(workers))
+    results = [None] * len(workers)
+
+    def submit(i):
+        barrier.wait()
+        results[i] = workers[i].submit("sync", KEY, blocking_task(release))
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(len(workers))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    created = [job for job, was_created in results if was_created]
+    assert len(created) == 1
+    assert {job.id for job, _ in results} == {created[0].id}
+
+    # O outro worker vê a mesma tarefa ativa e o progresso gravado pelo heartbeat
+    owner = workers[[c for _, c in results].index(True)]
+    other = workers[1 - workers.index(owner)]
+    assert other.active(KEY).id == created[0].id
+    assert wait_for(lambda: other.get(created[0].id).rows_done > 0)
+
+    release.set()
+    assert wait_for(lambda: other.get(created[0].id).status == "done")
+    assert other.active(KEY) is None
+    assert other.stats()["active"] == 0
+
+
+def test_cancel_from_another_worker(workers):
+    owner, other = workers
+    job, created = owner.submit("sync", KEY, blocking_task(threading.Event()))
+    assert created
+    assert wait_for(lambda: other.get(job.id) is not None and other.get(job.id).status == "running")
+
+    cancelled = other.cancel(job.id)
+    assert cancelled.cancel_requested()
+    # O dono recebe o pedido no heartbeat seguinte e termina no fim do passo atual
+    assert wait_for(lambda: other.get(job.id).status == "cancelled")
+    assert job.status == "cancelled"
+    assert other.get(job.id).result["transferred"] > 0
+
+    # Depois de cancelada, uma nova tarefa com a mesma key pode começar
+    new_job, created = other.submit("sync", KEY, lambda j: {"transferred": 0})
+    assert created and new_job.id != job.id
+
+
+def test_stale_job_of_dead_worker_is_recovered(workers):
+    owner, other = workers
+    job, _ = owner.submit("sync", KEY, blocking_task(threading.Event()))
+    assert wait_for(lambda: other.get(job.id).status == "running")
+
+    # Simula o fim do processo dono: heartbeat parado há mais de stale_after
+    owner.heartbeat_interval = 3600
+    time.sleep(0.2)  # deixa terminar a espera do heartbeat em curso
+    with other.pool.connection() as conn:
+        conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time() - 60, job.id))
+        conn.commit()
+    assert other.active(KEY) is None
+
+    new_job, created = other.submit("sync", KEY, lambda j: {"transferred": 0})
+    assert created
+    stale = other._load("id = ?", (job.id,))
+    assert stale.status == "error" and stale.error
+    job.cancel()
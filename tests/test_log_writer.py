@@ -0,0 +1,111 @@
+# tests/test_log_writer.py
+# LogWriter: commit em grupo, flush com leitura das próprias escritas, backpressure e fecho ordenado
+
+import queue
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+from log_writer import LogWriter
+from migrations import MIGRATIONS
+from sqlite_pool import SQLitePool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLitePool(str(tmp_path / "analysis.db"), migrations=MIGRATIONS)
+    yield pool
+    pool.close_all()
+
+
+def make_row(i):
+    return ("C", f"2026-01-01T12:00:{i % 60:02d}", "analysis_completed", "photo", f"foto{i}.jpg",
+            "Lisbon", 5.0, "Tipo III", "[]", "ok")
+
+
+def count_rows(pool):
+    with pool.connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM analysis_log").fetchone()[0]
+
+
+class GatedPool:
+    """Pool cujas conexões esperam por `gate` (escritor parado) e que pode falhar as primeiras gravações."""
+
+    def __init__(self, pool, failures=0):
+        self.pool = pool
+        self.gate = threading.Event()
+        self.gate.set()
+        self.failures = failures
+
+    @contextmanager
+    def connection(self):
+        self.gate.wait()
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database is locked")
+        with self.pool.connection() as conn:
+            yield conn
+
+
+def test_group_commit_and_read_your_writes(pool):
+    writer = LogWriter(pool, batch_size=100, flush_interval=30)
+    for i in range(50):
+        writer.submit(make_row(i))
+    # Com flush_interval longo nada é gravado antes do flush
+    assert writer.flush()
+    assert count_rows(pool) == 50
+    stats = writer.stats()
+    assert stats["batches"] == 1
+    assert stats["committed"] == 50 and stats["pending"] == 0
+    writer.close()
+
+
+def test_batches_are_capped_at_batch_size(pool):
+    writer = LogWriter(pool, batch_size=10, flush_interval=30)
+    writer.submit_many([make_row(i) for i in range(35)])
+    assert writer.flush()
+    assert count_rows(pool) == 35
+    assert writer.stats()["batches"] >= 4
+    writer.close()
+
+
+def test_submit_blocks_when_queue_is_full(pool):
+    gated = GatedPool(pool)
+    gated.gate.clear()
+    writer = LogWriter(gated, max_queue=5, batch_size=1, flush_interval=0.01)
+    # O primeiro registo fica preso no escritor; os seguintes enchem a fila
+    for i in range(6):
+        writer.submit(make_row(i), timeout=1)
+    with pytest.raises(queue.Full):
+        writer.submit(make_row(6), timeout=0.1)
+    stats = writer.stats()
+    assert stats["blocked_submits"] >= 1
+    assert stats["submitted"] == 6
+
+    gated.gate.set()
+    assert writer.flush()
+    assert count_rows(pool) == 6
+    writer.close()
+
+
+def test_close_drains_pending_rows(pool):
+    writer = LogWriter(pool, batch_size=100, flush_interval=30)
+    for i in range(20):
+        writer.submit(make_row(i))
+    writer.close()
+    assert count_rows(pool) == 20
+    assert writer.stats()["pending"] == 0
+
+
+def test_failed_batch_is_retried_and_reported(pool):
+    gated = GatedPool(pool, failures=1)
+    writer = LogWriter(gated, batch_size=100, flush_interval=30, retry_delay=0.2)
+    writer.submit(make_row(0))
+    # A primeira gravação falha: flush devolve False e o lote fica para nova tentativa
+    assert not writer.flush(timeout=5)
+    assert writer.stats()["last_error"] == "database is locked"
+    assert writer.flush(timeout=5)
+    assert count_rows(pool) == 1
+    assert writer.stats()["dropped"] == 0
+    writer.close()
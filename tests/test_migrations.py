@@ -0,0 +1,117 @@
+# tests/test_migrations.py
+# Atualização de um analysis.db anterior às migrações e resumos mantidos pelos triggers
+
+import sqlite3
+
+import pytest
+
+from log_writer import INSERT_SQL
+from migrations import MIGRATIONS
+from sqlite_pool import SQLitePool
+from sync import SyncEngine
+
+# Tabela criada pelo main.py antes das migrações (sem user_version)
+BASELINE_DDL = """
+    CREATE TABLE IF NOT EXISTS analysis_log (
+        id_collector TEXT,
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT NOT NULL,
+        event_type TEXT NOT NULL,
+        input_type TEXT,
+        input_value TEXT,
+        location TEXT,
+        uv_index REAL,
+        fitzpatrick_type TEXT,
+        recommendations TEXT,
+        status_message TEXT
+    )
+"""
+
+
+def row(collector, event, uv=None, skin=None):
+    return (collector, "2026-01-01T12:00:00", event, "photo", None, "Lisbon", uv, skin, "[]", "ok")
+
+
+BASELINE_ROWS = [
+    row("C1", "analysis_completed", 5.0, "Tipo III"),
+    row("C1", "analysis_completed", 7.5, "Tipo II"),
+    row("C1", "upload_success"),
+    row(None, "analysis_completed", 2.0, "Tipo III"),
+    row("C2", "analysis_error", None, None),
+]
+
+
+def summaries(conn):
+    """(resumo por coletor/evento, resumo por tipo de pele) sem as linhas a zero."""
+    events = conn.execute(
+        "SELECT id_collector, event_type, total, uv_count, ROUND(uv_sum, 6), ROUND(uv_sq_sum, 6) "
+        "FROM analysis_summary WHERE total > 0 ORDER BY 1, 2").fetchall()
+    skins = conn.execute(
+        "SELECT id_collector, fitzpatrick_type, total FROM analysis_skin_summary "
+        "WHERE total > 0 ORDER BY 1, 2").fetchall()
+    return events, skins
+
+
+def recomputed(conn):
+    """Os mesmos resumos calculados diretamente com COUNT(*) sobre o analysis_log."""
+    events = conn.execute(
+        "SELECT COALESCE(id_collector, ''), event_type, COUNT(*), COUNT(uv_index), "
+        "ROUND(TOTAL(uv_index), 6), ROUND(TOTAL(uv_index * uv_index), 6) "
+        "FROM analysis_log GROUP BY 1, 2 ORDER BY 1, 2").fetchall()
+    skins = conn.execute(
+        "SELECT COALESCE(id_collector, ''), fitzpatrick_type, COUNT(*) FROM analysis_log "
+        "WHERE fitzpatrick_type IS NOT NULL GROUP BY 1, 2 ORDER BY 1, 2").fetchall()
+    return events, skins
+
+
+@pytest.fixture
+def baseline_pool(tmp_path):
+    path = str(tmp_path / "analysis.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute(BASELINE_DDL)
+        conn.executemany(INSERT_SQL, BASELINE_ROWS)
+    pool = SQLitePool(path, migrations=MIGRATIONS)
+    pool.init_schema()
+    yield pool
+    pool.close_all()
+
+
+def test_upgrade_from_baseline_backfills_summaries(baseline_pool):
+    assert baseline_pool.schema_version == MIGRATIONS[-1][0]
+    with baseline_pool.connection() as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == MIGRATIONS[-1][0]
+        assert conn.execute("SELECT COUNT(*) FROM analysis_log").fetchone()[0] == len(BASELINE_ROWS)
+        assert summaries(conn) == recomputed(conn)
+        assert conn.execute("SELECT SUM(total) FROM analysis_summary").fetchone()[0] == len(BASELINE_ROWS)
+
+
+def test_migrations_are_applied_once(baseline_pool):
+    # Um segundo processo a arrancar sobre a mesma base não repete o preenchimento
+    again = SQLitePool(baseline_pool.path, migrations=MIGRATIONS)
+    again.init_schema()
+    with again.connection() as conn:
+        assert summaries(conn) == recomputed(conn)
+    again.close_all()
+
+
+def test_triggers_follow_inserts_updates_and_sync_deletes(baseline_pool):
+    with baseline_pool.connection() as conn:
+        conn.executemany(INSERT_SQL, [
+            row("C1", "analysis_completed", 9.0, "Tipo IV"),
+            row("C3", "analysis_completed", 1.5, "Tipo I"),
+            row("C3", "upload_success"),
+        ])
+        conn.execute("UPDATE analysis_log SET fitzpatrick_type = 'Tipo V', uv_index = 3.0 "
+                     "WHERE id = (SELECT MIN(id) FROM analysis_log)")
+        conn.commit()
+        assert summaries(conn) == recomputed(conn)
+
+    # Registos enviados para o MySQL saem do analysis_log e dos resumos
+    engine = SyncEngine(baseline_pool, None, retain_seconds=3600)
+    with baseline_pool.connection() as conn:
+        engine._confirm(conn, 4)
+        assert conn.execute("SELECT COUNT(*) FROM analysis_log").fetchone()[0] == len(BASELINE_ROWS) + 3 - 4
+        assert summaries(conn) == recomputed(conn)
+        # A cópia guardada para o /export_delta não conta nos resumos
+        assert conn.execute("SELECT COUNT(*) FROM analysis_log_synced").fetchone()[0] == 4
+        assert conn.execute("SELECT SUM(total) FROM analysis_summary").fetchone()[0] == len(BASELINE_ROWS) + 3 - 4
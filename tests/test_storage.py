@@ -0,0 +1,98 @@
+# tests/test_storage.py
+# Retenção dos originais: só sai do disco o que está sincronizado, antigo, com miniatura e enviado em original
+
+import os
+
+import pytest
+
+from log_writer import INSERT_SQL
+from migrations import MIGRATIONS
+from photo_store import sharded_path
+from sqlite_pool import SQLitePool
+from storage import StorageManager
+
+DAY = 86400
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLitePool(str(tmp_path / "analysis.db"), migrations=MIGRATIONS)
+    yield pool
+    pool.close_all()
+
+
+@pytest.fixture
+def uploads(tmp_path):
+    return str(tmp_path / "uploads")
+
+
+def make_photo(uploads, name, color=(200, 150, 120)):
+    from PIL import Image
+    path = sharded_path(uploads, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.new("RGB", (1024, 768), color).save(path, "JPEG")
+    return path
+
+
+def log_rows(pool, paths, synced):
+    """Um registo por foto; os primeiros `synced` ficam abaixo do último id enviado para o MySQL."""
+    with pool.connection() as conn:
+        ids = []
+        for path in paths:
+            ids.append(conn.execute(INSERT_SQL, ("C", "2026-01-01T12:00:00", "analysis_completed",
+                                                 "photo", path, "Lisbon", 5.0, "Tipo III", "[]", "ok")).lastrowid)
+        if synced:
+            conn.execute("INSERT OR REPLACE INTO sync_state (name, last_id) VALUES ('mysql', ?)", (ids[synced - 1],))
+        conn.commit()
+
+
+def test_only_synced_old_thumbnailed_originals_are_deleted(pool, uploads):
+    synced_old, synced_recent, unsynced_old = (
+        make_photo(uploads, f"{name}.jpg") for name in ("aa11", "bb22", "cc33"))
+    log_rows(pool, [synced_old, synced_recent, unsynced_old], synced=2)
+    old = os.stat(synced_old).st_mtime - 30 * DAY
+    for path in (synced_old, unsynced_old):
+        os.utime(path, (old, old))
+
+    storage = StorageManager(uploads, pool, retention_days=7, sync_blob="original")
+    report = storage.compact()
+
+    assert not os.path.exists(synced_old)
+    assert os.path.exists(storage.thumbnail_path(synced_old))
+    assert os.path.exists(synced_recent)
+    assert os.path.exists(storage.thumbnail_path(synced_recent))
+    # Por sincronizar: nem apagado nem com miniatura
+    assert os.path.exists(unsynced_old)
+    assert not os.path.exists(storage.thumbnail_path(unsynced_old))
+    assert (report["originals_deleted"], report["kept_recent"], report["kept_unsynced"]) == (1, 1, 1)
+    assert report["thumbnails_created"] == 2
+    assert report["bytes_reclaimed"] > 0
+
+    # O imagem_blob de um original já apagado passa a ser a miniatura
+    assert storage.read_blob(synced_old)
+
+
+def test_thumbnail_sync_blob_never_deletes_originals(pool, uploads):
+    path = make_photo(uploads, "dd44.jpg")
+    log_rows(pool, [path], synced=1)
+
+    storage = StorageManager(uploads, pool, retention_days=7, sync_blob="thumbnail")
+    report = storage.compact(now=os.stat(path).st_mtime + 30 * DAY)
+
+    assert os.path.exists(path)
+    assert os.path.exists(storage.thumbnail_path(path))
+    assert report["kept_not_shipped"] == 1 and report["originals_deleted"] == 0
+
+
+def test_original_without_thumbnail_is_kept(pool, uploads):
+    path = sharded_path(uploads, "ee55.jpg")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"\xff\xd8\xff corrompido")
+    log_rows(pool, [path], synced=1)
+
+    storage = StorageManager(uploads, pool, retention_days=7, sync_blob="original")
+    report = storage.compact(now=os.stat(path).st_mtime + 30 * DAY)
+
+    assert os.path.exists(path)
+    assert report["errors"] == 1 and report["originals_deleted"] == 0
@@ -0,0 +1,131 @@
+# tests/test_sync.py
+# SyncEngine contra um "MySQL" em SQLite: retoma depois de falhas e cancelamento entre lotes
+
+import sqlite3
+
+import pytest
+
+from benchmarks.bench_scaling import SQLiteAsMySQL
+from log_writer import INSERT_SQL
+from migrations import MIGRATIONS
+from sqlite_pool import SQLitePool
+from sync import SyncEngine, ensure_mysql_schema, MYSQL_SCHEMA_SQL
+
+ROWS = 25
+BATCH = 5
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLitePool(str(tmp_path / "analysis.db"), migrations=MIGRATIONS)
+    with pool.connection() as conn:
+        conn.executemany(INSERT_SQL, [
+            ("COLLECTOR_A", f"2026-01-01T12:00:{i:02d}", "analysis_completed", "photo", None,
+             "Lisbon, Portugal", 5.0, "Tipo III", "[]", "ok")
+            for i in range(ROWS)])
+        conn.commit()
+    yield pool
+    pool.close_all()
+
+
+@pytest.fixture
+def mysql_path(tmp_path):
+    return str(tmp_path / "mysql.db")
+
+
+def make_engine(pool, mysql_path):
+    return SyncEngine(pool, lambda: SQLiteAsMySQL(mysql_path), batch_size=BATCH,
+                      read_blob=lambda path: None, prepare_mysql=None)
+
+
+def mysql_ids(mysql_path):
+    with sqlite3.connect(mysql_path) as conn:
+        return [r[0] for r in conn.execute("SELECT id_origem FROM analises ORDER BY id")]
+
+
+def local_count(pool):
+    with pool.connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM analysis_log").fetchone()[0]
+
+
+def test_resume_after_crash_between_mysql_and_sqlite_commit(pool, mysql_path):
+    engine = make_engine(pool, mysql_path)
+    confirm = engine._confirm
+    calls = []
+
+    def crash_on_second_batch(conn, last_id):
+        calls.append(last_id)
+        if len(calls) == 2:
+            raise RuntimeError("processo terminado depois do COMMIT no MySQL")
+        return confirm(conn, last_id)
+
+    engine._confirm = crash_on_second_batch
+    with pytest.raises(RuntimeError):
+        engine.run()
+    # O segundo lote já está no MySQL mas não foi confirmado no SQLite
+    assert len(mysql_ids(mysql_path)) == 2 * BATCH
+    assert local_count(pool) == ROWS - BATCH
+
+    result = make_engine(pool, mysql_path).run()
+    assert result["transferred"] == ROWS - BATCH
+    ids = mysql_ids(mysql_path)
+    assert sorted(ids) == list(range(1, ROWS + 1))
+    assert local_count(pool) == 0
+
+
+def test_resume_after_mysql_failure(pool, mysql_path):
+    class FailingMySQL(SQLiteAsMySQL):
+        batches = 0
+
+        def executemany(self, sql, values):
+            FailingMySQL.batches += 1
+            if FailingMySQL.batches == 3:
+                raise sqlite3.OperationalError("ligação perdida")
+            super().executemany(sql, values)
+
+    engine = SyncEngine(pool, lambda: FailingMySQL(mysql_path), batch_size=BATCH,
+                        read_blob=lambda path: None, prepare_mysql=None)
+    with pytest.raises(sqlite3.OperationalError):
+        engine.run()
+    assert len(mysql_ids(mysql_path)) == 2 * BATCH
+
+    make_engine(pool, mysql_path).run()
+    assert sorted(mysql_ids(mysql_path)) == list(range(1, ROWS + 1))
+    assert local_count(pool) == 0
+
+
+def test_cancel_stops_between_batches(pool, mysql_path):
+    progress = []
+
+    result = make_engine(pool, mysql_path).run(
+        progress=lambda rows, sent: progress.append(rows),
+        cancelled=lambda: len(progress) >= 2)
+    assert result["cancelled"]
+    assert result["transferred"] == 2 * BATCH
+    assert mysql_ids(mysql_path) == list(range(1, 2 * BATCH + 1))
+    assert local_count(pool) == ROWS - 2 * BATCH
+
+    result = make_engine(pool, mysql_path).run()
+    assert not result["cancelled"]
+    assert result["transferred"] == ROWS - 2 * BATCH
+    assert sorted(mysql_ids(mysql_path)) == list(range(1, ROWS + 1))
+
+
+def test_ensure_mysql_schema_adds_column_once():
+    class Cursor:
+        def __init__(self, exists):
+            self.exists = exists
+            self.statements = []
+
+        def execute(self, sql):
+            self.statements.append(sql)
+
+        def fetchone(self):
+            return (1 if self.exists else 0,)
+
+    cursor = Cursor(exists=False)
+    assert ensure_mysql_schema(cursor)
+    assert cursor.statements[-1] == MYSQL_SCHEMA_SQL
+    cursor = Cursor(exists=True)
+    assert not ensure_mysql_schema(cursor)
+    assert MYSQL_SCHEMA_SQL not in cursor.statements
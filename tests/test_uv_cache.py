@@ -0,0 +1,43 @@
+# tests/test_uv_cache.py
+# UVCache: acertos sem escrita no SQLite e LRU com precisão de touch_interval
+
+from uv_cache import UVCache
+
+LISBON = (38.72, -9.14)
+PORTO = (41.15, -8.61)
+FARO = (37.02, -7.93)
+
+
+def last_access(cache, lat, lng):
+    with cache.pool.connection() as conn:
+        return conn.execute("SELECT last_access FROM uv_cache WHERE bucket = ?",
+                            (cache.bucket(lat, lng),)).fetchone()[0]
+
+
+def test_hits_do_not_write_within_touch_interval(tmp_path):
+    cache = UVCache(str(tmp_path / "uv.db"), ttl=600, touch_interval=60)
+    cache.set(*LISBON, 6.5)
+    before = last_access(cache, *LISBON)
+    with cache.pool.connection() as conn:
+        changes = conn.total_changes
+    for _ in range(20):
+        assert cache.get(*LISBON) == 6.5
+    assert last_access(cache, *LISBON) == before
+    assert cache.stats()["touches"] == 0
+    assert cache.stats()["hits"] == 20
+    # Nenhuma escrita na conexão reutilizada pelo pool
+    with cache.pool.connection() as conn:
+        assert conn.total_changes == changes
+
+
+def test_lru_touch_after_interval_keeps_entry(tmp_path):
+    cache = UVCache(str(tmp_path / "uv.db"), ttl=600, max_entries=2, touch_interval=0)
+    cache.set(*LISBON, 6.5)
+    cache.set(*PORTO, 5.0)
+    # Lisboa usada depois do Porto: é o Porto que sai ao exceder o limite
+    assert cache.get(*LISBON) == 6.5
+    assert cache.stats()["touches"] == 1
+    cache.set(*FARO, 8.0)
+    assert cache.get(*LISBON) == 6.5
+    assert cache.get(*PORTO) is None
+    assert cache.stats()["evictions"] == 1
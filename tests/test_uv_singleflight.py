@@ -0,0 +1,116 @@
+# tests/test_uv_singleflight.py
+# get_uv_index contra o stub HTTP local: uma única chamada externa por célula e stale-while-revalidate
+
+import threading
+import time
+
+import pytest
+
+import uv_index
+from benchmarks.stub_server import StubServer
+from singleflight import SingleFlight
+from uv_cache import UVCache
+
+UVI_PATH = "/data/2.5/uvi"
+LATENCY_MS = 200
+TTL = 60
+
+
+@pytest.fixture
+def stub(tmp_path, monkeypatch):
+    """uv_index a usar o stub (com latência) e caches novas em tmp_path."""
+    with StubServer(latency_ms=LATENCY_MS) as server:
+        env = server.app_env()
+        monkeypatch.setattr(uv_index, "OPENWEATHER_URL", env["OPENWEATHER_URL"])
+        monkeypatch.setattr(uv_index, "API_KEY", env["OPENWEATHER_API_KEY"])
+        monkeypatch.setattr(uv_index, "CACHE_TTL", TTL)
+        monkeypatch.setattr(uv_index, "uv_cache", UVCache(str(tmp_path / "uv.db"), ttl=TTL, stale_ttl=3600))
+        monkeypatch.setattr(uv_index, "uv_flight", SingleFlight("uv-test"))
+        monkeypatch.setattr(uv_index, "_failures", {})
+        yield server
+
+
+def concurrent_calls(n, lat, lng):
+    barrier = threading.Barrier(n)
+    results = [None] * n
+    errors = []
+
+    def call(i):
+        try:
+            barrier.wait()
+            results[i] = uv_index.get_uv_index(lat=lat, lng=lng)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    assert not errors
+    return results
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+def test_concurrent_misses_share_one_upstream_request(stub):
+    results = concurrent_calls(16, 38.72, -9.14)
+
+    assert stub.requests.get(UVI_PATH) == 1
+    assert len(set(results)) == 1 and results[0] is not None
+    assert uv_index.uv_flight.stats()["shared"] == 15
+
+    # Pedidos seguintes na mesma célula vêm da cache
+    assert uv_index.get_uv_index(lat=38.721, lng=-9.141) == results[0]
+    assert stub.requests.get(UVI_PATH) == 1
+
+
+def test_stale_value_is_served_while_one_refresh_runs(stub):
+    lat, lng = 41.15, -8.61
+    uv_index.uv_cache.set(lat, lng, 1.5)
+    # Envelhece a entrada: expirada (TTL) mas ainda dentro de stale_ttl
+    with uv_index.uv_cache.pool.connection() as conn:
+        conn.execute("UPDATE uv_cache SET fetched_at = fetched_at - ?", (TTL + 5,))
+        conn.commit()
+
+    start = time.perf_counter()
+    results = concurrent_calls(8, lat, lng)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    # Todos recebem logo o valor antigo, sem esperar pela API
+    assert results == [1.5] * 8
+    assert elapsed_ms < LATENCY_MS
+    assert uv_index.uv_cache.stats()["stale_hits"] == 8
+
+    # Uma única atualização em segundo plano substitui o valor na cache
+    assert wait_for(lambda: uv_index.uv_cache.get(lat, lng) not in (None, 1.5))
+    assert stub.requests.get(UVI_PATH) == 1
+    assert uv_index.uv_flight.stats()["background_refreshes"] == 1
+    assert uv_index.get_uv_index(lat=lat, lng=lng) == uv_index.uv_cache.get(lat, lng)
+    assert stub.requests.get(UVI_PATH) == 1
+
+
+def test_failure_is_negative_cached_per_cell(stub, monkeypatch):
+    # Rota inexistente no stub: a API falha (404) e a célula usa o valor por omissão
+    monkeypatch.setattr(uv_index, "OPENWEATHER_URL", stub.base_url + "/missing")
+    for _ in range(5):
+        assert uv_index.get_uv_index(lat=38.72, lng=-9.14) == uv_index.UV_FALLBACK
+    assert stub.requests.get("/missing") == 1
+    # O valor por omissão não fica na cache UV
+    assert uv_index.uv_cache.get(38.72, -9.14) is None
+
+    # Outra célula ainda tenta a API
+    uv_index.get_uv_index(lat=41.15, lng=-8.61)
+    assert stub.requests.get("/missing") == 2
+
+    # Terminado o NEGATIVE_TTL, a célula volta a consultar a API
+    uv_index._failures[uv_index.uv_cache.bucket(38.72, -9.14)] = time.monotonic() - 1
+    uv_index.get_uv_index(lat=38.72, lng=-9.14)
+    assert stub.requests.get("/missing") == 3